@@ -0,0 +1,569 @@
+"""
+Offline throughput benchmark
+
+Runs the workflow end to end against local stand-ins for every external
+service, so throughput can be measured without spending Hunter credits or
+OpenAI tokens. Synthetic company websites, Hunter.io domain-search and
+OpenAI chat completions are served over real HTTP by one local server, so
+the pooled fetcher, requests and the OpenAI client all do real network I/O;
+Sheets and Gmail are in-process fakes of the discovery clients. Every
+stand-in has a configurable latency, error rate and 429 rate.
+
+Reports companies/minute, p50/p95 latency per node and peak memory.
+
+Usage:
+    python benchmark.py --companies 200 --mode fan_out --concurrency 20
+    python benchmark.py --openai-latency 0.8 --openai-429-rate 0.05 --json bench.json
+"""
+
+import argparse
+import functools
+import importlib
+import json
+import logging
+import math
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from dataclasses import asdict, dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Module-level functions of graph_main that are registered as graph nodes
+NODE_FUNCTIONS = [
+    "initialize_workflow",
+    "read_leads",
+    "select_next_company",
+    "derive_company_domain",
+    "fetch_website",
+    "extract_text_content",
+    "reduce_text_content",
+    "summarize_company",
+    "find_contacts",
+    "prepare_update_data",
+    "generate_email_body",
+    "generate_email_subject",
+    "generate_email",
+    "create_gmail_draft",
+    "update_success_log",
+    "log_failed_lookup",
+    "increment_index",
+]
+
+# Host names of the synthetic company sites; all resolve to the local server
+SITE_HOST_TEMPLATE = "company-{}.test"
+
+# ============================================================================
+# SERVICE PROFILES
+# ============================================================================
+
+SERVICES = ("site", "hunter", "openai", "sheets", "gmail")
+
+@dataclass
+class ServiceProfile:
+    """Latency and failure behaviour of one fake service"""
+    latency: float = 0.0  # Mean response time in seconds
+    jitter: float = 0.0  # Response time varies uniformly by +/- this much
+    error_rate: float = 0.0  # Fraction of calls answered with a 500
+    rate_limit_rate: float = 0.0  # Fraction of calls answered with a 429
+    retry_after: float = 1.0  # Retry-After sent with a 429
+
+class FakeService:
+    """Applies a ServiceProfile to each call and counts the outcomes"""
+
+    def __init__(self, profile: ServiceProfile):
+        self.profile = profile
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    def respond(self) -> Optional[int]:
+        """Sleep for the simulated latency; returns 429/500 for a failed call, else None"""
+        profile = self.profile
+        delay = profile.latency + random.uniform(-profile.jitter, profile.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        roll = random.random()
+        status = None
+        if roll < profile.rate_limit_rate:
+            status = 429
+        elif roll < profile.rate_limit_rate + profile.error_rate:
+            status = 500
+        with self._lock:
+            self.calls += 1
+            self.rate_limited += status == 429
+            self.errors += status == 500
+        return status
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"calls": self.calls, "errors": self.errors, "rate_limited": self.rate_limited}
+
+@dataclass
+class BenchmarkConfig:
+    companies: int = 100
+    mode: str = "fan_out"
+    concurrency: int = 10
+    page_bytes: int = 60 * 1024
+    contact_rate: float = 0.5  # Fraction of domains Hunter has emails for
+    lead_page_size: int = 500
+    real_quotas: bool = False
+    seed: int = 0
+    site: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency=0.15, jitter=0.1))
+    hunter: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency=0.3, jitter=0.1))
+    openai: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency=0.8, jitter=0.3))
+    sheets: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency=0.2, jitter=0.05))
+    gmail: ServiceProfile = field(default_factory=lambda: ServiceProfile(latency=0.25, jitter=0.05))
+
+# ============================================================================
+# FAKE HTTP SERVICES (websites, Hunter.io, OpenAI)
+# ============================================================================
+
+LOREM = (
+    "We build workflow software for operations teams. Our platform connects "
+    "spreadsheets, inboxes and internal tools so that routine work runs on its "
+    "own. Customers use it to onboard vendors, reconcile invoices and route "
+    "support requests. "
+)
+
+def synthetic_page(host: str, size: int) -> bytes:
+    """A homepage of roughly ``size`` bytes with navigation, scripts and body text"""
+    head = (
+        f"<!DOCTYPE html><html><head><title>{host}</title>"
+        "<style>body{font-family:sans-serif}</style>"
+        "<script>window.dataLayer=[];function gtag(){dataLayer.push(arguments)}</script>"
+        "</head><body><nav><a href='/'>Home</a> <a href='/pricing'>Pricing</a> "
+        "<a href='/about'>About</a></nav>"
+        f"<h1>{host}</h1>"
+    )
+    tail = "<footer>Copyright. All rights reserved. Privacy Terms</footer></body></html>"
+    paragraphs = []
+    length = len(head) + len(tail)
+    while length < size:
+        paragraph = f"<p>{LOREM}</p>"
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return (head + "".join(paragraphs) + tail).encode("utf-8")
+
+def hunter_payload(domain: str, contact_rate: float) -> Dict[str, Any]:
+    """Deterministic domain-search result: a domain has emails or it never does"""
+    has_emails = zlib.crc32(domain.encode("utf-8")) % 1000 < contact_rate * 1000
+    emails = []
+    if has_emails:
+        emails = [
+            {"value": f"founder@{domain}", "first_name": "Alex", "last_name": "Doe", "type": "personal"},
+            {"value": f"sales@{domain}", "first_name": None, "last_name": None, "type": "generic"},
+        ]
+    return {"data": {"domain": domain, "organization": domain.split(".")[0].title(), "emails": emails}, "meta": {}}
+
+def chat_completion_payload(request: Dict[str, Any]) -> Dict[str, Any]:
+    """OpenAI-shaped chat completion whose size follows the request's max_tokens"""
+    prompt = "".join(str(message.get("content", "")) for message in request.get("messages", []))
+    words = max(5, int(request.get("max_tokens", 100) * 0.6))
+    vocabulary = LOREM.split()
+    text = " ".join(vocabulary[i % len(vocabulary)] for i in range(words))
+    if (request.get("response_format") or {}).get("type") == "json_object":
+        content = json.dumps({"subject": "Quick question", "body": text})
+    else:
+        content = text
+    prompt_tokens = len(prompt) // 4
+    completion_tokens = len(content) // 4
+    return {
+        "id": f"chatcmpl-bench{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "bench"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        },
+    }
+
+def make_handler(config: BenchmarkConfig, services: Dict[str, FakeService]):
+    """Request handler serving the company sites, Hunter.io and OpenAI"""
+    page_cache: Dict[str, bytes] = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Keep-alive, like the real services
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, payload: Dict[str, Any]):
+            self._send(200, json.dumps(payload).encode("utf-8"), "application/json")
+
+        def _fail(self, status: int, service: FakeService):
+            headers = {"Retry-After": str(service.profile.retry_after)} if status == 429 else {}
+            body = json.dumps({"error": {"message": "simulated failure", "type": "bench", "code": status}})
+            self._send(status, body.encode("utf-8"), "application/json", headers)
+
+        def do_GET(self):
+            parts = urlsplit(self.path)
+            if parts.path == "/v2/domain-search":
+                status = services["hunter"].respond()
+                if status:
+                    return self._fail(status, services["hunter"])
+                domain = parse_qs(parts.query).get("domain", [""])[0].split(":")[0]
+                return self._send_json(hunter_payload(domain, config.contact_rate))
+
+            status = services["site"].respond()
+            if status:
+                return self._fail(status, services["site"])
+            host = (self.headers.get("Host") or "").split(":")[0]
+            body = page_cache.get(host)
+            if body is None:
+                body = page_cache.setdefault(host, synthetic_page(host, config.page_bytes))
+            self._send(200, body, "text/html; charset=utf-8")
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request = json.loads(self.rfile.read(length) or b"{}")
+            if urlsplit(self.path).path != "/v1/chat/completions":
+                return self._send(404, b"{}", "application/json")
+            status = services["openai"].respond()
+            if status:
+                return self._fail(status, services["openai"])
+            self._send_json(chat_completion_payload(request))
+
+    return Handler
+
+# ============================================================================
+# FAKE GOOGLE SERVICES (Sheets, Gmail)
+# ============================================================================
+
+class FakeGoogleRequest:
+    """Stand-in for a googleapiclient HttpRequest"""
+
+    def __init__(self, service: FakeService, result: Callable[[], Dict[str, Any]]):
+        self._service = service
+        self._result = result
+
+    def execute(self, **kwargs) -> Dict[str, Any]:
+        from googleapiclient.errors import HttpError
+        import httplib2
+
+        status = self._service.respond()
+        if status:
+            response = httplib2.Response({"status": status, "retry-after": str(self._service.profile.retry_after)})
+            raise HttpError(response, b'{"error": {"message": "simulated failure"}}')
+        return self._result()
+
+class FakeGoogleService:
+    """The subset of the Sheets v4 and Gmail v1 clients used by the workflow"""
+
+    def __init__(self, services: Dict[str, FakeService], company_urls: List[str]):
+        self._sheets = services["sheets"]
+        self._gmail = services["gmail"]
+        self._rows = [["Company"]] + [[url] for url in company_urls]
+        self._lock = threading.Lock()
+        self.log_rows = 0
+        self.drafts_created = 0
+
+    # Sheets: spreadsheets().get / batchUpdate / values().get
+    def spreadsheets(self):
+        return self
+
+    def values(self):
+        return _FakeValues(self)
+
+    def get(self, spreadsheetId=None, fields=None, **kwargs):
+        sheets = [{"properties": {"title": "Sheet1", "sheetId": 0}},
+                  {"properties": {"title": "Failures", "sheetId": 1}}]
+        return FakeGoogleRequest(self._sheets, lambda: {"sheets": sheets})
+
+    def batchUpdate(self, spreadsheetId=None, body=None, **kwargs):
+        def write():
+            rows = sum(len(r["appendCells"]["rows"]) for r in body["requests"] if "appendCells" in r)
+            with self._lock:
+                self.log_rows += rows
+            return {"replies": [{} for _ in body["requests"]]}
+        return FakeGoogleRequest(self._sheets, write)
+
+    # Gmail: users().drafts().create, also sent through new_batch_http_request
+    def new_batch_http_request(self, callback=None):
+        return _FakeBatch(self._gmail, callback)
+
+    def users(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def create(self, userId=None, body=None, **kwargs):
+        def create_draft():
+            with self._lock:
+                self.drafts_created += 1
+                return {"id": f"r-bench-{self.drafts_created}", "message": {"id": "m"}}
+        return FakeGoogleRequest(self._gmail, create_draft)
+
+class _FakeBatch:
+    """Stand-in for BatchHttpRequest: one simulated round trip for all requests"""
+
+    def __init__(self, service: FakeService, callback: Callable):
+        self._service = service
+        self._callback = callback
+        self._requests: List[tuple] = []
+
+    def add(self, request: FakeGoogleRequest, request_id: str = None):
+        self._requests.append((request_id or str(len(self._requests)), request))
+
+    def execute(self):
+        FakeGoogleRequest(self._service, lambda: {}).execute()
+        for request_id, request in self._requests:
+            self._callback(request_id, request._result(), None)
+
+class _FakeValues:
+    def __init__(self, service: FakeGoogleService):
+        self._service = service
+
+    def get(self, spreadsheetId=None, range=None, **kwargs):
+        def read():
+            # "Sheet1!A{first}:A{last}" as issued by GoogleSheetsLeadSource
+            first, _, last = range.split("!", 1)[1].replace("A", "").partition(":")
+            rows = self._service._rows[int(first or 1) - 1:int(last) if last else None]
+            return {"values": rows} if rows else {}
+        return FakeGoogleRequest(self._service._sheets, read)
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+class NodeTimer:
+    """Wall time of every node call, by node function name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+
+    def wrap(self, name: str, fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def timed(state, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(state, *args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self._lock:
+                    self.samples.setdefault(name, []).append(elapsed)
+        return timed
+
+def percentile(samples: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process in MiB (kilobytes on Linux, bytes on macOS)"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+# ============================================================================
+# RUNNER
+# ============================================================================
+
+def configure_environment(config: BenchmarkConfig, workdir: str, port: int) -> None:
+    """Point graph_main at the fakes; must run before graph_main is imported"""
+    os.environ.update({
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"http://127.0.0.1:{port}/v1",
+        "HUNTER_API_KEY": "bench",
+        "HUNTER_API_URL": f"http://127.0.0.1:{port}/v2/domain-search",
+        "EXECUTION_MODE": config.mode,
+        "MAX_CONCURRENT_COMPANIES": str(config.concurrency),
+        "LEAD_SOURCE": "sheets",
+        "LEAD_PAGE_SIZE": str(config.lead_page_size),
+        # Every run starts cold: no cached pages, contacts or completions
+        "HTTP_CACHE_ENABLED": "false",
+        "HUNTER_CACHE_ENABLED": "false",
+        "LLM_CACHE_MODE": "off",
+        "CACHE_DB_PATH": os.path.join(workdir, "cache.sqlite3"),
+        "CHECKPOINT_DB_PATH": os.path.join(workdir, "checkpoints.sqlite3"),
+        "SHEETS_LOG_JOURNAL": os.path.join(workdir, "sheets_log_journal.jsonl"),
+        "SHEETS_LOG_FLUSH_SECONDS": "1",
+    })
+    if not config.real_quotas:
+        # Measure the pipeline, not the provider quotas
+        for name in ("HUNTER_REQUESTS_PER_MINUTE", "OPENAI_REQUESTS_PER_MINUTE", "OPENAI_TOKENS_PER_MINUTE",
+                     "SHEETS_REQUESTS_PER_MINUTE", "GMAIL_REQUESTS_PER_MINUTE"):
+            os.environ[name] = "100000000"
+
+def run_benchmark(config: BenchmarkConfig) -> Dict[str, Any]:
+    """Run one campaign against the fakes and return its measurements"""
+    random.seed(config.seed)
+    services = {name: FakeService(getattr(config, name)) for name in SERVICES}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), make_handler(config, services))
+    server.daemon_threads = True
+    port = server.server_address[1]
+    threading.Thread(target=server.serve_forever, name="bench-server", daemon=True).start()
+
+    workdir = tempfile.mkdtemp(prefix="outbound-bench-")
+    configure_environment(config, workdir, port)
+    graph_main = importlib.import_module("graph_main")
+    from fetcher import AsyncFetcher
+
+    hosts = [SITE_HOST_TEMPLATE.format(i) for i in range(config.companies)]
+    google = FakeGoogleService(services, [f"http://{host}:{port}/" for host in hosts])
+    graph_main.get_google_service = lambda api, version: google
+    graph_main._website_fetcher = AsyncFetcher(
+        max_connections=graph_main.FETCH_MAX_CONNECTIONS,
+        host_delay=graph_main.DELAY_BETWEEN_REQUESTS,
+        max_bytes=graph_main.MAX_DOWNLOAD_BYTES,
+        timeout=graph_main.FETCH_TIMEOUT,
+        connect_timeout=graph_main.FETCH_CONNECT_TIMEOUT,
+        host_overrides={host: "127.0.0.1" for host in hosts},
+    )
+
+    timer = NodeTimer()
+    for name in NODE_FUNCTIONS:
+        setattr(graph_main, name, timer.wrap(name, getattr(graph_main, name)))
+
+    start = time.perf_counter()
+    try:
+        graph_main.main(["--run-id", f"bench-{int(time.time())}"])
+    finally:
+        elapsed = time.perf_counter() - start
+        graph_main._website_fetcher.close()
+        server.shutdown()
+
+    companies = google.log_rows
+    return {
+        "config": asdict(config),
+        "elapsed_seconds": round(elapsed, 3),
+        "companies": companies,
+        "companies_per_minute": round(companies / elapsed * 60, 2) if elapsed else 0.0,
+        "drafts": google.drafts_created,
+        "peak_rss_mb": round(peak_rss_mb(), 1) if resource else None,
+        "nodes": {
+            name: {
+                "calls": len(samples),
+                "p50_ms": round(percentile(samples, 50) * 1000, 1),
+                "p95_ms": round(percentile(samples, 95) * 1000, 1),
+                "max_ms": round(max(samples) * 1000, 1),
+            }
+            for name, samples in timer.samples.items()
+        },
+        "services": {name: service.stats() for name, service in services.items()},
+        "concurrency_limits": graph_main.CONCURRENCY_LIMITERS.snapshot() if graph_main.ADAPTIVE_CONCURRENCY else {},
+        "pipeline_stages": graph_main.get_company_pipeline().snapshot() if config.mode == "pipelined" else {},
+    }
+
+def print_report(report: Dict[str, Any]) -> None:
+    print(f"\nCompanies: {report['companies']} in {report['elapsed_seconds']:.1f}s "
+          f"-> {report['companies_per_minute']:.1f} companies/min ({report['drafts']} drafts)")
+    if report["peak_rss_mb"] is not None:
+        print(f"Peak RSS: {report['peak_rss_mb']:.1f} MiB (includes the fake services)")
+
+    print(f"\n{'node':<24}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}")
+    for name in NODE_FUNCTIONS:
+        stats = report["nodes"].get(name)
+        if stats:
+            print(f"{name:<24}{stats['calls']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+    print(f"\n{'service':<24}{'calls':>8}{'5xx':>10}{'429':>10}")
+    for name, stats in report["services"].items():
+        print(f"{name:<24}{stats['calls']:>8}{stats['errors']:>10}{stats['rate_limited']:>10}")
+
+    if report["concurrency_limits"]:
+        print(f"\n{'backend':<24}{'limit':>8}{'raised':>10}{'cut':>10}")
+        for name, limits in report["concurrency_limits"].items():
+            print(f"{name:<24}{limits['limit']:>8}{limits['increases']:>10}{limits['decreases']:>10}")
+
+    if report["pipeline_stages"]:
+        print(f"\n{'stage':<24}{'workers':>8}{'items':>10}{'busy %':>10}{'blocked s':>10}{'max queue':>10}")
+        for name, stats in report["pipeline_stages"].items():
+            print(f"{name:<24}{stats['workers']:>8}{stats['processed']:>10}{stats['utilization'] * 100:>10.0f}"
+                  f"{stats['blocked_seconds']:>10.1f}{stats['max_queued']:>10}")
+
+# ============================================================================
+# MAIN EXECUTION
+# ============================================================================
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command line options"""
+    defaults = BenchmarkConfig()
+    parser = argparse.ArgumentParser(description="Offline benchmark of the outbound workflow")
+    parser.add_argument("--companies", type=int, default=defaults.companies)
+    parser.add_argument("--mode", choices=["sequential", "fan_out", "pipelined"], default=defaults.mode)
+    parser.add_argument("--concurrency", type=int, default=defaults.concurrency,
+                        help="companies in flight in fan_out mode")
+    parser.add_argument("--page-bytes", type=int, default=defaults.page_bytes, help="size of each synthetic homepage")
+    parser.add_argument("--contact-rate", type=float, default=defaults.contact_rate,
+                        help="fraction of domains Hunter.io returns emails for")
+    parser.add_argument("--lead-page-size", type=int, default=defaults.lead_page_size)
+    parser.add_argument("--real-quotas", action="store_true",
+                        help="keep the configured provider rate limits instead of lifting them")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    parser.add_argument("--log-level", default="WARNING", help="log level of the workflow during the run")
+    for name in SERVICES:
+        profile = getattr(defaults, name)
+        parser.add_argument(f"--{name}-latency", type=float, default=profile.latency, help="mean seconds")
+        parser.add_argument(f"--{name}-jitter", type=float, default=profile.jitter)
+        parser.add_argument(f"--{name}-error-rate", type=float, default=profile.error_rate)
+        parser.add_argument(f"--{name}-429-rate", type=float, default=profile.rate_limit_rate)
+        parser.add_argument(f"--{name}-retry-after", type=float, default=profile.retry_after)
+    return parser.parse_args(argv)
+
+def config_from_args(args: argparse.Namespace) -> BenchmarkConfig:
+    config = BenchmarkConfig(
+        companies=args.companies,
+        mode=args.mode,
+        concurrency=args.concurrency,
+        page_bytes=args.page_bytes,
+        contact_rate=args.contact_rate,
+        lead_page_size=args.lead_page_size,
+        real_quotas=args.real_quotas,
+        seed=args.seed,
+    )
+    for name in SERVICES:
+        setattr(config, name, ServiceProfile(
+            latency=getattr(args, f"{name}_latency"),
+            jitter=getattr(args, f"{name}_jitter"),
+            error_rate=getattr(args, f"{name}_error_rate"),
+            rate_limit_rate=getattr(args, f"{name}_429_rate"),
+            retry_after=getattr(args, f"{name}_retry_after"),
+        ))
+    return config
+
+def main(argv: Optional[List[str]] = None):
+    """Run the benchmark and print (and optionally save) the report"""
+    args = parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper(), format='%(asctime)s - %(levelname)s - %(message)s')
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    
+    report = run_benchmark(config_from_args(args))
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""
+Persistent local caches backed by SQLite
+
+HTTPCache keeps company homepages (body, ETag, Last-Modified and the text
+extracted from them) so repeat campaigns can revalidate with a conditional
+request, or skip the network entirely within a TTL. HunterCache keeps
+Hunter.io domain-search results, including domains without any emails.
+LLMCache keeps OpenAI responses keyed by a hash of everything that shapes
+them, so reruns pay nothing for work that was already done.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+def normalize_url(url: str) -> str:
+    """Canonical cache key for a URL.
+
+    Lowercases scheme and host, drops default ports, fragments and trailing
+    slashes, and sorts query parameters.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path.rstrip("/")
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((scheme, host, path, query, ""))
+
+class SQLiteStore:
+    """One SQLite connection shared by all worker threads behind a lock"""
+
+    def __init__(self, path: str, schema: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(schema)
+
+    def execute(self, sql: str, params: Sequence[Any] = ()) -> List[sqlite3.Row]:
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# ============================================================================
+# HTTP CACHE
+# ============================================================================
+
+@dataclass
+class CachedPage:
+    """A stored homepage and its revalidation metadata"""
+    url: str
+    body: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    validated_at: float
+    text: Optional[str] = None  # Extracted text, if extracted with the current version
+
+    def is_fresh(self, ttl: float) -> bool:
+        """True if the page was fetched or revalidated less than ``ttl`` seconds ago"""
+        return time.time() - self.validated_at < ttl
+
+    def conditional_headers(self) -> Dict[str, str]:
+        """If-None-Match / If-Modified-Since headers for revalidating this page"""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+class HTTPCache(SQLiteStore):
+    """On-disk homepage cache keyed by normalized URL"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS http_cache (
+            url TEXT PRIMARY KEY,
+            body TEXT NOT NULL,
+            etag TEXT,
+            last_modified TEXT,
+            validated_at REAL NOT NULL,
+            text TEXT,
+            text_version INTEGER
+        );
+    """
+
+    def __init__(self, path: str, text_version: int = 1):
+        super().__init__(path, self.SCHEMA)
+        self.text_version = text_version
+
+    def lookup(self, url: str) -> Optional[CachedPage]:
+        rows = self.execute(
+            "SELECT body, etag, last_modified, validated_at, text, text_version FROM http_cache WHERE url = ?",
+            (normalize_url(url),),
+        )
+        if not rows:
+            return None
+        body, etag, last_modified, validated_at, text, text_version = rows[0]
+        return CachedPage(
+            url=url,
+            body=body,
+            etag=etag,
+            last_modified=last_modified,
+            validated_at=validated_at,
+            text=text if text_version == self.text_version else None,
+        )
+
+    def store(self, url: str, body: str, etag: Optional[str], last_modified: Optional[str]) -> None:
+        """Save a freshly downloaded page; any previously extracted text is dropped"""
+        self.execute(
+            "INSERT OR REPLACE INTO http_cache (url, body, etag, last_modified, validated_at, text, text_version) "
+            "VALUES (?, ?, ?, ?, ?, NULL, NULL)",
+            (normalize_url(url), body, etag, last_modified, time.time()),
+        )
+
+    def touch(self, url: str) -> None:
+        """Mark a page as revalidated (the server answered 304 Not Modified)"""
+        self.execute("UPDATE http_cache SET validated_at = ? WHERE url = ?", (time.time(), normalize_url(url)))
+
+    def store_text(self, url: str, text: str) -> None:
+        """Attach the extracted text to a cached page"""
+        self.execute(
+            "UPDATE http_cache SET text = ?, text_version = ? WHERE url = ?",
+            (text, self.text_version, normalize_url(url)),
+        )
+
+# ============================================================================
+# HUNTER CACHE
+# ============================================================================
+
+class HunterCache(SQLiteStore):
+    """Hunter.io domain-search results keyed by domain.
+
+    Results with emails live for ``ttl`` seconds; "no emails" results are
+    cached too (negative caching) but expire after ``negative_ttl`` seconds.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS hunter_cache (
+            domain TEXT PRIMARY KEY,
+            payload TEXT NOT NULL,
+            has_emails INTEGER NOT NULL,
+            fetched_at REAL NOT NULL
+        );
+    """
+
+    def __init__(self, path: str, ttl: float, negative_ttl: float):
+        super().__init__(path, self.SCHEMA)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+
+    def get(self, domain: str) -> Optional[Dict[str, Any]]:
+        """Cached ``data`` section of a domain-search response, or None on a miss"""
+        rows = self.execute(
+            "SELECT payload, has_emails, fetched_at FROM hunter_cache WHERE domain = ?",
+            (domain.lower(),),
+        )
+        if not rows:
+            return None
+        payload, has_emails, fetched_at = rows[0]
+        ttl = self.ttl if has_emails else self.negative_ttl
+        if time.time() - fetched_at >= ttl:
+            return None
+        return json.loads(payload)
+
+    def put(self, domain: str, data: Dict[str, Any]) -> None:
+        """Store the ``data`` section of a domain-search response (may be empty)"""
+        self.execute(
+            "INSERT OR REPLACE INTO hunter_cache (domain, payload, has_emails, fetched_at) VALUES (?, ?, ?, ?)",
+            (domain.lower(), json.dumps(data), int(bool(data.get("emails"))), time.time()),
+        )
+
+# ============================================================================
+# LLM RESPONSE CACHE
+# ============================================================================
+
+def llm_cache_key(model: str, template_version: str, messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """Content hash of a chat completion request"""
+    payload = json.dumps(
+        {"model": model, "template": template_version, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class LLMCache(SQLiteStore):
+    """Chat completion texts keyed by ``llm_cache_key``, evicted least-recently-used.
+
+    Eviction runs every ``EVICT_EVERY`` inserts and trims the table back to
+    ``max_entries`` rows.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS llm_cache_last_used ON llm_cache (last_used_at);
+    """
+    EVICT_EVERY = 100
+
+    def __init__(self, path: str, max_entries: int):
+        super().__init__(path, self.SCHEMA)
+        self.max_entries = max_entries
+        self._inserts = 0
+
+    def get(self, key: str) -> Optional[str]:
+        rows = self.execute("SELECT response FROM llm_cache WHERE key = ?", (key,))
+        if not rows:
+            return None
+        self.execute("UPDATE llm_cache SET last_used_at = ? WHERE key = ?", (time.time(), key))
+        return rows[0][0]
+
+    def put(self, key: str, response: str) -> None:
+        now = time.time()
+        self.execute(
+            "INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_used_at) VALUES (?, ?, ?, ?)",
+            (key, response, now, now),
+        )
+        self._inserts += 1
+        if self._inserts % self.EVICT_EVERY == 0:
+            self.evict()
+
+    def delete(self, key: str) -> None:
+        self.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+
+    def evict(self) -> None:
+        """Drop the least recently used entries beyond ``max_entries``"""
+        self.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
@@ -0,0 +1,171 @@
+"""
+Durable progress for long campaigns
+
+open_checkpointer returns a SQLite-backed LangGraph checkpointer so a crashed
+or interrupted run can continue from its last superstep (``--resume``).
+CompletionLedger records, per run and company URL, whether a draft was
+created and whether the company is finished, so no company is drafted twice
+and finished companies are skipped when a run is resumed. It also keeps the
+log row written for each registrable domain, so rows of a domain that was
+already processed can be logged without processing it again.
+"""
+
+import json
+import logging
+import sqlite3
+import time
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Set, Tuple
+
+from caching import SQLiteStore
+
+logger = logging.getLogger(__name__)
+
+# Ledger statuses; a company is finished once it is SUCCEEDED or FAILED
+DRAFTING = "drafting"  # A draft was being created; it may exist without its id in the ledger
+DRAFTED = "drafted"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+# ============================================================================
+# CHECKPOINTER
+# ============================================================================
+
+def open_checkpointer(path: str, allowed_types: Iterable[Tuple[str, str]] = ()):
+    """SqliteSaver on ``path``, or None if langgraph-checkpoint-sqlite is missing.
+
+    ``allowed_types`` lists (module, class name) pairs of custom state types
+    the serializer may restore from a checkpoint.
+    """
+    try:
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+        from langgraph.checkpoint.sqlite import SqliteSaver
+    except ImportError:
+        logger.warning("langgraph-checkpoint-sqlite is not installed; runs cannot be resumed")
+        return None
+
+    try:
+        serde = JsonPlusSerializer(allowed_msgpack_modules=list(allowed_types))
+    except TypeError:  # Older langgraph without an allow-list
+        serde = JsonPlusSerializer()
+
+    conn = sqlite3.connect(path, check_same_thread=False)
+    return SqliteSaver(conn, serde=serde)
+
+def prune_checkpoints(checkpointer, thread_id: str) -> int:
+    """Delete all but the latest checkpoint of ``thread_id``; returns how many were deleted.
+
+    Resuming only needs the latest checkpoint and its pending writes, and
+    SqliteSaver stores every checkpoint whole, so the older ones are dead
+    weight. Other checkpointers are left alone.
+    """
+    conn = getattr(checkpointer, "conn", None)
+    if not isinstance(conn, sqlite3.Connection):
+        return 0
+    deleted = 0
+    with checkpointer.lock, conn:
+        checkpointer.setup()
+        latest = conn.execute(
+            "SELECT checkpoint_ns, MAX(checkpoint_id) FROM checkpoints WHERE thread_id = ? GROUP BY checkpoint_ns",
+            (thread_id,),
+        ).fetchall()
+        for checkpoint_ns, checkpoint_id in latest:
+            cursor = conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+            deleted += cursor.rowcount
+            conn.execute(
+                "DELETE FROM writes WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, checkpoint_id),
+            )
+    return deleted
+
+# ============================================================================
+# COMPLETION LEDGER
+# ============================================================================
+
+@dataclass
+class DomainResult:
+    """The log row written for the URL processed on behalf of a whole domain"""
+    url: str
+    log_range: str
+    row: List[Any]
+
+    def row_for(self, lead_url: str) -> List[Any]:
+        """The same row for another lead row of the domain"""
+        return [lead_url if cell == self.url else cell for cell in self.row]
+
+class CompletionLedger(SQLiteStore):
+    """Per-run, per-URL progress that survives restarts"""
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS completion_ledger (
+            run_id TEXT NOT NULL,
+            url TEXT NOT NULL,
+            status TEXT NOT NULL,
+            draft_id TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (run_id, url)
+        );
+        CREATE TABLE IF NOT EXISTS domain_results (
+            run_id TEXT NOT NULL,
+            domain TEXT NOT NULL,
+            url TEXT NOT NULL,
+            log_range TEXT NOT NULL,
+            row_json TEXT NOT NULL,
+            PRIMARY KEY (run_id, domain)
+        );
+    """
+
+    def __init__(self, path: str):
+        super().__init__(path, self.SCHEMA)
+
+    def mark(self, run_id: str, url: str, status: str, draft_id: Optional[str] = None) -> None:
+        """Record ``status`` for ``url``; a known draft id is never overwritten with None"""
+        self.execute(
+            "INSERT INTO completion_ledger (run_id, url, status, draft_id, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (run_id, url) DO UPDATE SET status = excluded.status, "
+            "draft_id = COALESCE(excluded.draft_id, completion_ledger.draft_id), updated_at = excluded.updated_at",
+            (run_id, url, status, draft_id, time.time()),
+        )
+
+    def status(self, run_id: str, url: str) -> Optional[str]:
+        rows = self.execute(
+            "SELECT status FROM completion_ledger WHERE run_id = ? AND url = ?", (run_id, url)
+        )
+        return rows[0][0] if rows else None
+
+    def draft_id(self, run_id: str, url: str) -> Optional[str]:
+        """Id of the draft already created for ``url`` in this run, if any"""
+        rows = self.execute(
+            "SELECT draft_id FROM completion_ledger WHERE run_id = ? AND url = ?", (run_id, url)
+        )
+        return rows[0][0] if rows else None
+
+    def is_finished(self, run_id: str, url: str) -> bool:
+        rows = self.execute(
+            "SELECT 1 FROM completion_ledger WHERE run_id = ? AND url = ? AND status IN (?, ?)",
+            (run_id, url, SUCCEEDED, FAILED),
+        )
+        return bool(rows)
+
+    def finished_urls(self, run_id: str) -> Set[str]:
+        rows = self.execute(
+            "SELECT url FROM completion_ledger WHERE run_id = ? AND status IN (?, ?)",
+            (run_id, SUCCEEDED, FAILED),
+        )
+        return {row[0] for row in rows}
+
+    def record_domain(self, run_id: str, domain: str, url: str, log_range: str, row: List[Any]) -> None:
+        """Remember the log row written for ``domain``, processed as ``url``"""
+        self.execute(
+            "INSERT OR REPLACE INTO domain_results (run_id, domain, url, log_range, row_json) VALUES (?, ?, ?, ?, ?)",
+            (run_id, domain, url, log_range, json.dumps(row)),
+        )
+
+    def domain_result(self, run_id: str, domain: str) -> Optional[DomainResult]:
+        rows = self.execute(
+            "SELECT url, log_range, row_json FROM domain_results WHERE run_id = ? AND domain = ?", (run_id, domain)
+        )
+        return DomainResult(rows[0][0], rows[0][1], json.loads(rows[0][2])) if rows else None
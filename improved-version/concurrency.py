@@ -0,0 +1,206 @@
+"""
+Adaptive (AIMD) concurrency limits per backend
+
+Every backend (website fetches, Hunter, OpenAI, Sheets, Gmail) gets an
+AdaptiveLimiter that caps how many calls are in flight at once. The limit
+grows additively, by about one call per limit's worth of healthy calls,
+while the limit is actually in use; it is cut multiplicatively when a call
+is rate limited, times out, or takes much longer than the backend's recent
+typical latency. Only one cut is made per round of calls: calls that started
+before the last cut say nothing about the new limit.
+
+Rate limiting (how many calls per minute) stays with rate_limiter's token
+buckets; this bounds how many run at the same time.
+"""
+
+import logging
+import math
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Weight of a new sample in the latency average
+LATENCY_EWMA_ALPHA = 0.05
+
+# Calls measured before latency spikes count as overload
+LATENCY_WARMUP_CALLS = 10
+
+def is_timeout(error: BaseException) -> bool:
+    """True for timeouts of any of the HTTP clients in use (builtin, requests, httpx, openai)"""
+    return isinstance(error, TimeoutError) or any("Timeout" in cls.__name__ for cls in type(error).__mro__)
+
+# ============================================================================
+# LIMITER
+# ============================================================================
+
+class AdaptiveLimiter:
+    """Thread-safe AIMD limit on the number of calls in flight.
+
+    The limit starts at ``initial`` and stays within [``min_limit``,
+    ``max_limit``]. A call slower than ``spike_ratio`` times the average
+    latency counts as overload, like a 429 or a timeout, and multiplies the
+    limit by ``decrease_factor``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        initial: float,
+        min_limit: float = 1,
+        max_limit: float = 64,
+        decrease_factor: float = 0.5,
+        spike_ratio: Optional[float] = 2.5,
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError(f"Concurrency limiter {name} needs 1 <= min_limit <= max_limit")
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.spike_ratio = spike_ratio
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._in_flight = 0
+        self._latency: Optional[float] = None
+        self._calls = 0
+        self._increases = 0
+        self._decreases = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return max(1, math.floor(self._limit))
+
+    def acquire(self) -> bool:
+        """Block until a call may start; returns whether it filled the limit"""
+        with self._condition:
+            while self._in_flight >= self.limit:
+                self._condition.wait()
+            self._in_flight += 1
+            return self._in_flight >= self.limit
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free right now"""
+        with self._condition:
+            if self._in_flight >= self.limit:
+                return False
+            self._in_flight += 1
+            return True
+
+    def release_when_done(self, future: Future, is_overload: Callable[[Exception], bool] = is_timeout) -> None:
+        """Release a slot taken with ``try_acquire`` once ``future`` finishes.
+
+        Cancelled calls say nothing about the backend, and calls that only
+        used spare capacity never raise the limit.
+        """
+        started = time.monotonic()
+
+        def done(f: Future) -> None:
+            error = None if f.cancelled() else f.exception()
+            overloaded = isinstance(error, Exception) and is_overload(error)
+            self.release(started, time.monotonic() - started, overloaded=overloaded,
+                         failed=f.cancelled() or error is not None, saturated=False)
+
+        future.add_done_callback(done)
+
+    def release(self, started: float, latency: float, overloaded: bool = False, failed: bool = False,
+                saturated: bool = True) -> None:
+        """Finish a call that started at ``started`` (monotonic) and took ``latency`` seconds.
+
+        ``overloaded`` calls cut the limit, ``failed`` ones leave it as is,
+        and healthy calls raise it when the limit was ``saturated``.
+        """
+        with self._condition:
+            self._in_flight -= 1
+            self._calls += 1
+            spike = (
+                self.spike_ratio is not None and self._latency is not None
+                and self._calls > LATENCY_WARMUP_CALLS and latency > self.spike_ratio * self._latency
+            )
+            if not overloaded and not failed:
+                self._latency = latency if self._latency is None else \
+                    self._latency + LATENCY_EWMA_ALPHA * (latency - self._latency)
+            if overloaded or spike:
+                if started >= self._last_decrease:
+                    old = self.limit
+                    self._limit = max(self.min_limit, self._limit * self.decrease_factor)
+                    self._last_decrease = time.monotonic()
+                    self._decreases += 1
+                    logger.info(f"Concurrency limit for {self.name} cut from {old} to {self.limit} "
+                                f"({'latency spike' if not overloaded else 'overload'})")
+            elif not failed and saturated and self._limit < self.max_limit:
+                self._limit = min(self.max_limit, self._limit + 1 / self._limit)
+                self._increases += 1
+            self._condition.notify_all()
+
+    def call(self, fn: Callable[[], Any], is_overload: Callable[[Exception], bool] = is_timeout) -> Any:
+        """Run ``fn`` within the limit; exceptions for which ``is_overload`` holds cut it"""
+        saturated = self.acquire()
+        started = time.monotonic()
+        try:
+            result = fn()
+        except Exception as e:
+            self.release(started, time.monotonic() - started, overloaded=is_overload(e), failed=True,
+                         saturated=saturated)
+            raise
+        except BaseException:
+            self.release(started, time.monotonic() - started, failed=True, saturated=saturated)
+            raise
+        self.release(started, time.monotonic() - started, saturated=saturated)
+        return result
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current limit, calls in flight, latency average and adjustment counts"""
+        with self._condition:
+            return {
+                "limit": self.limit,
+                "in_flight": self._in_flight,
+                "latency_ewma_seconds": round(self._latency or 0.0, 4),
+                "increases": self._increases,
+                "decreases": self._decreases,
+            }
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+class ConcurrencyLimiterRegistry:
+    """Named limiters shared by the whole process"""
+
+    def __init__(self):
+        self._limiters: Dict[str, AdaptiveLimiter] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, name: str, initial: float, max_limit: float, **kwargs) -> AdaptiveLimiter:
+        """Create (or replace) the limiter for ``name``"""
+        limiter = AdaptiveLimiter(name, initial, max_limit=max_limit, **kwargs)
+        with self._lock:
+            self._limiters[name] = limiter
+        return limiter
+
+    def get(self, name: str) -> AdaptiveLimiter:
+        with self._lock:
+            return self._limiters[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """State of every configured limiter, keyed by backend name"""
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return {limiter.name: limiter.snapshot() for limiter in limiters}
+
+    def prometheus_text(self, prefix: str = "outbound") -> str:
+        """Current limits and calls in flight in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for metric, key, help_text in (
+            ("concurrency_limit", "limit", "Current adaptive concurrency limit per backend"),
+            ("concurrency_in_flight", "in_flight", "Calls in flight per backend"),
+        ):
+            lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} gauge"]
+            lines += [f'{prefix}_{metric}{{backend="{name}"}} {values[key]}' for name, values in sorted(snapshot.items())]
+        return "\n".join(lines) + "\n"
+
+CONCURRENCY_LIMITERS = ConcurrencyLimiterRegistry()
@@ -0,0 +1,145 @@
+"""
+Token-aware reduction of page text before summarization
+
+reduce_content takes the line-per-block text from text_extraction and keeps
+what is worth paying for: repeated lines (menus, taglines and footers that
+appear on every block) are kept once, short boilerplate lines such as cookie
+notices and copyright lines are dropped, as are runs of short menu-like
+lines, and the rest is cut to a budget counted in model tokens rather than
+characters.
+
+Tokens are counted with tiktoken when it is installed and its encoding can
+be loaded; otherwise (e.g. no network to download the BPE file) a 4
+characters per token estimate is used.
+"""
+
+import logging
+import re
+import threading
+from typing import Any, Dict, List, Optional
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# Used when tiktoken doesn't know the model
+DEFAULT_ENCODING = "o200k_base"
+CHARS_PER_TOKEN = 4
+
+# Lines of at most BOILERPLATE_MAX_WORDS words matching this are page chrome
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|privacy policy|terms (of|and) (use|service|conditions)|all rights reserved|©|\(c\)|copyright"
+    r"|^(sign|log) ?(in|up|out)\b|subscribe|newsletter|skip to (main )?content|accept all|back to top",
+    re.IGNORECASE,
+)
+BOILERPLATE_MAX_WORDS = 12
+
+# At least MENU_RUN_LENGTH consecutive lines of at most MENU_MAX_WORDS words
+# without sentence punctuation are taken to be a menu
+MENU_RUN_LENGTH = 3
+MENU_MAX_WORDS = 3
+SENTENCE_END = re.compile(r"[.!?:]$")
+
+# ============================================================================
+# TOKEN COUNTING
+# ============================================================================
+
+_encodings: Dict[str, Any] = {}
+_encodings_lock = threading.Lock()
+
+def get_encoding(model: str):
+    """tiktoken encoding for ``model``, or None when tiktoken can't provide one.
+
+    Loaded once per model under a lock, so threads asking at the same time
+    wait for the first load instead of each attempting (and logging) it; a
+    failed load is cached too.
+    """
+    try:
+        return _encodings[model]
+    except KeyError:
+        pass
+    with _encodings_lock:
+        if model not in _encodings:
+            _encodings[model] = _load_encoding(model)
+        return _encodings[model]
+
+def _load_encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken encoding for {model} unavailable, estimating tokens from length: {e}")
+        return None
+
+def count_tokens(text: str, model: str) -> int:
+    """Tokens ``text`` takes up for ``model``"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """The longest prefix of ``text`` that fits in ``max_tokens`` tokens"""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+# ============================================================================
+# REDUCTION
+# ============================================================================
+
+def is_boilerplate(line: str) -> bool:
+    """True for short lines that are cookie notices, legal footers, login links and the like"""
+    return len(line.split()) <= BOILERPLATE_MAX_WORDS and bool(BOILERPLATE_PATTERN.search(line))
+
+def _is_menu_item(line: str) -> bool:
+    return len(line.split()) <= MENU_MAX_WORDS and not SENTENCE_END.search(line)
+
+def drop_menu_runs(lines: List[str]) -> List[str]:
+    """``lines`` without runs of MENU_RUN_LENGTH or more menu-like lines"""
+    kept: List[str] = []
+    run: List[str] = []
+    for line in lines + [None]:
+        if line is not None and _is_menu_item(line):
+            run.append(line)
+            continue
+        if len(run) < MENU_RUN_LENGTH:
+            kept.extend(run)
+        run = []
+        if line is not None:
+            kept.append(line)
+    return kept
+
+def dedupe_lines(lines: List[str]) -> List[str]:
+    """``lines`` with every line after its first occurrence removed (case-insensitive)"""
+    seen = set()
+    unique = []
+    for line in lines:
+        key = line.casefold()
+        if key not in seen:
+            seen.add(key)
+            unique.append(line)
+    return unique
+
+def reduce_content(text: Optional[str], max_tokens: int, model: str) -> str:
+    """Main content of ``text`` within ``max_tokens`` tokens, one line per block.
+
+    If every line looks like boilerplate the deduplicated text is kept
+    instead, so a page is never reduced to nothing.
+    """
+    if not text:
+        return ""
+    lines = dedupe_lines([" ".join(line.split()) for line in text.splitlines() if line.strip()])
+    content = drop_menu_runs([line for line in lines if not is_boilerplate(line)]) or lines
+    return truncate_to_tokens("\n".join(content), max_tokens, model)
@@ -0,0 +1,252 @@
+"""
+Pooled asynchronous website fetcher
+
+One httpx.AsyncClient runs on a dedicated background event loop and is shared
+by every worker thread of the workflow, so TCP/TLS connections, resolved DNS
+names and HTTP/2 sessions are reused across companies. Politeness is enforced
+per host instead of with a global sleep. Bodies are streamed and reading stops
+at a byte budget; non-HTML responses are rejected before their body is read.
+"""
+
+import asyncio
+import concurrent.futures
+import importlib.util
+import logging
+import socket
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpcore
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# Hosts remembered for request spacing before those no longer waited on are dropped
+HOST_SLOTS_PRUNE_SIZE = 1024
+
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml")
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+}
+
+# ============================================================================
+# RESULT TYPE
+# ============================================================================
+
+class UnsupportedContentType(Exception):
+    """The server answered with something other than an HTML page"""
+
+@dataclass
+class FetchResult:
+    """Outcome of a single page fetch"""
+    url: str  # Final URL after redirects
+    status_code: int
+    text: str
+    headers: Dict[str, str] = field(default_factory=dict)
+    http_version: str = "HTTP/1.1"
+    content: bytes = b""  # Raw body as read (at most the byte budget)
+    encoding: str = "utf-8"
+    truncated: bool = False  # True if the body was cut off at the byte budget
+
+# ============================================================================
+# TRANSPORT
+# ============================================================================
+
+class CachingDNSBackend(httpcore.AsyncNetworkBackend):
+    """Network backend that caches getaddrinfo results for ``ttl`` seconds.
+
+    Only the TCP connect goes to the cached address; TLS still uses the
+    original host name for SNI and certificate checks. ``host_overrides``
+    pins host names to fixed addresses, like curl's --resolve.
+    """
+
+    def __init__(self, ttl: float, host_overrides: Optional[Dict[str, str]] = None):
+        self._backend = httpcore.AnyIOBackend()
+        self._ttl = ttl
+        self._cache: Dict[Tuple[str, int], Tuple[float, str]] = {}
+        self._host_overrides = {host.lower(): address for host, address in (host_overrides or {}).items()}
+
+    async def _resolve(self, host: str, port: int) -> str:
+        try:
+            socket.inet_pton(socket.AF_INET6 if ":" in host else socket.AF_INET, host)
+            return host  # Already an IP address
+        except OSError:
+            pass
+
+        override = self._host_overrides.get(host.lower())
+        if override:
+            return override
+
+        now = time.monotonic()
+        cached = self._cache.get((host, port))
+        if cached and cached[0] > now:
+            return cached[1]
+
+        infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        address = infos[0][4][0]
+        self._cache[(host, port)] = (now + self._ttl, address)
+        return address
+
+    async def connect_tcp(self, host, port, timeout=None, local_address=None, socket_options=None):
+        address = await self._resolve(host, port)
+        return await self._backend.connect_tcp(
+            address, port, timeout=timeout, local_address=local_address, socket_options=socket_options
+        )
+
+    async def connect_unix_socket(self, path, timeout=None, socket_options=None):
+        return await self._backend.connect_unix_socket(path, timeout=timeout, socket_options=socket_options)
+
+    async def sleep(self, seconds: float) -> None:
+        await self._backend.sleep(seconds)
+
+class PooledTransport(httpx.AsyncHTTPTransport):
+    """httpx transport whose connection pool resolves hosts through CachingDNSBackend"""
+
+    def __init__(self, limits: httpx.Limits, http2: bool, dns_cache_ttl: float,
+                 host_overrides: Optional[Dict[str, str]] = None):
+        super().__init__(limits=limits, http2=http2)
+        self._pool = httpcore.AsyncConnectionPool(
+            ssl_context=httpx.create_ssl_context(),
+            max_connections=limits.max_connections,
+            max_keepalive_connections=limits.max_keepalive_connections,
+            keepalive_expiry=limits.keepalive_expiry,
+            http1=True,
+            http2=http2,
+            network_backend=CachingDNSBackend(dns_cache_ttl, host_overrides),
+        )
+
+# ============================================================================
+# FETCHER
+# ============================================================================
+
+class AsyncFetcher:
+    """Shared website fetcher with a pooled async client and per-host politeness.
+
+    ``fetch`` is a blocking facade for the synchronous graph nodes: it submits
+    the request to the background loop and waits for the result, so any
+    number of worker threads can have fetches in flight at once.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = 100,
+        host_delay: float = 1.0,
+        max_bytes: int = 512 * 1024,
+        timeout: float = 30.0,
+        connect_timeout: float = 10.0,
+        dns_cache_ttl: float = 300.0,
+        headers: Optional[Dict[str, str]] = None,
+        host_overrides: Optional[Dict[str, str]] = None,
+    ):
+        self.host_delay = host_delay
+        self.max_bytes = max_bytes
+        self._host_next_slot: Dict[str, float] = {}
+        self._prune_hosts_at = HOST_SLOTS_PRUNE_SIZE
+
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="website-fetcher", daemon=True)
+        self._thread.start()
+
+        limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        timeouts = httpx.Timeout(timeout, connect=connect_timeout)
+
+        async def create_client() -> httpx.AsyncClient:
+            return httpx.AsyncClient(
+                transport=PooledTransport(limits, HTTP2_AVAILABLE, dns_cache_ttl, host_overrides),
+                headers=headers or DEFAULT_HEADERS,
+                timeout=timeouts,
+                follow_redirects=True,
+            )
+
+        self._client = self._submit(create_client())
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def _wait_for_host(self, host: str) -> None:
+        """Space out requests to the same host by at least ``host_delay`` seconds"""
+        if self.host_delay <= 0:
+            return
+        # Reserve the next slot before sleeping; the loop is single-threaded,
+        # so concurrent callers for the same host queue up behind each other
+        now = time.monotonic()
+        slot = max(now, self._host_next_slot.get(host, 0.0))
+        self._host_next_slot[host] = slot + self.host_delay
+        if len(self._host_next_slot) >= self._prune_hosts_at:
+            self._prune_host_slots(now)
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def _prune_host_slots(self, now: float) -> None:
+        """Forget hosts whose next slot has passed; a new request to them needs no wait anyway"""
+        self._host_next_slot = {host: slot for host, slot in self._host_next_slot.items() if slot > now}
+        # Prune again once the table has doubled, so a lead list of distinct hosts costs O(1) per request
+        self._prune_hosts_at = max(HOST_SLOTS_PRUNE_SIZE, 2 * len(self._host_next_slot))
+
+    async def afetch(self, url: str, headers: Optional[Dict[str, str]] = None) -> FetchResult:
+        """Fetch ``url`` on the fetcher loop, reading at most ``max_bytes`` of the body.
+
+        Raises httpx.HTTPStatusError on 4xx/5xx and UnsupportedContentType
+        when a successful response is not HTML.
+        """
+        await self._wait_for_host(urlparse(url).hostname or url)
+
+        async with self._client.stream("GET", url, headers=headers) as response:
+            if response.status_code >= 400:
+                response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "")
+            if response.status_code == 200 and content_type and not content_type.lower().startswith(HTML_CONTENT_TYPES):
+                raise UnsupportedContentType(f"Skipping {url}: content type {content_type}")
+
+            body = bytearray()
+            truncated = False
+            async for chunk in response.aiter_bytes():
+                body += chunk
+                if len(body) >= self.max_bytes:
+                    truncated = True
+                    del body[self.max_bytes:]
+                    break
+
+            encoding = response.encoding or "utf-8"
+            return FetchResult(
+                url=str(response.url),
+                status_code=response.status_code,
+                text=body.decode(encoding, errors="replace"),
+                headers=dict(response.headers),
+                http_version=response.http_version,
+                content=bytes(body),
+                encoding=encoding,
+                truncated=truncated,
+            )
+
+    def submit(self, url: str, headers: Optional[Dict[str, str]] = None,
+               timeout: Optional[float] = None) -> "concurrent.futures.Future[FetchResult]":
+        """Start fetching ``url`` on the fetcher loop without waiting for it.
+
+        ``timeout`` bounds the whole fetch, including a slowly trickling body.
+        Cancelling the returned future aborts the request.
+        """
+        coro = self.afetch(url, headers) if timeout is None else asyncio.wait_for(self.afetch(url, headers), timeout)
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, timeout: Optional[float] = None) -> FetchResult:
+        """Blocking wrapper around ``afetch`` for use from worker threads (see ``submit``)"""
+        return self.submit(url, headers, timeout).result()
+
+    def close(self) -> None:
+        """Close pooled connections and stop the background loop"""
+        if not self._loop.is_running():
+            return
+        try:
+            self._submit(self._client.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
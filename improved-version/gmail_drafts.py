@@ -0,0 +1,253 @@
+"""
+Gmail draft creation
+
+create_message_raw builds the base64url-encoded MIME message of a draft.
+GmailDraftBatcher collects drafts from all worker threads and creates them
+through the Google API client's batch HTTP endpoint, up to ``batch_size``
+drafts per HTTP request. MIME messages are built on the batcher thread, and
+the draft id (or the error) of every draft is delivered to the Future that
+``submit`` returned for it.
+
+A batch request counts as one call for Gmail's circuit breaker: while it is
+open, queued drafts fail at once with CircuitOpenError instead of being
+sent. Each draft also carries the deadline of the company that submitted
+it, and is failed with DeadlineExceeded rather than sent or retried once
+that has passed.
+"""
+
+import base64
+import hashlib
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from email.mime.text import MIMEText
+from typing import Any, Callable, List, Optional, Tuple
+
+from concurrency import AdaptiveLimiter
+from rate_limiter import TokenBucket
+from resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, current_deadline, is_transient
+
+logger = logging.getLogger(__name__)
+
+# Google accepts up to 100 calls per batch; Gmail recommends at most 50
+MAX_BATCH_SIZE = 50
+
+def create_message_raw(to, subject, body, message_id=None):
+    """Create a raw message for Gmail API"""
+    message = MIMEText(body)
+    message['to'] = to
+    message['subject'] = subject
+    if message_id:
+        message['Message-ID'] = message_id
+
+    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
+    return raw
+
+def draft_message_id(*parts: str) -> str:
+    """Deterministic Message-ID for the draft identified by ``parts`` (e.g. run id and company URL).
+
+    Gmail search finds it again with ``rfc822msgid:``, so a draft created by a
+    worker that crashed before recording it can be found instead of duplicated.
+    """
+    digest = hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:32]
+    return f"<{digest}@outbound-drafts.invalid>"
+
+@dataclass
+class _PendingDraft:
+    to: str
+    subject: str
+    body: str
+    message_id: Optional[str] = None
+    deadline: Optional[float] = None  # time.time() timestamp
+    future: Future = field(default_factory=Future)
+    attempts: int = 0
+
+    def expired(self, after: float = 0.0) -> bool:
+        """True if the deadline passes within ``after`` seconds"""
+        return self.deadline is not None and time.time() + after >= self.deadline
+
+class GmailDraftBatcher:
+    """Creates drafts in batches on a background thread.
+
+    A batch is sent once ``batch_size`` drafts are queued or ``max_wait``
+    seconds after its first draft arrived. Each draft takes one token from
+    ``bucket``; drafts answered with a rate-limit error (per
+    ``retry_after_of``) pause the bucket and are queued again, up to
+    ``max_attempts`` tries. With a ``limiter`` batch requests run within
+    Gmail's adaptive concurrency limit, and with a ``breaker`` they are only
+    sent while Gmail's circuit breaker lets calls through.
+    """
+
+    def __init__(
+        self,
+        get_service: Callable[[], Any],
+        bucket: TokenBucket,
+        retry_after_of: Callable[[Exception], Optional[float]],
+        batch_size: int = MAX_BATCH_SIZE,
+        max_wait: float = 0.25,
+        max_attempts: int = 3,
+        default_backoff: float = 5.0,
+        limiter: Optional[AdaptiveLimiter] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self._get_service = get_service
+        self._bucket = bucket
+        self._retry_after_of = retry_after_of
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_wait = max_wait
+        self.max_attempts = max_attempts
+        self.default_backoff = default_backoff
+        self._limiter = limiter
+        self._breaker = breaker
+
+        self._queue: "queue.Queue[Optional[_PendingDraft]]" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="gmail-draft-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, to: str, subject: str, body: str, message_id: Optional[str] = None) -> Future:
+        """Queue a draft; the Future resolves to its draft id.
+
+        The draft is dropped if the caller's deadline passes before it is sent.
+        """
+        if self._closed:
+            raise RuntimeError("Gmail draft batcher is closed")
+        draft = _PendingDraft(to, subject, body, message_id, current_deadline())
+        self._queue.put(draft)
+        return draft.future
+
+    def create(self, to: str, subject: str, body: str, timeout: Optional[float] = None,
+               message_id: Optional[str] = None) -> str:
+        """Queue a draft and wait for its id"""
+        return self.submit(to, subject, body, message_id).result(timeout)
+
+    def _collect(self) -> Optional[List[_PendingDraft]]:
+        """Next batch, or None once closed and drained"""
+        first = self._queue.get()
+        while first is None:
+            if self._queue.empty():
+                return None
+            self._queue.put(None)  # Drafts queued again for a retry go first
+            first = self._queue.get()
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                draft = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if draft is None:
+                self._queue.put(None)  # Seen again after this batch
+                break
+            batch.append(draft)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                self._send(batch)
+            except Exception as e:  # Never leave a caller waiting forever
+                for draft in batch:
+                    if not draft.future.done():
+                        draft.future.set_exception(e)
+
+    def _send(self, batch: List[_PendingDraft]) -> None:
+        live = []
+        for draft in batch:
+            if draft.expired():
+                draft.future.set_exception(DeadlineExceeded("Company deadline exceeded before its draft was sent"))
+            else:
+                live.append(draft)
+        batch = live
+        if not batch:
+            return
+        if self._breaker:
+            try:
+                self._breaker.before_call()
+            except CircuitOpenError as e:
+                for draft in batch:
+                    draft.future.set_exception(e)
+                return
+        try:
+            failed = self._execute(batch)
+        except BaseException:
+            if self._breaker:
+                self._breaker.record_neutral()
+            raise
+
+        if failed:
+            logger.warning(f"{len(failed)} of {len(batch)} drafts in a Gmail batch failed")
+        retry_afters = [self._retry_or_fail(draft, exception) for draft, exception in failed]
+        retry_afters = [seconds for seconds in retry_afters if seconds is not None]
+        if retry_afters:
+            # One pause for the whole batch, as long as the longest Retry-After
+            self._bucket.pause(max(retry_afters) or self.default_backoff)
+
+    def _execute(self, batch: List[_PendingDraft]) -> List[Tuple[_PendingDraft, Exception]]:
+        """Send one batch request and report it to the breaker; returns the drafts that failed"""
+        service = self._get_service()
+        responses = {}
+
+        def callback(request_id, response, exception):
+            responses[request_id] = (response, exception)
+
+        http_batch = service.new_batch_http_request(callback=callback)
+        for index, draft in enumerate(batch):
+            self._bucket.acquire(1)
+            draft.attempts += 1
+            body = {'message': {'raw': create_message_raw(draft.to, draft.subject, draft.body, draft.message_id)}}
+            http_batch.add(service.users().drafts().create(userId='me', body=body), request_id=str(index))
+
+        try:
+            if self._limiter:
+                self._limiter.call(http_batch.execute)
+            else:
+                http_batch.execute()
+        except Exception as e:
+            failed = [(draft, e) for draft in batch]
+        else:
+            failed = []
+            for index, draft in enumerate(batch):
+                response, exception = responses.get(str(index), (None, RuntimeError("No response in Gmail batch")))
+                if exception is None:
+                    draft.future.set_result(response.get('id'))
+                else:
+                    failed.append((draft, exception))
+            logger.info(f"Created {len(batch) - len(failed)} Gmail drafts in one batch request")
+
+        if self._breaker:
+            if len(failed) < len(batch):
+                self._breaker.record_success()
+            elif any(is_transient(exception) for _, exception in failed):
+                self._breaker.record_failure()
+            else:
+                self._breaker.record_neutral()
+        return failed
+
+    def _retry_or_fail(self, draft: _PendingDraft, error: Exception) -> Optional[float]:
+        """Queue ``draft`` again after a rate-limit error, else fail it; returns the Retry-After.
+
+        Drafts whose deadline would pass during the pause are failed as well.
+        """
+        retry_after = self._retry_after_of(error)
+        if retry_after is None or draft.attempts >= self.max_attempts or \
+                draft.expired(retry_after or self.default_backoff):
+            draft.future.set_exception(error)
+        else:
+            self._queue.put(draft)
+        return retry_after
+
+    def close(self) -> None:
+        """Send whatever is queued, then stop the batcher thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
@@ -4,22 +4,60 @@ Converts n8n workflow to LangGraph for automated lead generation and outreach
 """
 
 import os
-import time
+import json
+import uuid
+import atexit
+import argparse
 import logging
-from typing import TypedDict, List, Dict, Any, Optional
+import operator
+import functools
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from typing import TypedDict, List, Dict, Any, Optional, Annotated, Tuple, Callable, Union
 from urllib.parse import urlparse
 
 # External dependencies
 import requests
-from bs4 import BeautifulSoup
+import httpx
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from googleapiclient.errors import HttpError
+import google_auth_httplib2
+import httplib2
 import pickle
+import openai
 from openai import OpenAI
 
+from content_reduction import count_tokens, reduce_content
+from concurrency import CONCURRENCY_LIMITERS, AdaptiveLimiter, is_timeout
+from caching import HTTPCache, HunterCache, LLMCache, llm_cache_key
+from checkpointing import (
+    DRAFTED, DRAFTING, FAILED, SUCCEEDED, CompletionLedger, DomainResult, open_checkpointer, prune_checkpoints
+)
+from fetcher import AsyncFetcher
+from gmail_drafts import GmailDraftBatcher, create_message_raw, draft_message_id
+from lead_sources import GoogleSheetsLeadSource, LeadSource, PrefetchingLeadReader, open_file_lead_source
+from pipeline import DONE, Stage, StagedPipeline, parse_stage_workers
+from text_extraction import ExtractionPool, extract_text
+from url_normalization import group_by_domain, registrable_domain
+from instrumentation import (
+    BYTES_DOWNLOADED, CACHED_PROMPT_TOKENS, COMPLETION_TOKENS, PROMPT_TOKENS, Instrumentation, record
+)
+from resilience import (
+    CIRCUIT_BREAKERS, deadline_passed, deadline_scope, is_transient, retry_call, time_left
+)
+from rate_limiter import RATE_LIMITERS, call_rate_limited, parse_retry_after
+from sheets_writer import SheetsLogBuffer, append_cells_request, sheet_title
+from work_queue import Lease, LeaseLost, WorkQueue, open_work_queue, run_worker
+
 # LangGraph imports
+from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import StateGraph, END
+from langgraph.types import Send
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -32,8 +70,19 @@ logger = logging.getLogger(__name__)
 # API Keys and Credentials (set via environment variables)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 HUNTER_API_KEY = os.getenv("HUNTER_API_KEY")
+HUNTER_API_URL = os.getenv("HUNTER_API_URL", "https://api.hunter.io/v2/domain-search")
 GOOGLE_SHEETS_SPREADSHEET_ID = os.getenv("GOOGLE_SHEET_ID", "1Z9wgLcyYLXFMXiLm-MOme0bmjJdS1X7prWVTIC7czaM")
 TOKEN_FILE = os.getenv("TOKEN_FILE", "adc_token.json")
+GOOGLE_HTTP_TIMEOUT = 60
+
+# Success/failure log rows are buffered and written in batches, journaled to
+# SHEETS_LOG_JOURNAL until then. Processes on one host (e.g. several --worker
+# processes) each lock a journal of their own next to it (.1, .2, ...).
+SUCCESS_LOG_RANGE = 'Sheet1!A:C'
+FAILURE_LOG_RANGE = 'Failures!A:A'
+SHEETS_LOG_BATCH_ROWS = int(os.getenv("SHEETS_LOG_BATCH_ROWS", "50"))
+SHEETS_LOG_FLUSH_SECONDS = float(os.getenv("SHEETS_LOG_FLUSH_SECONDS", "10"))
+SHEETS_LOG_JOURNAL = os.getenv("SHEETS_LOG_JOURNAL", "sheets_log_journal.jsonl")
 
 
 
@@ -45,32 +94,248 @@ GOOGLE_SCOPES = [
 
 # OpenAI Configuration
 OPENAI_MODEL = "gpt-4o-mini"  # Can be changed to gpt-4o-mini for cost savings
-OPENAI_CLIENT = OpenAI(api_key=OPENAI_API_KEY) if OPENAI_API_KEY else None
+# Retries are done by call_rate_limited, within the shared quotas
+OPENAI_CLIENT = OpenAI(api_key=OPENAI_API_KEY, max_retries=0) if OPENAI_API_KEY else None
+OPENAI_REQUEST_TIMEOUT = 60
+HUNTER_REQUEST_TIMEOUT = 30
 
 # Rate limiting delays (in seconds)
-DELAY_BETWEEN_REQUESTS = 1
-HUNTER_API_DELAY = 2
+DELAY_BETWEEN_REQUESTS = 1  # Minimum gap between two requests to the same website host
+
+# Provider quotas shared by all workers (per minute). Calls wait for a token
+# instead of sleeping a fixed delay; a 429 pauses the backend for Retry-After.
+HUNTER_REQUESTS_PER_MINUTE = float(os.getenv("HUNTER_REQUESTS_PER_MINUTE", "300"))
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+SHEETS_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_REQUESTS_PER_MINUTE", "60"))
+GMAIL_REQUESTS_PER_MINUTE = float(os.getenv("GMAIL_REQUESTS_PER_MINUTE", "600"))
+RATE_LIMIT_MAX_ATTEMPTS = 3
+
+RATE_LIMITERS.configure("hunter", HUNTER_REQUESTS_PER_MINUTE, burst=5)
+RATE_LIMITERS.configure("openai_requests", OPENAI_REQUESTS_PER_MINUTE)
+RATE_LIMITERS.configure("openai_tokens", OPENAI_TOKENS_PER_MINUTE)
+RATE_LIMITERS.configure("sheets", SHEETS_REQUESTS_PER_MINUTE)
+RATE_LIMITERS.configure("gmail", GMAIL_REQUESTS_PER_MINUTE)
+
+# Adaptive concurrency: calls in flight per backend start at the first number
+# and float up to the second while the backend stays fast and error-free,
+# halving on 429s, timeouts and latency spikes. Website latency varies so much
+# between sites that only calls four times slower than usual count as a spike
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+
+CONCURRENCY_LIMITERS.configure("fetch", 8, int(os.getenv("FETCH_MAX_IN_FLIGHT", "64")), spike_ratio=4.0)
+CONCURRENCY_LIMITERS.configure("hunter", 2, int(os.getenv("HUNTER_MAX_IN_FLIGHT", "10")))
+CONCURRENCY_LIMITERS.configure("openai", 4, int(os.getenv("OPENAI_MAX_IN_FLIGHT", "64")))
+CONCURRENCY_LIMITERS.configure("sheets", 1, int(os.getenv("SHEETS_MAX_IN_FLIGHT", "4")))
+CONCURRENCY_LIMITERS.configure("gmail", 2, int(os.getenv("GMAIL_MAX_IN_FLIGHT", "16")))
+
+# Circuit breakers: after CIRCUIT_BREAKER_FAILURES consecutive 5xx errors,
+# timeouts or connection failures a backend's calls fail fast for
+# CIRCUIT_BREAKER_RESET_SECONDS, then one trial call decides whether to resume
+CIRCUIT_BREAKER_FAILURES = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS = float(os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30"))
+for _backend in ("hunter", "openai", "sheets", "gmail"):
+    CIRCUIT_BREAKERS.configure(_backend, CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS)
+
+# Seconds a company may take from fetch to generated email; nodes that would
+# start later are skipped and the company is logged as failed. 0 disables it
+COMPANY_DEADLINE_SECONDS = float(os.getenv("COMPANY_DEADLINE_SECONDS", "180"))
+
+# Website fetching (shared async connection pool). Server errors and read
+# timeouts are tried FETCH_MAX_ATTEMPTS times; unreachable hosts only once
+FETCH_TIMEOUT = 30
+FETCH_CONNECT_TIMEOUT = 10
+FETCH_MAX_ATTEMPTS = 2
+FETCH_MAX_CONNECTIONS = int(os.getenv("FETCH_MAX_CONNECTIONS", "100"))
+DNS_CACHE_TTL = 300
+MAX_DOWNLOAD_BYTES = int(os.getenv("MAX_DOWNLOAD_BYTES", str(512 * 1024)))  # Stop reading a page after this
+
+# Characters of page text extracted from a page; extraction stops parsing here
+TEXT_CHAR_BUDGET = 6000
+
+# Tokens of page text sent for summarization, after repeated lines, menus and
+# boilerplate have been dropped from the extracted text
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "700"))
+
+# Worker processes for HTML-to-text extraction; 0 parses in the node's thread
+TEXT_EXTRACTION_WORKERS = int(os.getenv("TEXT_EXTRACTION_WORKERS", "0"))
+
+# Local caches (SQLite). Homepages fetched within HTTP_CACHE_TTL seconds are
+# reused as-is, older ones are revalidated with If-None-Match/If-Modified-Since.
+CACHE_DB_PATH = os.getenv("CACHE_DB_PATH", "outbound_cache.sqlite3")
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_TTL = float(os.getenv("HTTP_CACHE_TTL", str(24 * 3600)))
+TEXT_EXTRACTION_VERSION = 3  # Bump when extract_text_content changes its output
+HUNTER_CACHE_ENABLED = os.getenv("HUNTER_CACHE_ENABLED", "true").lower() == "true"
+HUNTER_CACHE_TTL = float(os.getenv("HUNTER_CACHE_TTL", str(30 * 24 * 3600)))
+HUNTER_NEGATIVE_CACHE_TTL = float(os.getenv("HUNTER_NEGATIVE_CACHE_TTL", str(7 * 24 * 3600)))
+
+# OpenAI responses are cached by a hash of model, prompt template version,
+# rendered prompt and sampling params. LLM_CACHE_MODE: "on" reads and writes,
+# "refresh" regenerates but stores the new answer, "off" bypasses the cache.
+LLM_CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on")
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "100000"))
+
+# Bump a template's version whenever its prompt wording changes
+PROMPT_TEMPLATE_VERSIONS = {
+    "summary": "summary-v1",
+    "email_body": "email_body-v1",
+    "email_subject": "email_subject-v1",
+    "email": "email-v1"
+}
+
+# Email generation: "combined" writes subject and body in one JSON-mode call,
+# "separate" keeps the original body call followed by a subject call
+EMAIL_GENERATION_MODE = os.getenv("EMAIL_GENERATION_MODE", "combined")
+
+# Style guide and examples shared by the email prompts
+EMAIL_STYLE_PROMPT = """AVOID PURPLE PROSE. USE AS FEW WORDS AS POSSIBLE.
+
+USE THESE FOLLOWING EXAMPLES AS THEY'RE VERY GOOD. STICK VERY CLOSE TO THIS STYLE AND EXACT TONE.
+
+EXAMPLE 1:
+
+Hey Tom,
+
+I lead the team at AgentHub.dev and found you online when looking for Intelligent Automation consultants. We're an AI-first intelligent automation platform.
+
+We're backed by the same people as AirBnB and Doordash but looking to explore collaborating with existing companies in the field.
+
+Would love to chat this week if you're open to it.
+
+EXAMPLE 2:
+
+Hey Priti,
+
+Hope this cold email is alright — found Cognizant's website and thought I'd reach out since we're building in the intelligent automation space.
+
+I lead the team at AgentHub.dev, we're an AI-first intelligent automation tool. We're backed by the same people as AirBnB and Doordash but fully focused on helping businesses automate work with AI.
+
+Would love to chat about potential collaboration if you're open to it.
+
+ALWAYS SIGN OFF WITH:
+
+-----
+Best
+Kaushalya N
+Co-Founder"""
+
+# Gmail drafts: "single" creates each draft with its own API call, "batch"
+# queues them and sends up to GMAIL_BATCH_SIZE per batch HTTP request, waiting
+# at most GMAIL_BATCH_WAIT_SECONDS for a batch to fill (pays off in fan_out mode)
+GMAIL_DRAFT_MODE = os.getenv("GMAIL_DRAFT_MODE", "single")
+GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+GMAIL_BATCH_WAIT_SECONDS = float(os.getenv("GMAIL_BATCH_WAIT_SECONDS", "0.25"))
+
+# Per-company order: "fetch_first" fetches and summarizes every company before
+# the Hunter.io lookup, "contacts_first" looks up contacts first and only
+# fetches and summarizes companies that have some. With SPECULATIVE_FETCH the
+# contacts_first fetch starts alongside the lookup when there is spare fetch
+# capacity, and is cancelled if no contacts are found
+PIPELINE_ORDER = os.getenv("PIPELINE_ORDER", "fetch_first")
+SPECULATIVE_FETCH = os.getenv("SPECULATIVE_FETCH", "false").lower() == "true"
+
+# Execution mode: "sequential" walks the select_company loop one company at a
+# time, "fan_out" maps every URL onto its own run of the per-company subgraph,
+# "pipelined" passes the companies of a page through stages (fetch, summarize,
+# contacts, generate, draft, log_failure) that each have STAGE_WORKERS workers
+# and a bounded queue, so the stages overlap across companies
+EXECUTION_MODE = os.getenv("EXECUTION_MODE", "sequential")
+MAX_CONCURRENT_COMPANIES = int(os.getenv("MAX_CONCURRENT_COMPANIES", "10"))
+STAGE_WORKERS = parse_stage_workers(
+    os.getenv("STAGE_WORKERS", "fetch=8,summarize=4,contacts=2,generate=4,draft=2,log_failure=1")
+)
+STAGE_QUEUE_SIZE = int(os.getenv("STAGE_QUEUE_SIZE", "0"))  # 0: twice the stage's workers
+
+# Distributed runs (--coordinator / --worker): a SQLite file path or a
+# redis:// URL shared by every worker host. A company whose worker stops
+# extending its lease for WORK_QUEUE_VISIBILITY_SECONDS is handed to another
+# worker, at most WORK_QUEUE_MAX_ATTEMPTS times; each worker runs
+# MAX_CONCURRENT_COMPANIES companies at once
+WORK_QUEUE = os.getenv("WORK_QUEUE", "outbound_work_queue.sqlite3")
+WORK_QUEUE_VISIBILITY_SECONDS = float(os.getenv("WORK_QUEUE_VISIBILITY_SECONDS", "300"))
+WORK_QUEUE_MAX_ATTEMPTS = int(os.getenv("WORK_QUEUE_MAX_ATTEMPTS", "3"))
+WORK_QUEUE_POLL_SECONDS = 2
+
+# Lead source: "sheets" reads column A of Sheet1, anything else is a path to a
+# CSV, JSONL or Parquet file. Leads are read LEAD_PAGE_SIZE rows at a time,
+# LEAD_PREFETCH_PAGES pages ahead of the page being processed
+LEAD_SOURCE = os.getenv("LEAD_SOURCE", "sheets")
+LEAD_PAGE_SIZE = int(os.getenv("LEAD_PAGE_SIZE", "500"))
+LEAD_PREFETCH_PAGES = int(os.getenv("LEAD_PREFETCH_PAGES", "2"))
+
+# A run is invoked once per company in sequential mode and once per page of
+# leads otherwise (see run_workflow), so its recursion limit only has to cover
+# one of those: a superstep per node, plus RUN_STEPS_SLACK
+RUN_STEPS_SLACK = 20
+
+# Error messages kept in the workflow state (the most recent ones); every
+# error is also logged when it happens
+MAX_STATE_ERRORS = max(1, int(os.getenv("MAX_STATE_ERRORS", "200")))
+
+# Instrumentation exports, written at the end of a run when set: Prometheus
+# text format metrics and a JSON Lines file of OpenTelemetry-style spans
+METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH")
+TRACE_SPANS_PATH = os.getenv("TRACE_SPANS_PATH")
+
+# Durable run state: LangGraph checkpoints plus the per-URL completion ledger
+CHECKPOINT_DB_PATH = os.getenv("CHECKPOINT_DB_PATH", "outbound_checkpoints.sqlite3")
 
 # ============================================================================
 # STATE DEFINITION
 # ============================================================================
 
+@dataclass(slots=True)
+class Contact:
+    """The fields of a Hunter.io email entry that later nodes actually use"""
+    value: str
+    first_name: Optional[str] = None
+    last_name: Optional[str] = None
+    
+    @classmethod
+    def from_hunter(cls, entry: Dict[str, Any]) -> "Contact":
+        return cls(entry.get('value') or '', entry.get('first_name'), entry.get('last_name'))
+
+def append_errors(existing: Optional[List[str]], new: Optional[List[str]]) -> List[str]:
+    """Reducer for ``errors``: nodes return only their new messages.
+
+    Only the last MAX_STATE_ERRORS messages are kept, so a long run's state
+    (and the copy made here whenever a node reports an error) stays small.
+    The log must not be extended in place: LangGraph applies pending writes
+    to scratch copies of the state when evaluating edges.
+    """
+    if not new:
+        return existing or []
+    keep = MAX_STATE_ERRORS - len(new)
+    if keep <= 0:
+        return list(new[-MAX_STATE_ERRORS:])
+    return (existing or [])[-keep:] + new
+
 class WorkflowState(TypedDict):
     """State schema for the outbound sales workflow"""
+    run_id: Optional[str]  # Checkpoint thread id; keys the completion ledger
+    
+    # Lead source and how far into it the run has read
+    lead_source: Optional[str]  # None means LEAD_SOURCE
+    leads_offset: int  # Source rows read so far, including the current page
+    
     # Current processing state
-    company_urls: List[str]  # List of all company URLs to process
+    company_urls: List[str]  # Company URLs of the current page of leads, one per domain
+    lead_rows: Dict[str, List[str]]  # Lead rows behind a company URL, if not just that URL
     current_index: int  # Current position in the company_urls list
     current_company_url: Optional[str]  # Currently processing URL
+    companies_processed: int
     
-    # Extracted/Generated data
-    html_content: Optional[str]
+    # Extracted/Generated data (html_content and text_content are cleared
+    # as soon as the next step has consumed them)
+    html_content: Optional[Union[str, bytes]]  # Raw response bytes when fetched, cached text otherwise
+    html_encoding: Optional[str]  # Charset of raw html_content bytes
     text_content: Optional[str]
     company_summary: Optional[str]
     company_domain: Optional[str]
     
-    # Hunter.io results
-    hunter_results: Optional[Dict[str, Any]]
-    contact_emails: List[Dict[str, str]]
+    # Hunter.io results (only the fields used downstream are kept)
+    contact_emails: List[Contact]
     organization_name: Optional[str]
     
     # Email generation
@@ -84,17 +349,112 @@ class WorkflowState(TypedDict):
     success_logged: bool
     failure_logged: bool
     
-    # Error tracking
-    errors: List[str]
+    # Error tracking (append-only, see append_errors)
+    errors: Annotated[List[str], append_errors]
     
     # Gmail draft
     draft_id: Optional[str]
+    
+    # time.time() by which the current company must be done (None: no deadline)
+    deadline: Optional[float]
+    deadline_exceeded: bool
+    
+    # Work queue lease the company is processed under (worker mode only)
+    lease_token: Optional[str]
+
+class CampaignState(TypedDict):
+    """State schema for fan-out mode - per-company data lives in each subgraph run"""
+    run_id: Optional[str]
+    lead_source: Optional[str]
+    leads_offset: int
+    company_urls: List[str]
+    lead_rows: Dict[str, List[str]]
+    current_index: int
+    processing_complete: bool
+    companies_processed: Annotated[int, operator.add]
+    errors: Annotated[List[str], append_errors]
 
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+_website_fetcher: Optional[AsyncFetcher] = None
+_website_fetcher_lock = threading.Lock()
+
+def get_website_fetcher() -> AsyncFetcher:
+    """Return the process-wide website fetcher, creating it on first use"""
+    global _website_fetcher
+    with _website_fetcher_lock:
+        if _website_fetcher is None:
+            _website_fetcher = AsyncFetcher(
+                max_connections=FETCH_MAX_CONNECTIONS,
+                host_delay=DELAY_BETWEEN_REQUESTS,
+                max_bytes=MAX_DOWNLOAD_BYTES,
+                timeout=FETCH_TIMEOUT,
+                connect_timeout=FETCH_CONNECT_TIMEOUT,
+                dns_cache_ttl=DNS_CACHE_TTL
+            )
+            atexit.register(_website_fetcher.close)
+        return _website_fetcher
+
+_google_credentials = None
+_google_credentials_lock = threading.Lock()
+_google_clients = threading.local()
+_google_discovery_docs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
 def get_google_credentials():
+    """Return the process-wide Google credentials, refreshing them when expired.
+
+    token.json is read (or the OAuth flow run) only on the first call.
+    """
+    global _google_credentials
+    with _google_credentials_lock:
+        if _google_credentials is None:
+            _google_credentials = load_google_credentials()
+        
+        creds = _google_credentials
+        if creds is not None and not creds.valid and creds.refresh_token:
+            try:
+                creds.refresh(Request())
+                with open("token.json", "w") as token_file:
+                    token_file.write(creds.to_json())
+                logger.info("Google credentials refreshed")
+            except Exception as e:
+                logger.error(f"Failed to refresh Google credentials: {e}")
+        return creds
+
+def get_google_service(api: str, version: str):
+    """Return a Google API client for the calling thread.
+
+    googleapiclient service objects are not thread-safe, so each worker thread
+    gets its own client with a persistent (keep-alive) HTTP transport. The
+    bundled discovery document is parsed once per process and shared.
+    """
+    clients = getattr(_google_clients, "services", None)
+    if clients is None:
+        clients = _google_clients.services = {}
+    
+    if (api, version) not in clients:
+        creds = get_google_credentials()
+        if creds is None:
+            raise RuntimeError("Google credentials are not available")
+        
+        http = google_auth_httplib2.AuthorizedHttp(creds, http=httplib2.Http(timeout=GOOGLE_HTTP_TIMEOUT))
+        with _google_credentials_lock:
+            discovery_doc = _google_discovery_docs.get((api, version))
+            if discovery_doc is None:
+                static_doc = get_static_doc(api, version)
+                if static_doc:
+                    discovery_doc = _google_discovery_docs[(api, version)] = json.loads(static_doc)
+        
+        if discovery_doc:
+            clients[(api, version)] = build_from_document(discovery_doc, http=http)
+        else:
+            clients[(api, version)] = build(api, version, http=http)
+    
+    return clients[(api, version)]
+
+def load_google_credentials():
     """Get Google credentials from the ADC token file generated by gcp.py."""
     creds = None
 
@@ -147,8 +507,443 @@ def get_google_credentials():
         logger.error(f"Failed to load or refresh credentials: {e}")
         return None
 
+def hunter_retry_after(error: Exception) -> Optional[float]:
+    """Retry-After for a Hunter.io 429, None for any other error"""
+    response = getattr(error, "response", None)
+    if isinstance(error, requests.HTTPError) and response is not None and response.status_code == 429:
+        return parse_retry_after(response.headers.get("Retry-After")) or 0.0
+    return None
+
+def openai_retry_after(error: Exception) -> Optional[float]:
+    """Retry-After for an OpenAI 429, None for any other error"""
+    if isinstance(error, openai.RateLimitError):
+        return parse_retry_after(error.response.headers.get("retry-after")) or 0.0
+    return None
+
+def google_retry_after(error: Exception) -> Optional[float]:
+    """Retry-After for a Sheets/Gmail 429, None for any other error"""
+    if isinstance(error, HttpError) and error.resp.status == 429:
+        return parse_retry_after(error.resp.get("retry-after")) or 0.0
+    return None
+
+def concurrency_limiter(backend: str) -> Optional[AdaptiveLimiter]:
+    """Adaptive concurrency limiter of ``backend``, or None when ADAPTIVE_CONCURRENCY is off"""
+    return CONCURRENCY_LIMITERS.get(backend) if ADAPTIVE_CONCURRENCY else None
+
+def is_retryable_fetch_error(error: Exception) -> bool:
+    """Server errors and read timeouts; a host that can't be reached is not tried again"""
+    if isinstance(error, httpx.TransportError):
+        return isinstance(error, (httpx.ReadTimeout, httpx.RemoteProtocolError))
+    return is_transient(error)
+
+# Speculative fetches in flight, keyed by run id and company URL; futures
+# can't go into the checkpointed state
+_speculative_fetches: Dict[Tuple[str, str], Future] = {}
+_speculative_fetches_lock = threading.Lock()
+
+def speculative_fetch_key(state: Dict[str, Any]) -> Tuple[str, str]:
+    return (state.get("run_id") or "", state.get("current_company_url") or "")
+
+def start_speculative_fetch(state: Dict[str, Any]) -> None:
+    """Start fetching the company's homepage ahead of the contact lookup, if a fetch slot is free"""
+    url = state.get("current_company_url")
+    cache = get_http_cache()
+    cached = cache.lookup(url) if cache else None
+    if cached and cached.is_fresh(HTTP_CACHE_TTL):
+        return
+    limiter = concurrency_limiter("fetch")
+    if limiter and not limiter.try_acquire():
+        return
+    headers = cached.conditional_headers() if cached else None
+    try:
+        future = get_website_fetcher().submit(url, headers=headers, timeout=time_left(FETCH_TIMEOUT))
+    except BaseException:
+        if limiter:
+            limiter.release(time.monotonic(), 0.0, failed=True, saturated=False)
+        raise
+    if limiter:
+        limiter.release_when_done(future)
+    with _speculative_fetches_lock:
+        _speculative_fetches[speculative_fetch_key(state)] = future
+
+def take_speculative_fetch(state: Dict[str, Any]) -> Optional[Future]:
+    with _speculative_fetches_lock:
+        return _speculative_fetches.pop(speculative_fetch_key(state), None)
+
+def cancel_speculative_fetch(state: Dict[str, Any]) -> None:
+    """Abort the company's speculative fetch, if it has one that was not used"""
+    future = take_speculative_fetch(state)
+    if future is not None and future.cancel():
+        logger.info(f"Cancelled speculative fetch of {state.get('current_company_url')}")
+
+def hunter_domain_search(domain: str) -> Dict[str, Any]:
+    """Call Hunter.io domain-search within the shared Hunter quota"""
+    def search():
+        response = requests.get(
+            HUNTER_API_URL,
+            params={'domain': domain, 'api_key': HUNTER_API_KEY, 'limit': 10},
+            timeout=time_left(HUNTER_REQUEST_TIMEOUT)
+        )
+        response.raise_for_status()
+        return response.json()
+    
+    return call_rate_limited(
+        search,
+        [(RATE_LIMITERS.get("hunter"), 1)],
+        hunter_retry_after,
+        max_attempts=RATE_LIMIT_MAX_ATTEMPTS,
+        limiter=concurrency_limiter("hunter"),
+        breaker=CIRCUIT_BREAKERS.get("hunter"),
+        idempotent=True
+    )
+
+def create_chat_completion(template: str, prompt: str, max_tokens: int, temperature: float = 0.7,
+                           json_mode: bool = False, validate: Optional[Callable[[str], Any]] = None) -> str:
+    """Return the completion text for ``prompt``, from the LLM cache or from OpenAI.
+
+    ``template`` names the prompt template (see PROMPT_TEMPLATE_VERSIONS) so
+    that changing a template's wording invalidates its cached answers.
+    ``json_mode`` asks for a JSON object response.
+
+    ``validate`` raises ValueError for a response the caller can't use.
+    Only complete (``finish_reason`` "stop") responses that pass it are
+    cached, and a cached one that fails it is dropped and asked for again.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    params = {"max_tokens": max_tokens, "temperature": temperature}
+    if json_mode:
+        params["response_format"] = {"type": "json_object"}
+    cache = get_llm_cache()
+    cache_key = llm_cache_key(OPENAI_MODEL, PROMPT_TEMPLATE_VERSIONS[template], messages, params)
+    
+    if cache and LLM_CACHE_MODE == "on":
+        cached = cache.get(cache_key)
+        if cached is not None:
+            try:
+                if validate:
+                    validate(cached)
+            except ValueError as e:
+                logger.warning(f"Dropping invalid cached OpenAI response for {template}: {e}")
+                cache.delete(cache_key)
+            else:
+                logger.info(f"Using cached OpenAI response for {template}")
+                return cached
+    
+    # Estimate reserved up front, corrected from usage
+    estimated_tokens = count_tokens(prompt, OPENAI_MODEL) + max_tokens
+    tokens_bucket = RATE_LIMITERS.get("openai_tokens")
+    
+    response = call_rate_limited(
+        lambda: OPENAI_CLIENT.chat.completions.create(
+            model=OPENAI_MODEL,
+            messages=messages,
+            timeout=time_left(OPENAI_REQUEST_TIMEOUT),
+            **params
+        ),
+        [(RATE_LIMITERS.get("openai_requests"), 1), (tokens_bucket, estimated_tokens)],
+        openai_retry_after,
+        max_attempts=RATE_LIMIT_MAX_ATTEMPTS,
+        limiter=concurrency_limiter("openai"),
+        breaker=CIRCUIT_BREAKERS.get("openai"),
+        idempotent=True  # Retrying costs tokens but has no side effects
+    )
+    
+    usage = getattr(response, "usage", None)
+    if usage is not None:
+        record(PROMPT_TOKENS, usage.prompt_tokens)
+        record(COMPLETION_TOKENS, usage.completion_tokens)
+        details = getattr(usage, "prompt_tokens_details", None)
+        record(CACHED_PROMPT_TOKENS, getattr(details, "cached_tokens", None) or 0)
+        if usage.total_tokens < estimated_tokens:
+            tokens_bucket.refund(estimated_tokens - usage.total_tokens)
+    
+    choice = response.choices[0]
+    content = choice.message.content
+    if validate:
+        validate(content)
+    if cache and content is not None and getattr(choice, "finish_reason", "stop") == "stop":
+        cache.put(cache_key, content)
+    return content
+
+def execute_google_request(request, backend: str, idempotent: bool = False):
+    """Execute a Sheets/Gmail API request within the shared ``backend`` quota.
+
+    Only ``idempotent`` requests (reads) are retried after server errors.
+    """
+    return call_rate_limited(
+        request.execute,
+        [(RATE_LIMITERS.get(backend), 1)],
+        google_retry_after,
+        max_attempts=RATE_LIMIT_MAX_ATTEMPTS,
+        limiter=concurrency_limiter(backend),
+        breaker=CIRCUIT_BREAKERS.get(backend),
+        idempotent=idempotent
+    )
+
+_http_cache: Optional[HTTPCache] = None
+_http_cache_lock = threading.Lock()
+
+def get_http_cache() -> Optional[HTTPCache]:
+    """Return the process-wide homepage cache, or None when disabled"""
+    global _http_cache
+    if not HTTP_CACHE_ENABLED:
+        return None
+    with _http_cache_lock:
+        if _http_cache is None:
+            _http_cache = HTTPCache(CACHE_DB_PATH, text_version=TEXT_EXTRACTION_VERSION)
+        return _http_cache
+
+_hunter_cache: Optional[HunterCache] = None
+_hunter_cache_lock = threading.Lock()
+
+def get_hunter_cache() -> Optional[HunterCache]:
+    """Return the process-wide Hunter.io result cache, or None when disabled"""
+    global _hunter_cache
+    if not HUNTER_CACHE_ENABLED:
+        return None
+    with _hunter_cache_lock:
+        if _hunter_cache is None:
+            _hunter_cache = HunterCache(CACHE_DB_PATH, HUNTER_CACHE_TTL, HUNTER_NEGATIVE_CACHE_TTL)
+        return _hunter_cache
+
+_llm_cache: Optional[LLMCache] = None
+_llm_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """Return the process-wide OpenAI response cache, or None when LLM_CACHE_MODE is off"""
+    global _llm_cache
+    if LLM_CACHE_MODE == "off":
+        return None
+    with _llm_cache_lock:
+        if _llm_cache is None:
+            _llm_cache = LLMCache(CACHE_DB_PATH, LLM_CACHE_MAX_ENTRIES)
+        return _llm_cache
+
+_sheet_ids: Dict[str, int] = {}
+_sheets_log_buffer: Optional[SheetsLogBuffer] = None
+_sheets_log_buffer_lock = threading.Lock()
+
+def write_log_rows(rows_by_range: Dict[str, List[List[Any]]]) -> None:
+    """Append buffered log rows to their tabs with a single batchUpdate call"""
+    service = get_google_service('sheets', 'v4')
+    
+    if not _sheet_ids:
+        metadata = execute_google_request(
+            service.spreadsheets().get(
+                spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
+                fields='sheets.properties(sheetId,title)'
+            ),
+            "sheets",
+            idempotent=True
+        )
+        for sheet in metadata.get('sheets', []):
+            _sheet_ids[sheet['properties']['title']] = sheet['properties']['sheetId']
+    
+    requests_body = [
+        append_cells_request(_sheet_ids[sheet_title(range_name)], rows)
+        for range_name, rows in rows_by_range.items()
+    ]
+    execute_google_request(
+        service.spreadsheets().batchUpdate(
+            spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
+            body={'requests': requests_body}
+        ),
+        "sheets"
+    )
+
+def get_sheets_log_buffer() -> SheetsLogBuffer:
+    """Return the process-wide success/failure log buffer, creating it on first use"""
+    global _sheets_log_buffer
+    with _sheets_log_buffer_lock:
+        if _sheets_log_buffer is None:
+            _sheets_log_buffer = SheetsLogBuffer(
+                write_log_rows,
+                journal_path=SHEETS_LOG_JOURNAL,
+                flush_rows=SHEETS_LOG_BATCH_ROWS,
+                flush_interval=SHEETS_LOG_FLUSH_SECONDS
+            )
+            atexit.register(_sheets_log_buffer.close)
+        return _sheets_log_buffer
+
+def close_sheets_log_buffer() -> None:
+    """Flush buffered log rows and stop the writer (no-op if never used)"""
+    with _sheets_log_buffer_lock:
+        buffer = _sheets_log_buffer
+    if buffer is not None:
+        buffer.close()
+
+_completion_ledger: Optional[CompletionLedger] = None
+_completion_ledger_lock = threading.Lock()
+
+def get_completion_ledger() -> CompletionLedger:
+    """Return the process-wide per-URL completion ledger"""
+    global _completion_ledger
+    with _completion_ledger_lock:
+        if _completion_ledger is None:
+            _completion_ledger = CompletionLedger(CHECKPOINT_DB_PATH)
+        return _completion_ledger
+
+_extraction_pool: Optional[ExtractionPool] = None
+_extraction_pool_lock = threading.Lock()
+
+def get_extraction_pool() -> Optional[ExtractionPool]:
+    """Return the process-wide extraction pool, or None if extraction runs in-thread"""
+    global _extraction_pool
+    if TEXT_EXTRACTION_WORKERS <= 0:
+        return None
+    with _extraction_pool_lock:
+        if _extraction_pool is None:
+            _extraction_pool = ExtractionPool(TEXT_EXTRACTION_WORKERS)
+            atexit.register(_extraction_pool.close)
+        return _extraction_pool
+
+_gmail_draft_batcher: Optional[GmailDraftBatcher] = None
+_gmail_draft_batcher_lock = threading.Lock()
+
+def get_gmail_draft_batcher() -> GmailDraftBatcher:
+    """Return the process-wide Gmail draft batcher, creating it on first use"""
+    global _gmail_draft_batcher
+    with _gmail_draft_batcher_lock:
+        if _gmail_draft_batcher is None:
+            _gmail_draft_batcher = GmailDraftBatcher(
+                lambda: get_google_service('gmail', 'v1'),
+                RATE_LIMITERS.get("gmail"),
+                google_retry_after,
+                batch_size=GMAIL_BATCH_SIZE,
+                max_wait=GMAIL_BATCH_WAIT_SECONDS,
+                max_attempts=RATE_LIMIT_MAX_ATTEMPTS,
+                limiter=concurrency_limiter("gmail"),
+                breaker=CIRCUIT_BREAKERS.get("gmail")
+            )
+            atexit.register(_gmail_draft_batcher.close)
+        return _gmail_draft_batcher
+
+def close_gmail_draft_batcher() -> None:
+    """Send queued drafts and stop the batcher (no-op if never used)"""
+    with _gmail_draft_batcher_lock:
+        batcher = _gmail_draft_batcher
+    if batcher is not None:
+        batcher.close()
+
+_instrumentation: Optional[Instrumentation] = None
+_instrumentation_lock = threading.Lock()
+
+def get_instrumentation() -> Instrumentation:
+    """Return the process-wide node instrumentation"""
+    global _instrumentation
+    with _instrumentation_lock:
+        if _instrumentation is None:
+            _instrumentation = Instrumentation(span_path=TRACE_SPANS_PATH)
+        return _instrumentation
+
+def read_sheet_range(range_name: str) -> List[List[Any]]:
+    """Rows of one A1 range of the lead spreadsheet"""
+    service = get_google_service('sheets', 'v4')
+    result = execute_google_request(
+        service.spreadsheets().values().get(
+            spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
+            range=range_name
+        ),
+        "sheets",
+        idempotent=True
+    )
+    return result.get('values', [])
+
+def read_sheet_row_count(sheet: str) -> Optional[int]:
+    """Rows of tab ``sheet`` of the lead spreadsheet, blank ones included"""
+    service = get_google_service('sheets', 'v4')
+    metadata = execute_google_request(
+        service.spreadsheets().get(
+            spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
+            fields='sheets.properties(title,gridProperties.rowCount)'
+        ),
+        "sheets",
+        idempotent=True
+    )
+    for entry in metadata.get('sheets', []):
+        properties = entry.get('properties', {})
+        if properties.get('title') == sheet:
+            return properties.get('gridProperties', {}).get('rowCount')
+    return None
+
+def open_lead_source(spec: str) -> LeadSource:
+    """Lead source for ``spec``: "sheets" or a path to a CSV/JSONL/Parquet file"""
+    if spec == "sheets":
+        return GoogleSheetsLeadSource(read_sheet_range, sheet="Sheet1", column="A", row_count=read_sheet_row_count)
+    return open_file_lead_source(spec)
+
+# Prefetching readers keyed by run id; they hold a thread and an open source,
+# so they live here rather than in the checkpointed state
+_lead_readers: Dict[str, PrefetchingLeadReader] = {}
+_lead_readers_lock = threading.Lock()
+
+def get_lead_reader(state: Dict[str, Any]) -> PrefetchingLeadReader:
+    """Reader for this run, started at the state's ``leads_offset`` on first use"""
+    key = state.get("run_id") or ""
+    with _lead_readers_lock:
+        reader = _lead_readers.get(key)
+        if reader is None:
+            source = open_lead_source(state.get("lead_source") or LEAD_SOURCE)
+            reader = PrefetchingLeadReader(
+                source,
+                page_size=LEAD_PAGE_SIZE,
+                start_offset=state.get("leads_offset", 0),
+                prefetch=LEAD_PREFETCH_PAGES
+            )
+            _lead_readers[key] = reader
+        return reader
+
+def drop_lead_reader(state: Dict[str, Any]) -> None:
+    with _lead_readers_lock:
+        _lead_readers.pop(state.get("run_id") or "", None)
+
+def ledger_status(log_range: str) -> str:
+    return SUCCEEDED if log_range == SUCCESS_LOG_RANGE else FAILED
+
+def log_lead_rows(state: Dict[str, Any], log_range: str, row: List[Any]) -> None:
+    """Queue ``row``, logged for the current company, once per lead row of its domain.
+
+    The row is also kept in the ledger, so rows of the domain on later pages
+    are logged with the same result instead of being processed again.
+    """
+    url = state.get("current_company_url")
+    run_id = state.get("run_id")
+    result = DomainResult(url, log_range, row)
+    lead_rows = (state.get("lead_rows") or {}).get(url) or [url]
+    for lead_url in lead_rows:
+        get_sheets_log_buffer().add(log_range, result.row_for(lead_url))
+    if run_id:
+        ledger = get_completion_ledger()
+        domain = registrable_domain(url)
+        if domain:
+            ledger.record_domain(run_id, domain, url, log_range, row)
+        for lead_url in lead_rows:
+            if lead_url != url:
+                ledger.mark(run_id, lead_url, ledger_status(log_range))
+        ledger.mark(run_id, url, ledger_status(log_range))
+
+def log_known_domain_rows(run_id: str, result: DomainResult, lead_rows: List[str]) -> int:
+    """Log lead rows of an already processed domain with its result; returns the rows logged"""
+    ledger = get_completion_ledger()
+    logged = 0
+    for lead_url in lead_rows:
+        if ledger.is_finished(run_id, lead_url):  # Logged before a restart
+            continue
+        get_sheets_log_buffer().add(result.log_range, result.row_for(lead_url))
+        ledger.mark(run_id, lead_url, ledger_status(result.log_range))
+        logged += 1
+    return logged
+
 def extract_domain_from_url(url: str) -> str:
-    """Extract domain from URL (removes protocol and path)"""
+    """Domain to search Hunter.io for: the URL's registrable domain.
+
+    With tldextract installed, ``shop.acme.com`` becomes ``acme.com``;
+    without it only a leading ``www.`` is dropped and other subdomains
+    are searched as given (see url_normalization.registrable_domain).
+    """
+    domain = registrable_domain(url)
+    if domain:
+        return domain
     try:
         parsed = urlparse(url)
         domain = parsed.netloc or parsed.path
@@ -165,8 +960,8 @@ def clean_text_content(text: str, max_length: int = 5000) -> str:
     if not text:
         return ""
     
-    # Remove extra whitespace
-    text = ' '.join(text.split())
+    # Remove extra whitespace, keeping one line per block
+    text = '\n'.join(' '.join(line.split()) for line in text.splitlines() if line.strip())
     
     # Truncate if too long
     if len(text) > max_length:
@@ -174,317 +969,347 @@ def clean_text_content(text: str, max_length: int = 5000) -> str:
     
     return text
 
+def company_deadline() -> Optional[float]:
+    """time.time() by which a company started now must be done (None: no deadline)"""
+    return time.time() + COMPANY_DEADLINE_SECONDS if COMPANY_DEADLINE_SECONDS > 0 else None
+
+def reset_company_fields() -> Dict[str, Any]:
+    """Per-company fields cleared before a new company is processed"""
+    return {
+        "html_content": None,
+        "html_encoding": None,
+        "text_content": None,
+        "company_summary": None,
+        "company_domain": None,
+        "contact_emails": [],
+        "organization_name": None,
+        "email_body": None,
+        "email_subject": None,
+        "target_email": None,
+        "emails_found": False,
+        "success_logged": False,
+        "failure_logged": False,
+        "draft_id": None,
+        "deadline": company_deadline(),
+        "deadline_exceeded": False
+    }
+
 # ============================================================================
 # NODE IMPLEMENTATIONS
 # ============================================================================
 
-def initialize_workflow(state: WorkflowState) -> WorkflowState:
+def initialize_workflow(state: WorkflowState) -> Dict[str, Any]:
     """Initialize the workflow state - replaces manual trigger"""
     logger.info("Starting automated outbound sales workflow")
     
     return {
-        **state,
         "current_index": 0,
-        "processing_complete": False,
-        "errors": []
+        "processing_complete": False
     }
 
-def read_google_sheets(state: WorkflowState) -> WorkflowState:
-    """Read company URLs from Google Sheets - Node: Google Sheets"""
-    logger.info("Reading company URLs from Google Sheets")
-    
+def read_leads(state: WorkflowState) -> Dict[str, Any]:
+    """Read the next page of company URLs - Node: Google Sheets"""
     try:
-        creds = get_google_credentials()
-        service = build('sheets', 'v4', credentials=creds)
-        
-        # Read from Sheet1, column A
-        range_name = 'Sheet1!A1:A'
-        result = service.spreadsheets().values().get(
-            spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
-            range=range_name
-        ).execute()
-        
-        values = result.get('values', [])
-        
-        if not values:
-            logger.warning("No URLs found in Google Sheets")
-            return {**state, "company_urls": [], "processing_complete": True}
-        
-        # Extract URLs (skip header if present)
-        urls = []
-        for row in values:
-            if row and row[0]:
-                url = row[0].strip()
-                # Skip if it looks like a header
-                if not url.lower().startswith('company') and url.startswith('http'):
-                    urls.append(url)
-        
-        logger.info(f"Found {len(urls)} company URLs to process")
-        return {**state, "company_urls": urls}
-        
+        page = get_lead_reader(state).next_page()
     except Exception as e:
-        logger.error(f"Error reading Google Sheets: {e}")
+        logger.error(f"Error reading leads: {e}")
+        drop_lead_reader(state)
         return {
-            **state, 
-            "errors": state.get("errors", []) + [f"Google Sheets read error: {str(e)}"],
+            "errors": [f"Lead source read error: {str(e)}"],
             "processing_complete": True
         }
+    
+    if page is None:
+        drop_lead_reader(state)
+        if not state.get("leads_offset"):
+            logger.warning("No URLs found in the lead source")
+        return {"company_urls": [], "lead_rows": {}, "current_index": 0, "processing_complete": True}
+    
+    # One company per registrable domain; domains processed on an earlier page
+    # only get their rows logged
+    run_id = state.get("run_id")
+    groups = []
+    known_rows = 0
+    for group in group_by_domain(page.urls):
+        result = get_completion_ledger().domain_result(run_id, group.domain) if run_id else None
+        if result is None:
+            groups.append(group)
+        else:
+            known_rows += log_known_domain_rows(run_id, result, group.rows)
+    
+    logger.info(f"Read {len(page.urls)} company URLs for {len(groups)} new domains "
+                f"(lead rows up to {page.next_offset})")
+    if known_rows:
+        logger.info(f"Logged {known_rows} rows of domains already processed in run {run_id}")
+    return {
+        "company_urls": [group.url for group in groups],
+        "lead_rows": {group.url: group.rows for group in groups if group.rows != [group.url]},
+        "current_index": 0,
+        "leads_offset": page.next_offset
+    }
 
-def select_next_company(state: WorkflowState) -> WorkflowState:
+def select_next_company(state: WorkflowState) -> Dict[str, Any]:
     """Select the next company URL to process"""
     current_index = state.get("current_index", 0)
     company_urls = state.get("company_urls", [])
+    run_id = state.get("run_id")
+    
+    # Companies finished before a restart are not processed again
+    while run_id and current_index < len(company_urls) and \
+            get_completion_ledger().is_finished(run_id, company_urls[current_index]):
+        logger.info(f"Skipping {company_urls[current_index]}: already finished in run {run_id}")
+        current_index += 1
     
     if current_index < len(company_urls):
         current_url = company_urls[current_index]
         logger.info(f"Processing company {current_index + 1}/{len(company_urls)}: {current_url}")
         
         return {
-            **state,
             "current_company_url": current_url,
             "current_index": current_index,
             # Reset per-company state
-            "html_content": None,
-            "text_content": None,
-            "company_summary": None,
-            "hunter_results": None,
-            "contact_emails": [],
-            "email_body": None,
-            "email_subject": None,
-            "emails_found": False,
-            "success_logged": False,
-            "failure_logged": False,
-            "draft_id": None
+            **reset_company_fields()
         }
     else:
-        logger.info("All companies processed")
-        return {**state, "processing_complete": True}
+        # should_continue_processing decides between the next page and the end
+        return {"current_index": current_index}
 
-def fetch_website(state: WorkflowState) -> WorkflowState:
+def derive_company_domain(state: WorkflowState) -> Dict[str, Any]:
+    """Derive the Hunter.io domain from the company URL, before anything is fetched"""
+    url = state.get("current_company_url")
+    if not url:
+        return {}
+    
+    if SPECULATIVE_FETCH:
+        try:
+            start_speculative_fetch(state)
+        except Exception as e:
+            logger.warning(f"Could not start speculative fetch of {url}: {e}")
+    
+    return {"company_domain": extract_domain_from_url(url)}
+
+def fetch_website(state: WorkflowState) -> Dict[str, Any]:
     """Fetch website HTML content - Node: HTTP Request"""
     url = state.get("current_company_url")
     if not url:
-        return state
+        return {}
     
     logger.info(f"Fetching website content from {url}")
     
     try:
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
+        cache = get_http_cache()
+        cached = cache.lookup(url) if cache else None
         
-        response = requests.get(url, headers=headers, timeout=30, allow_redirects=True)
-        response.raise_for_status()
+        if cached and cached.is_fresh(HTTP_CACHE_TTL):
+            logger.info(f"Using cached copy of {url}")
+            if cached.text is not None:
+                return {"html_content": None, "text_content": cached.text}
+            return {"html_content": cached.body}
+        
+        headers = cached.conditional_headers() if cached else None
+        fetcher = get_website_fetcher()
+        limiter = concurrency_limiter("fetch")
+        
+        def fetch():
+            # The timeout is taken once a slot is free, so waiting for one counts against the deadline
+            if limiter:
+                return limiter.call(lambda: fetcher.fetch(url, headers=headers, timeout=time_left(FETCH_TIMEOUT)),
+                                    lambda e: is_timeout(e) and not deadline_passed())
+            return fetcher.fetch(url, headers=headers, timeout=time_left(FETCH_TIMEOUT))
+        
+        result = None
+        speculative = take_speculative_fetch(state)
+        if speculative is not None:
+            try:
+                result = speculative.result()
+                logger.info(f"Using speculative fetch of {url}")
+            except Exception as e:
+                if not is_retryable_fetch_error(e):
+                    raise
+                logger.info(f"Speculative fetch of {url} failed ({e}), fetching again")
+        if result is None:
+            result = retry_call(fetch, is_retryable_fetch_error, max_attempts=FETCH_MAX_ATTEMPTS)
+        record(BYTES_DOWNLOADED, len(result.content))
         
-        time.sleep(DELAY_BETWEEN_REQUESTS)
+        if result.status_code == 304 and cached:
+            logger.info(f"{url} not modified since last fetch")
+            cache.touch(url)
+            if cached.text is not None:
+                return {"html_content": None, "text_content": cached.text}
+            return {"html_content": cached.body}
         
-        return {**state, "html_content": response.text}
+        if cache:
+            cache.store(url, result.text, result.headers.get("etag"), result.headers.get("last-modified"))
+        # The raw bytes go to the extractor as read, without another decode/encode round trip
+        return {"html_content": result.content, "html_encoding": result.encoding}
         
     except Exception as e:
         logger.error(f"Error fetching website {url}: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"HTTP fetch error for {url}: {str(e)}"]
+            "errors": [f"HTTP fetch error for {url}: {str(e)}"]
         }
 
-def extract_text_content(state: WorkflowState) -> WorkflowState:
+def extract_text_content(state: WorkflowState) -> Dict[str, Any]:
     """Extract text from HTML body - Node: HTML"""
     html = state.get("html_content")
     if not html:
-        return state
+        return {}
     
     logger.info("Extracting text content from HTML")
     
     try:
-        soup = BeautifulSoup(html, 'html.parser')
-        
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        # Extract body text
-        body = soup.find('body')
-        if body:
-            text = body.get_text(separator=' ', strip=True)
-            text = clean_text_content(text)
-            return {**state, "text_content": text}
+        # Visible body text only; parsing stops once the character budget is reached
+        pool = get_extraction_pool()
+        if isinstance(html, bytes):
+            encoding = state.get("html_encoding") or "utf-8"
         else:
-            return {**state, "text_content": soup.get_text(separator=' ', strip=True)}
+            html, encoding = html.encode("utf-8"), "utf-8"
+        if pool:
+            text = pool.extract(html, TEXT_CHAR_BUDGET, encoding=encoding)
+        else:
+            text = extract_text(html, TEXT_CHAR_BUDGET, encoding=encoding)
+        text = clean_text_content(text, max_length=TEXT_CHAR_BUDGET)
+        
+        # Later runs can skip downloading and parsing this page while it's unchanged
+        cache = get_http_cache()
+        if cache:
+            cache.store_text(state.get("current_company_url", ""), text)
+        
+        # The HTML is not needed past this point
+        return {"text_content": text, "html_content": None, "html_encoding": None}
             
     except Exception as e:
         logger.error(f"Error extracting text: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"HTML extraction error: {str(e)}"]
+            "errors": [f"HTML extraction error: {str(e)}"]
         }
 
-def summarize_company(state: WorkflowState) -> WorkflowState:
+def reduce_text_content(state: WorkflowState) -> Dict[str, Any]:
+    """Cut the page text down to its main content within SUMMARY_TOKEN_BUDGET tokens"""
+    text = state.get("text_content")
+    if not text:
+        return {}
+    
+    reduced = reduce_content(text, SUMMARY_TOKEN_BUDGET, OPENAI_MODEL)
+    logger.info(f"Reduced page text from {len(text)} to {len(reduced)} characters")
+    return {"text_content": reduced}
+
+def summarize_company(state: WorkflowState) -> Dict[str, Any]:
     """Generate company summary using OpenAI - Node: OpenAI-Summarizer"""
     text_content = state.get("text_content")
     if not text_content or not OPENAI_CLIENT:
-        return state
+        return {}
     
     logger.info("Generating company summary with OpenAI")
     
     try:
-        prompt = f"""Summarize the following website content. Focus on what the company does and its main value proposition. Keep it concise, under 75 words. Here is the content: {text_content[:3000]}"""
+        prompt = f"""Summarize the following website content. Focus on what the company does and its main value proposition. Keep it concise, under 75 words. Here is the content: {text_content}"""
         
-        response = OPENAI_CLIENT.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=150,
-            temperature=0.7
-        )
-        
-        summary = response.choices[0].message.content
+        summary = create_chat_completion("summary", prompt, max_tokens=150)
         logger.info(f"Summary generated: {summary[:100]}...")
         
         # Extract domain for Hunter.io
         domain = extract_domain_from_url(state.get("current_company_url", ""))
         
-        return {**state, "company_summary": summary, "company_domain": domain}
+        # The page text is not needed past this point
+        return {"company_summary": summary, "company_domain": domain, "text_content": None}
         
     except Exception as e:
         logger.error(f"Error generating summary: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"OpenAI summary error: {str(e)}"]
+            "errors": [f"OpenAI summary error: {str(e)}"]
         }
 
-def find_contacts(state: WorkflowState) -> WorkflowState:
+def find_contacts(state: WorkflowState) -> Dict[str, Any]:
     """Find email contacts using Hunter.io - Node: Hunter"""
     domain = state.get("company_domain")
     if not domain or not HUNTER_API_KEY:
-        return state
+        return {}
     
     logger.info(f"Finding contacts for domain: {domain}")
     
     try:
-        time.sleep(HUNTER_API_DELAY)  # Rate limiting
-        
-        url = "https://api.hunter.io/v2/domain-search"
-        params = {
-            'domain': domain,
-            'api_key': HUNTER_API_KEY,
-            'limit': 10
-        }
-        
-        response = requests.get(url, params=params)
-        response.raise_for_status()
+        cache = get_hunter_cache()
+        hunter_data = cache.get(domain) if cache else None
         
-        data = response.json()
+        if hunter_data is None:
+            hunter_data = hunter_domain_search(domain).get('data') or {}
+            if cache:
+                cache.put(domain, hunter_data)
+        else:
+            logger.info(f"Using cached Hunter.io results for {domain}")
         
-        if data.get('data'):
-            emails = data['data'].get('emails', [])
-            organization = data['data'].get('organization', 'Unknown Company')
+        if hunter_data:
+            emails = [Contact.from_hunter(entry) for entry in hunter_data.get('emails', [])]
+            organization = hunter_data.get('organization', 'Unknown Company')
             
             logger.info(f"Found {len(emails)} email addresses")
             
             return {
-                **state,
-                "hunter_results": data['data'],
                 "contact_emails": emails,
                 "organization_name": organization,
                 "emails_found": len(emails) > 0
             }
         else:
-            return {**state, "emails_found": False}
+            return {"emails_found": False}
             
     except Exception as e:
         logger.error(f"Error with Hunter.io API: {e}")
         return {
-            **state,
             "emails_found": False,
-            "errors": state.get("errors", []) + [f"Hunter.io error: {str(e)}"]
+            "errors": [f"Hunter.io error: {str(e)}"]
         }
 
-def prepare_update_data(state: WorkflowState) -> WorkflowState:
+def prepare_update_data(state: WorkflowState) -> Dict[str, Any]:
     """Prepare data for success logging - Node: Edit Fields-Prepare Update Data"""
     logger.info("Preparing update data for success logging")
-    return {**state, "success_logged": False}
+    return {"success_logged": False}
 
-def generate_email_body(state: WorkflowState) -> WorkflowState:
+def generate_email_body(state: WorkflowState) -> Dict[str, Any]:
     """Generate personalized email body - Node: OpenAI1-email body"""
     if not state.get("emails_found") or not OPENAI_CLIENT:
-        return state
+        return {}
     
     logger.info("Generating personalized email body")
     
     try:
         emails = state.get("contact_emails", [])
         if not emails:
-            return state
+            return {}
             
         first_email = emails[0]
-        first_name = first_email.get('first_name', 'there')
-        last_name = first_email.get('last_name', '')
+        first_name = first_email.first_name or 'there'
+        last_name = first_email.last_name or ''
         
-        prompt = f"""AVOID PURPLE PROSE. USE AS FEW WORDS AS POSSIBLE.
-
-USE THESE FOLLOWING EXAMPLES AS THEY'RE VERY GOOD. STICK VERY CLOSE TO THIS STYLE AND EXACT TONE.
-
-EXAMPLE 1:
-
-Hey Tom,
-
-I lead the team at AgentHub.dev and found you online when looking for Intelligent Automation consultants. We're an AI-first intelligent automation platform.
-
-We're backed by the same people as AirBnB and Doordash but looking to explore collaborating with existing companies in the field.
-
-Would love to chat this week if you're open to it.
-
-EXAMPLE 2:
-
-Hey Priti,
-
-Hope this cold email is alright — found Cognizant's website and thought I'd reach out since we're building in the intelligent automation space.
-
-I lead the team at AgentHub.dev, we're an AI-first intelligent automation tool. We're backed by the same people as AirBnB and Doordash but fully focused on helping businesses automate work with AI.
-
-Would love to chat about potential collaboration if you're open to it.
-
-ALWAYS SIGN OFF WITH:
-
------
-Best
-Kaushalya N
-Co-Founder
+        prompt = f"""{EMAIL_STYLE_PROMPT}
 
 Context:
 Summary of company: {state.get('company_summary', 'N/A')}
 Contact person: {first_name} {last_name}"""
 
-        response = OPENAI_CLIENT.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=300,
-            temperature=0.7
-        )
-        
-        email_body = response.choices[0].message.content
+        email_body = create_chat_completion("email_body", prompt, max_tokens=300)
         logger.info("Email body generated successfully")
         
-        return {**state, "email_body": email_body, "target_email": first_email.get('value')}
+        return {"email_body": email_body, "target_email": first_email.value}
         
     except Exception as e:
         logger.error(f"Error generating email body: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"Email body generation error: {str(e)}"]
+            "errors": [f"Email body generation error: {str(e)}"]
         }
 
-def generate_email_subject(state: WorkflowState) -> WorkflowState:
+def generate_email_subject(state: WorkflowState) -> Dict[str, Any]:
     """Generate email subject line - Node: OpenAI-subject"""
     if not state.get("email_body") or not OPENAI_CLIENT:
-        return state
+        return {}
     
     logger.info("Generating email subject line")
     
     try:
         emails = state.get("contact_emails", [])
-        first_email = emails[0] if emails else {}
-        first_name = first_email.get('first_name', 'there')
-        last_name = first_email.get('last_name', '')
+        first_email = emails[0] if emails else Contact('')
+        first_name = first_email.first_name or 'there'
+        last_name = first_email.last_name or ''
         
         prompt = f"""Context:
 Summary of company: {state.get('company_summary', 'N/A')}
@@ -494,36 +1319,138 @@ Contact person: {first_name} {last_name}
 Write a 3 to 4 word subject to grab their attention. Mention their company name and partnership.
 Here is an example: 'Potential Partnership with Cognizant'"""
 
-        response = OPENAI_CLIENT.chat.completions.create(
-            model=OPENAI_MODEL,
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=20,
-            temperature=0.7
-        )
-        
-        subject = response.choices[0].message.content.strip()
+        subject = create_chat_completion("email_subject", prompt, max_tokens=20).strip()
         logger.info(f"Subject generated: {subject}")
         
-        return {**state, "email_subject": subject}
+        return {"email_subject": subject}
         
     except Exception as e:
         logger.error(f"Error generating subject: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"Subject generation error: {str(e)}"]
+            "errors": [f"Subject generation error: {str(e)}"]
         }
 
-def create_gmail_draft(state: WorkflowState) -> WorkflowState:
+def parse_email_response(content: Optional[str]) -> Tuple[str, str]:
+    """Subject and body of a structured email response; raises ValueError if either is missing"""
+    try:
+        email = json.loads(content or "")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Response is not valid JSON ({e}): {(content or '')[:200]}") from None
+    subject = email.get("subject") if isinstance(email, dict) else None
+    body = email.get("body") if isinstance(email, dict) else None
+    if not isinstance(subject, str) or not isinstance(body, str) or not subject.strip() or not body.strip():
+        raise ValueError(f"Response is missing subject or body: {content[:200]}")
+    return subject, body
+
+def generate_email(state: WorkflowState) -> Dict[str, Any]:
+    """Generate email subject and body in one structured-output call - Nodes: OpenAI1-email body + OpenAI-subject"""
+    if not state.get("emails_found") or not OPENAI_CLIENT:
+        return {}
+    
+    logger.info("Generating personalized email subject and body")
+    
+    try:
+        emails = state.get("contact_emails", [])
+        if not emails:
+            return {}
+        
+        first_email = emails[0]
+        first_name = first_email.first_name or 'there'
+        last_name = first_email.last_name or ''
+        
+        prompt = f"""{EMAIL_STYLE_PROMPT}
+
+Also write a 3 to 4 word subject to grab their attention. Mention their company name and partnership.
+Here is an example: 'Potential Partnership with Cognizant'
+
+Respond with a JSON object with two string fields: "subject" and "body".
+
+Context:
+Summary of company: {state.get('company_summary', 'N/A')}
+Company Name: {state.get('organization_name', 'Your Company')}
+Contact person: {first_name} {last_name}"""
+
+        content = create_chat_completion("email", prompt, max_tokens=340, json_mode=True,
+                                         validate=parse_email_response)
+        subject, body = parse_email_response(content)
+        
+        logger.info(f"Email generated with subject: {subject.strip()}")
+        
+        return {
+            "email_subject": subject.strip(),
+            "email_body": body,
+            "target_email": first_email.value
+        }
+        
+    except Exception as e:
+        logger.error(f"Error generating email: {e}")
+        return {
+            "errors": [f"Email generation error: {str(e)}"]
+        }
+
+def find_draft(message_id: Optional[str]) -> Optional[str]:
+    """Id of the Gmail draft with Message-ID ``message_id``, if there is one"""
+    if not message_id:
+        return None
+    service = get_google_service('gmail', 'v1')
+    result = execute_google_request(
+        service.users().drafts().list(userId='me', q=f"rfc822msgid:{message_id.strip('<>')}", maxResults=1),
+        "gmail",
+        idempotent=True
+    )
+    drafts = result.get('drafts') or []
+    return drafts[0]['id'] if drafts else None
+
+def create_gmail_draft(state: WorkflowState) -> Dict[str, Any]:
     """Create Gmail draft - Node: Gmail"""
     if not state.get("email_subject") or not state.get("email_body"):
-        return state
+        return {}
+    
+    run_id = state.get("run_id")
+    url = state.get("current_company_url")
+    existing_draft_id = get_completion_ledger().draft_id(run_id, url) if run_id else None
+    if existing_draft_id:
+        logger.info(f"Draft {existing_draft_id} already created for {url}, not creating another")
+        return {"draft_id": existing_draft_id}
+    
+    # Worker mode: only the current holder of the company's lease may create
+    # its draft, and never when one was already created for the lead
+    lease_token = state.get("lease_token")
+    message_id = draft_message_id(run_id, url) if run_id else None
+    if lease_token:
+        try:
+            claim = get_work_queue().claim_draft(url, lease_token)
+        except LeaseLost as e:
+            logger.warning(f"Not creating a draft for {url}: {e}")
+            return {"errors": [f"Gmail draft skipped for {url}: {str(e)}"]}
+        try:
+            existing_draft_id = claim.draft_id or (find_draft(message_id) if claim.previously_claimed else None)
+        except Exception as e:
+            logger.error(f"Could not check for an earlier draft for {url}: {e}")
+            return {"errors": [f"Gmail draft lookup error for {url}: {str(e)}"]}
+        if existing_draft_id:
+            logger.info(f"Draft {existing_draft_id} already created for {url}, not creating another")
+            get_work_queue().record_draft(url, existing_draft_id)
+            get_completion_ledger().mark(run_id, url, DRAFTED, existing_draft_id)
+            return {"draft_id": existing_draft_id}
+    elif run_id:
+        # An earlier attempt in this run (before a crash or resume) may have
+        # created the draft without getting to record its id
+        ledger = get_completion_ledger()
+        try:
+            existing_draft_id = find_draft(message_id) if ledger.status(run_id, url) == DRAFTING else None
+        except Exception as e:
+            logger.error(f"Could not check for an earlier draft for {url}: {e}")
+            return {"errors": [f"Gmail draft lookup error for {url}: {str(e)}"]}
+        if existing_draft_id:
+            logger.info(f"Draft {existing_draft_id} already created for {url}, not creating another")
+            ledger.mark(run_id, url, DRAFTED, existing_draft_id)
+            return {"draft_id": existing_draft_id}
+        ledger.mark(run_id, url, DRAFTING)
     
     logger.info(f"Creating Gmail draft for {state.get('target_email')}")
     
     try:
-        creds = get_google_credentials()
-        service = build('gmail', 'v1', credentials=creds)
-        
         # Create message
         message = {
             'to': state.get('target_email'),
@@ -531,124 +1458,112 @@ def create_gmail_draft(state: WorkflowState) -> WorkflowState:
             'body': state.get('email_body')
         }
         
-        # Create draft
-        draft = {
-            'message': {
-                'raw': create_message_raw(
-                    message['to'],
-                    message['subject'],
-                    message['body']
-                )
+        if GMAIL_DRAFT_MODE == "batch":
+            # The MIME message is built and sent by the batcher thread
+            draft_id = get_gmail_draft_batcher().create(message['to'], message['subject'], message['body'],
+                                                        message_id=message_id)
+        else:
+            service = get_google_service('gmail', 'v1')
+            
+            # Create draft
+            draft = {
+                'message': {
+                    'raw': create_message_raw(
+                        message['to'],
+                        message['subject'],
+                        message['body'],
+                        message_id
+                    )
+                }
             }
-        }
-        
-        result = service.users().drafts().create(userId='me', body=draft).execute()
+            
+            result = execute_google_request(
+                service.users().drafts().create(userId='me', body=draft),
+                "gmail"
+            )
+            draft_id = result.get('id')
         
-        draft_id = result.get('id')
         logger.info(f"Draft created with ID: {draft_id}")
+        if lease_token and draft_id:
+            get_work_queue().record_draft(url, draft_id)
+        if run_id:
+            get_completion_ledger().mark(run_id, url, DRAFTED, draft_id)
         
-        return {**state, "draft_id": draft_id}
+        return {"draft_id": draft_id}
         
     except Exception as e:
         logger.error(f"Error creating Gmail draft: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"Gmail draft error: {str(e)}"]
+            "errors": [f"Gmail draft error: {str(e)}"]
         }
 
-def create_message_raw(to, subject, body):
-    """Create a raw message for Gmail API"""
-    import base64
-    from email.mime.text import MIMEText
-    
-    message = MIMEText(body)
-    message['to'] = to
-    message['subject'] = subject
-    
-    raw = base64.urlsafe_b64encode(message.as_bytes()).decode()
-    return raw
-
-def update_success_log(state: WorkflowState) -> WorkflowState:
+def update_success_log(state: WorkflowState) -> Dict[str, Any]:
     """Update Google Sheets with successful contact - Node: Google Sheets - Update Success Log"""
     if not state.get("draft_id") or state.get("success_logged"):
-        return state
+        return {}
     
     logger.info("Updating success log in Google Sheets")
     
     try:
-        creds = get_google_credentials()
-        service = build('sheets', 'v4', credentials=creds)
-        
         emails = state.get("contact_emails", [])
         if not emails:
-            return state
+            return {}
             
         first_email = emails[0]
         
         # Prepare row data
-        row_data = [[
+        row_data = [
             state.get("current_company_url"),
-            first_email.get('value', ''),
-            f"{first_email.get('first_name', '')} {first_email.get('last_name', '')}"
-        ]]
+            first_email.value,
+            f"{first_email.first_name or ''} {first_email.last_name or ''}"
+        ]
         
-        # Append to Sheet1
-        body = {'values': row_data}
-        result = service.spreadsheets().values().append(
-            spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
-            range='Sheet1!A:C',
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+        # Queue for Sheet1; the buffer journals the rows and batches the write
+        log_lead_rows(state, SUCCESS_LOG_RANGE, row_data)
         
-        logger.info("Success log updated")
-        return {**state, "success_logged": True}
+        logger.info("Success log row queued")
+        return {"success_logged": True}
         
     except Exception as e:
         logger.error(f"Error updating success log: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"Success log update error: {str(e)}"]
+            "errors": [f"Success log update error: {str(e)}"]
         }
 
-def log_failed_lookup(state: WorkflowState) -> WorkflowState:
+def log_failed_lookup(state: WorkflowState) -> Dict[str, Any]:
     """Log failed email lookups - Node: Google Sheets- Log Failed Lookups"""
-    if state.get("emails_found") or state.get("failure_logged"):
-        return state
+    # Only reached on failure paths: no contacts, or (contacts_first) no summary
+    cancel_speculative_fetch(state)
+    if state.get("failure_logged"):
+        return {}
     
     logger.info("Logging failed lookup to Google Sheets")
     
     try:
-        creds = get_google_credentials()
-        service = build('sheets', 'v4', credentials=creds)
-        
         # Prepare row data
-        row_data = [[state.get("company_domain", state.get("current_company_url", ""))]]
+        row_data = [state.get("company_domain") or state.get("current_company_url", "")]
         
-        # Append to Failures sheet
-        body = {'values': row_data}
-        result = service.spreadsheets().values().append(
-            spreadsheetId=GOOGLE_SHEETS_SPREADSHEET_ID,
-            range='Failures!A:A',
-            valueInputOption='RAW',
-            body=body
-        ).execute()
+        # Queue for the Failures sheet; the buffer journals the rows and batches the write
+        log_lead_rows(state, FAILURE_LOG_RANGE, row_data)
         
-        logger.info("Failed lookup logged")
-        return {**state, "failure_logged": True}
+        logger.info("Failed lookup queued")
+        return {"failure_logged": True}
         
     except Exception as e:
         logger.error(f"Error logging failed lookup: {e}")
         return {
-            **state,
-            "errors": state.get("errors", []) + [f"Failed lookup log error: {str(e)}"]
+            "errors": [f"Failed lookup log error: {str(e)}"]
         }
 
-def increment_index(state: WorkflowState) -> WorkflowState:
+def increment_index(state: WorkflowState) -> Dict[str, Any]:
     """Move to the next company in the list"""
     current_index = state.get("current_index", 0)
+    cancel_speculative_fetch(state)
     logger.info(f"Moving to next company (index {current_index + 1})")
-    return {**state, "current_index": current_index + 1}
+    return {
+        "current_index": current_index + 1,
+        "companies_processed": state.get("companies_processed", 0) + 1
+    }
 
 # ============================================================================
 # CONDITIONAL EDGES
@@ -663,10 +1578,17 @@ def should_continue_processing(state: WorkflowState) -> str:
     company_urls = state.get("company_urls", [])
     
     if current_index >= len(company_urls):
-        return "end"
+        return "next_page"
     else:
         return "continue"
 
+def check_summary_generated(state: WorkflowState) -> str:
+    """contacts_first: write an email only if the company could be summarized"""
+    if state.get("company_summary"):
+        return "success"
+    else:
+        return "failure"
+
 def check_emails_found(state: WorkflowState) -> str:
     """Check if emails were found - implements If node logic"""
     if state.get("emails_found", False):
@@ -678,83 +1600,613 @@ def check_emails_found(state: WorkflowState) -> str:
 # GRAPH CONSTRUCTION
 # ============================================================================
 
-def create_workflow_graph() -> StateGraph:
-    """Create and configure the LangGraph workflow"""
+def within_deadline(name: str, fn):
+    """``fn`` as a node bound by the company's deadline.
+
+    Once the deadline has passed the node is skipped (reported once per
+    company); otherwise the calls it makes get the deadline via deadline_scope.
+    """
+    @functools.wraps(fn)
+    def node(state, *args, **kwargs):
+        deadline = state.get("deadline")
+        if deadline is not None and time.time() >= deadline:
+            if state.get("deadline_exceeded"):
+                return {}
+            url = state.get("current_company_url")
+            logger.warning(f"Deadline exceeded for {url}; skipping {name} and the steps after it")
+            return {"errors": [f"Company deadline exceeded for {url} before {name}"], "deadline_exceeded": True}
+        with deadline_scope(deadline):
+            return fn(state, *args, **kwargs)
+    return node
+
+def node_function(name: str, fn, deadline: bool = False):
+    """``fn`` as node ``name``, timed by the run's instrumentation.
+
+    With ``deadline`` the node is bound by the company's deadline.
+    """
+    return get_instrumentation().wrap(name, within_deadline(name, fn) if deadline else fn)
+
+def add_node(workflow: StateGraph, name: str, fn, deadline: bool = False) -> None:
+    """Register ``fn`` as node ``name`` (see node_function)"""
+    workflow.add_node(name, node_function(name, fn, deadline))
+
+def add_company_pipeline(workflow: StateGraph, done: str, order: str = PIPELINE_ORDER) -> str:
+    """Add the per-company nodes and edges to a graph.
+
+    ``order`` is "fetch_first" (fetch, summarize, then look up contacts) or
+    "contacts_first" (look up contacts, then fetch and summarize only
+    companies that have some). Both the success and the failure path finish
+    at ``done``. Returns the name of the node that starts processing a single
+    company. The nodes up to the generated email are bound by the company
+    deadline; once an email exists, drafting and logging always run.
+    """
+    add_node(workflow, "fetch_website", fetch_website, deadline=True)
+    add_node(workflow, "extract_text", extract_text_content, deadline=True)
+    add_node(workflow, "reduce_content", reduce_text_content, deadline=True)
+    add_node(workflow, "summarize", summarize_company, deadline=True)
+    add_node(workflow, "find_contacts", find_contacts, deadline=True)
+    add_node(workflow, "prepare_update", prepare_update_data)
+    if EMAIL_GENERATION_MODE == "combined":
+        add_node(workflow, "generate_email", generate_email, deadline=True)
+    else:
+        add_node(workflow, "generate_body", generate_email_body, deadline=True)
+        add_node(workflow, "generate_subject", generate_email_subject, deadline=True)
+    add_node(workflow, "create_draft", create_gmail_draft)
+    add_node(workflow, "update_success", update_success_log)
+    add_node(workflow, "log_failure", log_failed_lookup)
+    
+    if order == "contacts_first":
+        # Look up contacts first; only companies with contacts are fetched and summarized
+        add_node(workflow, "derive_domain", derive_company_domain, deadline=True)
+        workflow.add_edge("derive_domain", "find_contacts")
+        workflow.add_conditional_edges(
+            "find_contacts",
+            check_emails_found,
+            {
+                "success": "fetch_website",
+                "failure": "log_failure"
+            }
+        )
+        workflow.add_edge("fetch_website", "extract_text")
+        workflow.add_edge("extract_text", "reduce_content")
+        workflow.add_edge("reduce_content", "summarize")
+        workflow.add_conditional_edges(
+            "summarize",
+            check_summary_generated,
+            {
+                "success": "prepare_update",
+                "failure": "log_failure"
+            }
+        )
+        entry = "derive_domain"
+    else:
+        # Main processing pipeline for each company
+        workflow.add_edge("fetch_website", "extract_text")
+        workflow.add_edge("extract_text", "reduce_content")
+        workflow.add_edge("reduce_content", "summarize")
+        workflow.add_edge("summarize", "find_contacts")
+        
+        # Conditional edge: check if emails were found (If node)
+        workflow.add_conditional_edges(
+            "find_contacts",
+            check_emails_found,
+            {
+                "success": "prepare_update",
+                "failure": "log_failure"
+            }
+        )
+        entry = "fetch_website"
+    
+    # Success path: generate email and update logs
+    if EMAIL_GENERATION_MODE == "combined":
+        workflow.add_edge("prepare_update", "generate_email")
+        workflow.add_edge("generate_email", "create_draft")
+    else:
+        workflow.add_edge("prepare_update", "generate_body")
+        workflow.add_edge("generate_body", "generate_subject")
+        workflow.add_edge("generate_subject", "create_draft")
+    workflow.add_edge("create_draft", "update_success")
+    workflow.add_edge("update_success", done)
+    
+    # Failure path: log and continue
+    workflow.add_edge("log_failure", done)
+    
+    return entry
+
+def create_company_graph(order: str = PIPELINE_ORDER) -> StateGraph:
+    """Create the per-company subgraph used by fan-out mode"""
+    workflow = StateGraph(WorkflowState)
+    entry = add_company_pipeline(workflow, END, order)
+    workflow.set_entry_point(entry)
+    # Progress is tracked by the parent graph's checkpoints and the ledger
+    return workflow.compile(checkpointer=False)
+
+def new_company_state(task: Dict[str, Any]) -> Dict[str, Any]:
+    """Fresh per-company state for a task built by ``pending_company_tasks``"""
+    return {
+        **reset_company_fields(),
+        "run_id": task.get("run_id"),
+        "company_urls": [],
+        "lead_rows": task.get("lead_rows", {}),
+        "current_index": task["current_index"],
+        "current_company_url": task["current_company_url"],
+        "processing_complete": False,
+        "errors": []
+    }
+
+def make_process_company(company_app):
+    """Build the fan-out node that runs one company through ``company_app``"""
+    def process_company(task: Dict[str, Any]) -> Dict[str, Any]:
+        """Process a single company dispatched by ``dispatch_companies``"""
+        url = task["current_company_url"]
+        run_id = task.get("run_id")
+        if run_id and get_completion_ledger().is_finished(run_id, url):
+            logger.info(f"Skipping {url}: already finished in run {run_id}")
+            return {"companies_processed": 1}
+        
+        logger.info(f"Processing company {task['current_index'] + 1}: {url}")
+        company_state = new_company_state(task)
+        
+        try:
+            result = company_app.invoke(company_state)
+            errors = result.get("errors", [])
+        except Exception as e:
+            logger.error(f"Company pipeline failed for {url}: {e}")
+            errors = [f"Company pipeline error for {url}: {str(e)}"]
+        finally:
+            cancel_speculative_fetch(company_state)
+        
+        return {"companies_processed": 1, "errors": errors}
+    
+    return process_company
+
+def pending_company_tasks(state: CampaignState) -> List[Dict[str, Any]]:
+    """One task per company of the current page that the run's ledger doesn't have as finished"""
+    company_urls = state.get("company_urls", [])
+    run_id = state.get("run_id")
+    finished = get_completion_ledger().finished_urls(run_id) if run_id and company_urls else set()
+    pending = [(index, url) for index, url in enumerate(company_urls) if url not in finished]
+    if finished and len(pending) < len(company_urls):
+        logger.info(f"Skipping {len(company_urls) - len(pending)} companies already finished in run {run_id}")
+    lead_rows = state.get("lead_rows") or {}
+    return [
+        {
+            "current_company_url": url,
+            "current_index": index,
+            "run_id": run_id,
+            "lead_rows": {url: lead_rows[url]} if url in lead_rows else {}
+        }
+        for index, url in pending
+    ]
+
+def dispatch_companies(state: CampaignState):
+    """Map every company URL of the current page onto its own per-company run (fan-out)"""
+    if state.get("processing_complete", False):
+        return END
+    tasks = pending_company_tasks(state)
+    if not tasks:
+        return "read_leads"
+    
+    logger.info(f"Dispatching {len(tasks)} companies "
+                f"(max {MAX_CONCURRENT_COMPANIES} in flight)")
+    return [Send("process_company", task) for task in tasks]
+
+# ============================================================================
+# PIPELINED EXECUTION
+# ============================================================================
+
+def apply_update(state: Dict[str, Any], update: Optional[Dict[str, Any]]) -> None:
+    """Merge a node's update into ``state`` the way the graph does"""
+    for key, value in (update or {}).items():
+        state[key] = append_errors(state.get(key), value) if key == "errors" else value
+
+def company_stage(nodes, route=None, on_failure: str = "log_failure"):
+    """Stage function running ``nodes`` in order on a company's state.
+
+    ``route`` is a check_* function; companies it fails are handed straight
+    to the ``on_failure`` stage.
+    """
+    def stage(state: Dict[str, Any]) -> Optional[str]:
+        for node in nodes:
+            apply_update(state, node(state))
+        if route is not None and route(state) == "failure":
+            return on_failure
+        return None
+    return stage
+
+def create_company_stages(order: str = PIPELINE_ORDER) -> List[Stage]:
+    """The per-company nodes of add_company_pipeline grouped into pipeline stages.
+
+    The routing matches the graph: a company without contacts (or, with
+    "contacts_first", without a summary) skips to log_failure.
+    """
+    fetch = [
+        node_function("fetch_website", fetch_website, deadline=True),
+        node_function("extract_text", extract_text_content, deadline=True),
+        node_function("reduce_content", reduce_text_content, deadline=True),
+    ]
+    summarize = [node_function("summarize", summarize_company, deadline=True)]
+    find = [node_function("find_contacts", find_contacts, deadline=True)]
+    generate = [node_function("prepare_update", prepare_update_data)]
+    if EMAIL_GENERATION_MODE == "combined":
+        generate.append(node_function("generate_email", generate_email, deadline=True))
+    else:
+        generate.append(node_function("generate_body", generate_email_body, deadline=True))
+        generate.append(node_function("generate_subject", generate_email_subject, deadline=True))
+    draft = [node_function("create_draft", create_gmail_draft), node_function("update_success", update_success_log)]
+    log_failure = node_function("log_failure", log_failed_lookup)
+    
+    if order == "contacts_first":
+        find.insert(0, node_function("derive_domain", derive_company_domain, deadline=True))
+        stages = [
+            ("contacts", company_stage(find, check_emails_found)),
+            ("fetch", company_stage(fetch)),
+            ("summarize", company_stage(summarize, check_summary_generated)),
+        ]
+    else:
+        stages = [
+            ("fetch", company_stage(fetch)),
+            ("summarize", company_stage(summarize)),
+            ("contacts", company_stage(find, check_emails_found)),
+        ]
+    
+    first = stages[0][1]
+    
+    def start_company(state: Dict[str, Any]) -> Optional[str]:
+        # Items arrive as pending_company_tasks; the state (and the deadline)
+        # starts when a worker takes the company up, not while it is queued
+        logger.info(f"Processing company {state['current_index'] + 1}: {state['current_company_url']}")
+        state.update(new_company_state(state))
+        return first(state)
+    
+    def draft_stage(state: Dict[str, Any]) -> str:
+        company_stage(draft)(state)
+        return DONE
+    
+    stages[0] = (stages[0][0], start_company)
+    stages += [
+        ("generate", company_stage(generate)),
+        ("draft", draft_stage),
+        ("log_failure", company_stage([log_failure])),
+    ]
+    return [
+        Stage(name, fn, workers=max(1, STAGE_WORKERS.get(name, 1)), queue_size=STAGE_QUEUE_SIZE)
+        for name, fn in stages
+    ]
+
+def record_stage_error(state: Dict[str, Any], stage: str, error: Exception) -> None:
+    url = state.get("current_company_url")
+    apply_update(state, {"errors": [f"Company pipeline error for {url} in {stage}: {str(error)}"]})
+
+_company_pipeline: Optional[StagedPipeline] = None
+_company_pipeline_lock = threading.Lock()
+
+def get_company_pipeline() -> StagedPipeline:
+    """Return the process-wide company pipeline, starting it on first use"""
+    global _company_pipeline
+    with _company_pipeline_lock:
+        if _company_pipeline is None:
+            _company_pipeline = StagedPipeline(create_company_stages(PIPELINE_ORDER), on_error=record_stage_error)
+            atexit.register(_company_pipeline.close)
+        return _company_pipeline
+
+def route_page(state: CampaignState) -> str:
+    """Pipelined mode: process the current page, read the next one, or stop"""
+    if state.get("processing_complete", False):
+        return END
+    if not state.get("company_urls"):
+        return "read_leads"
+    return "process_page"
+
+def process_page(state: CampaignState) -> Dict[str, Any]:
+    """Run the pending companies of the current page through the company pipeline"""
+    tasks = pending_company_tasks(state)
+    if not tasks:
+        return {}
+    
+    logger.info(f"Pipelining {len(tasks)} companies")
+    finished = get_company_pipeline().run(tasks)
+    errors = []
+    for company_state in finished:
+        cancel_speculative_fetch(company_state)
+        errors.extend(company_state.get("errors") or [])
+    return {"companies_processed": len(finished), "errors": errors}
+
+def create_workflow_graph(mode: str = EXECUTION_MODE, checkpointer=None, order: str = PIPELINE_ORDER) -> StateGraph:
+    """Create and configure the LangGraph workflow.
+
+    ``mode`` is "sequential" (one company at a time through the select_company
+    loop), "fan_out" (one per-company subgraph run per URL, bounded by the
+    ``max_concurrency`` passed to ``invoke``) or "pipelined" (the companies of
+    a page pass through the stages of get_company_pipeline, which is built
+    with PIPELINE_ORDER). ``order`` picks the per-company
+    topology (see add_company_pipeline). With a ``checkpointer`` every
+    superstep is persisted and the run can be resumed by its thread id; the
+    graph then also stops before each company in sequential mode and before
+    each page of leads otherwise (see run_workflow).
+    """
+    if order not in ("fetch_first", "contacts_first"):
+        raise ValueError(f"Unknown pipeline order: {order}")
+    stops = None
+    if checkpointer:
+        stops = ["select_company"] if mode == "sequential" else ["read_leads"]
+
+    if mode == "fan_out":
+        workflow = StateGraph(CampaignState)
+        add_node(workflow, "initialize", initialize_workflow)
+        add_node(workflow, "read_leads", read_leads)
+        add_node(workflow, "process_company", make_process_company(create_company_graph(order)))
+        
+        # One page per superstep: dispatch it, then read the next one (already
+        # prefetched in the background) once the page's companies are done
+        workflow.set_entry_point("initialize")
+        workflow.add_edge("initialize", "read_leads")
+        workflow.add_conditional_edges("read_leads", dispatch_companies, ["process_company", "read_leads", END])
+        workflow.add_edge("process_company", "read_leads")
+        
+        return workflow.compile(checkpointer=checkpointer, interrupt_before=stops)
+    
+    if mode == "pipelined":
+        workflow = StateGraph(CampaignState)
+        add_node(workflow, "initialize", initialize_workflow)
+        add_node(workflow, "read_leads", read_leads)
+        add_node(workflow, "process_page", process_page)
+        
+        # One page per superstep, like fan-out; within the page the stages overlap
+        workflow.set_entry_point("initialize")
+        workflow.add_edge("initialize", "read_leads")
+        workflow.add_conditional_edges("read_leads", route_page, ["process_page", "read_leads", END])
+        workflow.add_edge("process_page", "read_leads")
+        
+        return workflow.compile(checkpointer=checkpointer, interrupt_before=stops)
+    
+    if mode != "sequential":
+        raise ValueError(f"Unknown execution mode: {mode}")
     
     # Initialize the graph with our state schema
     workflow = StateGraph(WorkflowState)
     
-    # Add all nodes
-    workflow.add_node("initialize", initialize_workflow)
-    workflow.add_node("read_sheets", read_google_sheets)
-    workflow.add_node("select_company", select_next_company)
-    workflow.add_node("fetch_website", fetch_website)
-    workflow.add_node("extract_text", extract_text_content)
-    workflow.add_node("summarize", summarize_company)
-    workflow.add_node("find_contacts", find_contacts)
-    workflow.add_node("prepare_update", prepare_update_data)
-    workflow.add_node("generate_body", generate_email_body)
-    workflow.add_node("generate_subject", generate_email_subject)
-    workflow.add_node("create_draft", create_gmail_draft)
-    workflow.add_node("update_success", update_success_log)
-    workflow.add_node("log_failure", log_failed_lookup)
-    workflow.add_node("increment", increment_index)
+    # Add the controller nodes; the per-company nodes come from add_company_pipeline
+    add_node(workflow, "initialize", initialize_workflow)
+    add_node(workflow, "read_leads", read_leads)
+    add_node(workflow, "select_company", select_next_company)
+    add_node(workflow, "increment", increment_index)
+    entry = add_company_pipeline(workflow, "increment", order)
     
     # Set the entry point
     workflow.set_entry_point("initialize")
     
     # Add edges for the main flow
-    workflow.add_edge("initialize", "read_sheets")
-    workflow.add_edge("read_sheets", "select_company")
+    workflow.add_edge("initialize", "read_leads")
+    workflow.add_edge("read_leads", "select_company")
     
-    # Conditional edge: check if we should continue processing
+    # Conditional edge: process the company, read the next page, or stop
     workflow.add_conditional_edges(
         "select_company",
         should_continue_processing,
         {
-            "continue": "fetch_website",
+            "continue": entry,
+            "next_page": "read_leads",
             "end": END
         }
     )
     
-    # Main processing pipeline for each company
-    workflow.add_edge("fetch_website", "extract_text")
-    workflow.add_edge("extract_text", "summarize")
-    workflow.add_edge("summarize", "find_contacts")
+    # Loop back to select next company
+    workflow.add_edge("increment", "select_company")
     
-    # Conditional edge: check if emails were found (If node)
-    workflow.add_conditional_edges(
-        "find_contacts",
-        check_emails_found,
-        {
-            "success": "prepare_update",
-            "failure": "log_failure"
-        }
+    return workflow.compile(checkpointer=checkpointer, interrupt_before=stops)
+
+def run_recursion_limit(app) -> int:
+    """Recursion limit of one invoke of ``app``, built by create_workflow_graph with a checkpointer.
+
+    Between two stops every node runs at most once: a sequential run handles
+    one company, fan-out and pipelined runs handle a page in one superstep.
+    """
+    return len(app.nodes) + RUN_STEPS_SLACK
+
+def run_workflow(app, state: Optional[Dict[str, Any]], config: Dict[str, Any]) -> Dict[str, Any]:
+    """Invoke checkpointed ``app`` until it reaches END; returns the final state.
+
+    The graph stops between companies (sequential) or pages (see
+    create_workflow_graph), so ``config``'s recursion limit applies to one
+    company or page rather than to the whole run. At every stop all but the
+    thread's latest checkpoint are deleted, which keeps the checkpoint
+    database at a few checkpoints however long the run. ``state`` is None to
+    continue from the thread's last checkpoint.
+    """
+    thread_id = config["configurable"]["thread_id"]
+    while True:
+        result = app.invoke(state, config)
+        prune_checkpoints(app.checkpointer, thread_id)
+        if not app.get_state(config).next:
+            return result
+        state = None
+
+# ============================================================================
+# DISTRIBUTED EXECUTION
+# ============================================================================
+
+_work_queue: Optional[WorkQueue] = None
+
+def open_campaign_queue(spec: str, run_id: str) -> WorkQueue:
+    """Open the shared work queue of campaign ``run_id`` for this process"""
+    global _work_queue
+    _work_queue = open_work_queue(spec, run_id, WORK_QUEUE_MAX_ATTEMPTS)
+    return _work_queue
+
+def get_work_queue() -> WorkQueue:
+    """The work queue opened by open_campaign_queue"""
+    if _work_queue is None:
+        raise RuntimeError("No work queue is open; run with --coordinator or --worker")
+    return _work_queue
+
+def enqueue_campaign(work_queue: WorkQueue, lead_source: Optional[str]) -> int:
+    """Queue one item per registrable domain of the lead source, then seal the campaign.
+
+    The whole source is grouped before anything is queued, so all lead rows
+    of a domain end up in its one item however far apart they are. Running
+    it again for the same campaign only adds what is missing.
+    """
+    source = open_lead_source(lead_source or LEAD_SOURCE)
+    urls = [url for page in source.pages(LEAD_PAGE_SIZE) for url in page.urls]
+    groups = group_by_domain(urls)
+    added = work_queue.enqueue(
+        (group.url, {"index": index, "lead_rows": group.rows if group.rows != [group.url] else []})
+        for index, group in enumerate(groups)
     )
+    work_queue.seal()
+    logger.info(f"Queued {added} companies for {len(urls)} lead rows "
+                f"({len(groups) - added} were already queued)")
+    return added
+
+def run_coordinator(run_id: str, spec: str, lead_source: Optional[str]) -> None:
+    """Queue the campaign's leads and wait until the workers have acknowledged every company"""
+    work_queue = open_campaign_queue(spec, run_id)
+    enqueue_campaign(work_queue, lead_source)
+    logger.info(f"Waiting for workers (start them with --worker --run-id {run_id})")
     
-    # Success path: generate email and update logs
-    workflow.add_edge("prepare_update", "generate_body")
-    workflow.add_edge("generate_body", "generate_subject")
-    workflow.add_edge("generate_subject", "create_draft")
-    workflow.add_edge("create_draft", "update_success")
-    workflow.add_edge("update_success", "increment")
-    
-    # Failure path: log and continue
-    workflow.add_edge("log_failure", "increment")
+    last_report = 0.0
+    while not work_queue.drained():
+        if time.monotonic() - last_report >= 30:
+            counts = work_queue.counts()
+            logger.info(f"Campaign {run_id}: {counts['queued']} companies queued or in progress, "
+                        f"{counts['done']} done, {counts['dead']} dead-lettered")
+            last_report = time.monotonic()
+        time.sleep(WORK_QUEUE_POLL_SECONDS)
     
-    # Loop back to select next company
-    workflow.add_edge("increment", "select_company")
+    results = work_queue.results()
+    succeeded = sum(1 for result in results.values() if result.get("status") == SUCCEEDED)
+    drafts = sum(1 for result in results.values() if result.get("draft_id"))
+    errors = [error for result in results.values() for error in result.get("errors") or []]
+    logger.info("=== Campaign Completed ===")
+    logger.info(f"Total companies processed: {len(results)} ({succeeded} with contacts, {drafts} drafts); "
+                f"{work_queue.counts()['dead']} dead-lettered after {WORK_QUEUE_MAX_ATTEMPTS} attempts")
+    if errors:
+        logger.warning(f"Errors encountered: {errors}")
+
+def make_queue_handler(company_app, run_id: str):
+    """Build the run_worker handler that runs a leased company through ``company_app``"""
+    def handle(lease: Lease) -> Dict[str, Any]:
+        url = lease.key
+        rows = lease.payload.get("lead_rows") or []
+        task = {
+            "current_company_url": url,
+            "current_index": lease.payload.get("index", 0),
+            "run_id": run_id,
+            "lead_rows": {url: rows} if rows else {}
+        }
+        logger.info(f"Processing company {task['current_index'] + 1}: {url} (attempt {lease.attempt})")
+        company_state = {**new_company_state(task), "lease_token": lease.token}
+        try:
+            result = company_app.invoke(company_state)
+        finally:
+            cancel_speculative_fetch(company_state)
+        
+        # Acknowledged to the queue, where the coordinator collects it
+        return {
+            "status": SUCCEEDED if result.get("success_logged") else FAILED,
+            "draft_id": result.get("draft_id"),
+            "errors": result.get("errors", [])
+        }
     
-    return workflow.compile()
+    return handle
+
+def run_queue_worker(run_id: str, spec: str) -> None:
+    """Process companies from the campaign's work queue until it is drained"""
+    work_queue = open_campaign_queue(spec, run_id)
+    handle = make_queue_handler(create_company_graph(PIPELINE_ORDER), run_id)
+    try:
+        totals = run_worker(
+            work_queue,
+            handle,
+            threads=MAX_CONCURRENT_COMPANIES,
+            visibility_timeout=WORK_QUEUE_VISIBILITY_SECONDS,
+            poll_interval=WORK_QUEUE_POLL_SECONDS
+        )
+        logger.info("=== Worker Finished ===")
+        logger.info(f"Companies acknowledged: {totals['acked']}, failed and handed back: {totals['failed']}, "
+                    f"lost to an expired lease: {totals['lost']}")
+        log_backend_summary()
+    except Exception as e:
+        logger.error(f"Worker failed: {e}")
+        raise
+    finally:
+        close_run()
 
 # ============================================================================
 # MAIN EXECUTION
 # ============================================================================
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Command line options"""
+    parser = argparse.ArgumentParser(description="Automated outbound sales email campaign")
+    parser.add_argument("--run-id", help="id for a new run (generated when omitted)")
+    parser.add_argument("--resume", metavar="RUN_ID",
+                        help="continue an interrupted run from its last checkpoint")
+    parser.add_argument("--leads", metavar="PATH",
+                        help="CSV, JSONL or Parquet file of company URLs (default: LEAD_SOURCE)")
+    role = parser.add_mutually_exclusive_group()
+    role.add_argument("--coordinator", action="store_true",
+                      help="queue the leads for --worker processes and wait until they are done")
+    role.add_argument("--worker", action="store_true",
+                      help="process companies from the work queue of the campaign given by --run-id")
+    parser.add_argument("--queue", metavar="SPEC", default=WORK_QUEUE,
+                        help="shared work queue: SQLite file or redis:// URL (default: WORK_QUEUE)")
+    return parser.parse_args(argv)
+
+def log_backend_summary() -> None:
+    """Log rate limit budgets, concurrency limits, breaker states and per-node timings"""
+    for backend, budget in RATE_LIMITERS.snapshot().items():
+        logger.info(f"Rate limit budget {backend}: {budget}")
+    if ADAPTIVE_CONCURRENCY:
+        for backend, limits in CONCURRENCY_LIMITERS.snapshot().items():
+            logger.info(f"Concurrency limit {backend}: {limits}")
+    for backend, breaker in CIRCUIT_BREAKERS.snapshot().items():
+        logger.info(f"Circuit breaker {backend}: {breaker}")
+    
+    logger.info("Per-node summary:\n" + get_instrumentation().summary_table())
+    prompt_tokens, cached_tokens = get_instrumentation().totals(PROMPT_TOKENS, CACHED_PROMPT_TOKENS)
+    if prompt_tokens:
+        logger.info(f"OpenAI prompt tokens: {prompt_tokens:g}, served from the provider's prompt cache: "
+                    f"{cached_tokens:g} ({cached_tokens / prompt_tokens:.0%})")
+
+def close_run() -> None:
+    """Send queued drafts and log rows, and write out the run's metrics"""
+    close_gmail_draft_batcher()
+    close_sheets_log_buffer()
+    if METRICS_PROMETHEUS_PATH:
+        get_instrumentation().write_prometheus(
+            METRICS_PROMETHEUS_PATH,
+            extra=(CONCURRENCY_LIMITERS.prometheus_text() if ADAPTIVE_CONCURRENCY else "")
+            + CIRCUIT_BREAKERS.prometheus_text()
+        )
+    get_instrumentation().close()
+
+def restart_company_deadline(app, config: Dict[str, Any], snapshot) -> None:
+    """Give the company a resumed sequential run was in the middle of a new deadline.
+
+    The checkpointed deadline is a timestamp, so the time the run was down
+    would otherwise count against it and the company would fail right away.
+    """
+    values = snapshot.values
+    if values.get("deadline") is None or values.get("deadline_exceeded"):
+        return
+    if any(node in ("select_company", "read_leads") for node in snapshot.next):
+        return  # Stopped between companies, none in flight
+    app.update_state(config, {"deadline": company_deadline()})
+
+def main(argv: Optional[List[str]] = None):
     """Main execution function"""
+    args = parse_args(argv)
     logger.info("=== Starting Automated Outbound Sales Workflow ===")
     
+    if args.coordinator:
+        # Only reads leads; the workers need the API keys
+        run_id = args.run_id or uuid.uuid4().hex[:12]
+        logger.info(f"Campaign id: {run_id}")
+        run_coordinator(run_id, args.queue, args.leads)
+        return
+    
     # Validate configuration
     if not OPENAI_API_KEY:
         logger.error("OPENAI_API_KEY not set")
@@ -764,46 +2216,108 @@ def main():
         logger.error("HUNTER_API_KEY not set")
         return
     
-    # Create the workflow
-    app = create_workflow_graph()
-    
-    # Initialize state
-    initial_state = WorkflowState(
-        company_urls=[],
-        current_index=0,
-        current_company_url=None,
-        html_content=None,
-        text_content=None,
-        company_summary=None,
-        company_domain=None,
-        hunter_results=None,
-        contact_emails=[],
-        organization_name=None,
-        email_body=None,
-        email_subject=None,
-        target_email=None,
-        emails_found=False,
-        processing_complete=False,
-        success_logged=False,
-        failure_logged=False,
-        errors=[],
-        draft_id=None
-    )
+    if args.worker:
+        if not args.run_id:
+            logger.error("--worker needs the --run-id of the campaign")
+            return
+        run_queue_worker(args.run_id, args.queue)
+        return
+    
+    run_id = args.resume or args.run_id or uuid.uuid4().hex[:12]
+    logger.info(f"Run id: {run_id} (continue after a crash with --resume {run_id})")
+    
+    # Create the workflow; every superstep is checkpointed under the run id
+    # (in memory and never pruned, without langgraph-checkpoint-sqlite)
+    checkpointer = open_checkpointer(CHECKPOINT_DB_PATH, allowed_types=[(Contact.__module__, "Contact")])
+    app = create_workflow_graph(EXECUTION_MODE, checkpointer=checkpointer or MemorySaver())
+    # Leads are streamed, so the run length is unknown up front; the run is
+    # invoked a company or page at a time and the limit guards one of those
+    config = {
+        "recursion_limit": run_recursion_limit(app),
+        "configurable": {"thread_id": run_id}
+    }
+    
+    if EXECUTION_MODE in ("fan_out", "pipelined"):
+        initial_state = CampaignState(
+            run_id=run_id,
+            lead_source=args.leads,
+            leads_offset=0,
+            company_urls=[],
+            lead_rows={},
+            current_index=0,
+            processing_complete=False,
+            companies_processed=0,
+            errors=[]
+        )
+        # Each page of companies runs as the tasks of a single superstep
+        if EXECUTION_MODE == "fan_out":
+            config["max_concurrency"] = MAX_CONCURRENT_COMPANIES
+    else:
+        # Initialize state
+        initial_state = WorkflowState(
+            run_id=run_id,
+            lead_source=args.leads,
+            leads_offset=0,
+            company_urls=[],
+            lead_rows={},
+            current_index=0,
+            current_company_url=None,
+            companies_processed=0,
+            html_content=None,
+            html_encoding=None,
+            text_content=None,
+            company_summary=None,
+            company_domain=None,
+            contact_emails=[],
+            organization_name=None,
+            email_body=None,
+            email_subject=None,
+            target_email=None,
+            emails_found=False,
+            processing_complete=False,
+            success_logged=False,
+            failure_logged=False,
+            errors=[],
+            draft_id=None,
+            deadline=None,
+            deadline_exceeded=False,
+            lease_token=None
+        )
+    
+    if args.resume and checkpointer is not None:
+        snapshot = app.get_state(config)
+        if snapshot.values and not snapshot.next:
+            logger.info(f"Run {run_id} already completed, nothing to resume")
+            return
+        if snapshot.next:
+            logger.info(f"Resuming run {run_id} at {', '.join(snapshot.next)}")
+            restart_company_deadline(app, config, snapshot)
+            initial_state = None  # Continue from the last checkpoint
+        else:
+            logger.info(f"No checkpoint for run {run_id}; starting it, skipping companies in its ledger")
     
     # Run the workflow
     try:
-        result = app.invoke(initial_state,{"recursion_limit": 100})
+        result = run_workflow(app, initial_state, config)
         
         # Log summary
         logger.info("=== Workflow Completed ===")
-        logger.info(f"Total companies processed: {result.get('current_index', 0)}")
+        processed = result.get('companies_processed', 0)
+        logger.info(f"Total companies processed: {processed}")
         
         if result.get('errors'):
-            logger.warning(f"Errors encountered: {result['errors']}")
+            logger.warning(f"Errors encountered (last {MAX_STATE_ERRORS} at most): {result['errors']}")
+        
+        if EXECUTION_MODE == "pipelined":
+            for stage, stats in get_company_pipeline().snapshot().items():
+                logger.info(f"Pipeline stage {stage}: {stats}")
+        log_backend_summary()
         
     except Exception as e:
         logger.error(f"Workflow execution failed: {e}")
         raise
+    finally:
+        close_run()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
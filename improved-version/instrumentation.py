@@ -0,0 +1,240 @@
+"""
+Per-node instrumentation
+
+Instrumentation.wrap times every call of a graph node as a span tagged with a
+per-company correlation id. While a node runs, helpers it calls can add to
+the span with ``record`` (retries, bytes downloaded, tokens used). Finished
+spans are folded into per-node aggregates that can be exported in the
+Prometheus text format or printed as a summary table, and are optionally
+appended to a JSON Lines file of OpenTelemetry-style spans.
+"""
+
+import bisect
+import contextvars
+import functools
+import hashlib
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+# Upper bounds (seconds) of the node duration histogram buckets
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Counters a node (or anything it calls) may add to with ``record``
+RETRIES = "retries"
+BYTES_DOWNLOADED = "bytes_downloaded"
+PROMPT_TOKENS = "prompt_tokens"
+COMPLETION_TOKENS = "completion_tokens"
+CACHED_PROMPT_TOKENS = "cached_prompt_tokens"  # Prompt tokens served from the provider's prefix cache
+COUNTERS = (RETRIES, BYTES_DOWNLOADED, PROMPT_TOKENS, COMPLETION_TOKENS, CACHED_PROMPT_TOKENS)
+
+# ============================================================================
+# SPANS
+# ============================================================================
+
+def correlation_id(run_id: Optional[str], company_url: Optional[str]) -> str:
+    """Stable 32-hex id for one company in one run (or for the run itself without a URL)"""
+    key = f"{run_id or ''}|{company_url or ''}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+@dataclass
+class Span:
+    """One node call"""
+    name: str
+    correlation_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: int = 0
+    error: bool = False
+    counters: Dict[str, float] = field(default_factory=dict)
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def seconds(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_otel(self) -> Dict[str, Any]:
+        """The span in the shape of an OTLP/JSON span"""
+        attributes = {**self.attributes, **{f"outbound.{name}": value for name, value in self.counters.items()}}
+        return {
+            "traceId": self.correlation_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "startTimeUnixNano": self.start_ns,
+            "endTimeUnixNano": self.end_ns,
+            "attributes": [{"key": key, "value": value} for key, value in attributes.items()],
+            "status": {"code": "STATUS_CODE_ERROR" if self.error else "STATUS_CODE_OK"},
+        }
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+def record(counter: str, value: float = 1) -> None:
+    """Add ``value`` to a counter of the node span running in this context (no-op outside one)"""
+    span = _current_span.get()
+    if span is not None:
+        span.counters[counter] = span.counters.get(counter, 0) + value
+
+# ============================================================================
+# AGGREGATES
+# ============================================================================
+
+class NodeStats:
+    """Totals and a duration histogram for one node"""
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)  # Last bucket is +Inf
+        self.counters: Dict[str, float] = {}
+
+    def add(self, span: Span) -> None:
+        seconds = span.seconds
+        self.calls += 1
+        self.errors += span.error
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.buckets[bisect.bisect_left(DURATION_BUCKETS, seconds)] += 1
+        for name, value in span.counters.items():
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the histogram bucket holding the ``q`` quantile"""
+        target = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target and count:
+                return DURATION_BUCKETS[index] if index < len(DURATION_BUCKETS) else self.max_seconds
+        return self.max_seconds
+
+# ============================================================================
+# INSTRUMENTATION
+# ============================================================================
+
+class Instrumentation:
+    """Wraps graph nodes, aggregates their spans and exports the results.
+
+    With ``span_path`` every finished span is appended to that file as one
+    JSON object per line.
+    """
+
+    def __init__(self, span_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._stats: Dict[str, NodeStats] = {}
+        self._span_path = span_path
+        self._span_file = open(span_path, "a", encoding="utf-8") if span_path else None  # Guarded by _lock
+
+    def wrap(self, name: str, fn: Callable) -> Callable:
+        """``fn`` as a node that records a span per call"""
+        @functools.wraps(fn)
+        def instrumented(state, *args, **kwargs):
+            parent = _current_span.get()
+            span = Span(
+                name=name,
+                correlation_id=correlation_id(state.get("run_id"), state.get("current_company_url")),
+                span_id=os.urandom(8).hex(),
+                parent_id=parent.span_id if parent else None,
+                start_ns=time.time_ns(),
+            )
+            token = _current_span.set(span)
+            try:
+                result = fn(state, *args, **kwargs)
+                span.error = bool(isinstance(result, dict) and result.get("errors"))
+                return result
+            except BaseException:
+                span.error = True
+                raise
+            finally:
+                span.end_ns = time.time_ns()
+                _current_span.reset(token)
+                if state.get("current_company_url"):
+                    span.attributes["company.url"] = state["current_company_url"]
+                self._finish(span)
+        return instrumented
+
+    def _finish(self, span: Span) -> None:
+        # Serialized outside the lock; spans finishing after close() are only counted
+        line = json.dumps(span.to_otel()) + "\n" if self._span_path else None
+        with self._lock:
+            self._stats.setdefault(span.name, NodeStats()).add(span)
+            if line and self._span_file:
+                self._span_file.write(line)
+
+    def stats(self) -> Dict[str, NodeStats]:
+        with self._lock:
+            return dict(self._stats)
+
+    def totals(self, *counters: str) -> Tuple[float, ...]:
+        """Sum of each counter over all nodes"""
+        stats = self.stats().values()
+        return tuple(sum(s.counters.get(counter, 0) for s in stats) for counter in counters)
+
+    def prometheus_text(self, prefix: str = "outbound") -> str:
+        """All node metrics in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_node_duration_seconds Wall time of graph node calls",
+            f"# TYPE {prefix}_node_duration_seconds histogram",
+        ]
+        stats = self.stats()
+        for node, node_stats in sorted(stats.items()):
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + (float("inf"),), node_stats.buckets):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_node_duration_seconds_bucket{{node="{node}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_node_duration_seconds_sum{{node="{node}"}} {node_stats.seconds:.6f}')
+            lines.append(f'{prefix}_node_duration_seconds_count{{node="{node}"}} {node_stats.calls}')
+
+        lines += [
+            f"# HELP {prefix}_node_errors_total Graph node calls that raised or reported an error",
+            f"# TYPE {prefix}_node_errors_total counter",
+        ]
+        lines += [f'{prefix}_node_errors_total{{node="{node}"}} {s.errors}' for node, s in sorted(stats.items())]
+
+        for counter in COUNTERS:
+            lines += [
+                f"# HELP {prefix}_node_{counter}_total {counter.replace('_', ' ').capitalize()} recorded by graph nodes",
+                f"# TYPE {prefix}_node_{counter}_total counter",
+            ]
+            lines += [
+                f'{prefix}_node_{counter}_total{{node="{node}"}} {s.counters.get(counter, 0):g}'
+                for node, s in sorted(stats.items())
+            ]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str, extra: str = "") -> None:
+        """Write the metrics, followed by ``extra`` exposition text, atomically
+        (e.g. for the node_exporter textfile collector)"""
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.prometheus_text() + extra)
+        os.replace(tmp_path, path)
+
+    def summary_table(self) -> str:
+        """Per-node table of calls, errors, latency and recorded counters"""
+        header = (f"{'node':<24}{'calls':>7}{'errors':>7}{'total s':>9}{'mean ms':>9}{'p95 ms':>9}"
+                  f"{'retries':>8}{'KiB':>9}{'tokens':>9}{'cached':>8}")
+        rows = [header, "-" * len(header)]
+        for node, s in sorted(self.stats().items(), key=lambda item: -item[1].seconds):
+            prompt_tokens = s.counters.get(PROMPT_TOKENS, 0)
+            tokens = prompt_tokens + s.counters.get(COMPLETION_TOKENS, 0)
+            cached = f"{s.counters.get(CACHED_PROMPT_TOKENS, 0) / prompt_tokens:.0%}" if prompt_tokens else "-"
+            rows.append(
+                f"{node:<24}{s.calls:>7}{s.errors:>7}{s.seconds:>9.1f}{s.seconds / s.calls * 1000:>9.1f}"
+                f"{s.quantile(0.95) * 1000:>9.0f}{s.counters.get(RETRIES, 0):>8g}"
+                f"{s.counters.get(BYTES_DOWNLOADED, 0) / 1024:>9.0f}{tokens:>9g}{cached:>8}"
+            )
+        return "\n".join(rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._span_file:
+                self._span_file.close()
+                self._span_file = None
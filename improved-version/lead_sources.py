@@ -0,0 +1,205 @@
+"""
+Paged lead sources
+
+A lead source yields company URLs in pages instead of materializing the whole
+list up front. Google Sheets is read in row ranges; CSV, JSONL and Parquet
+files are streamed from disk. PrefetchingLeadReader loads the next pages on
+a background thread while the workflow processes the current one.
+"""
+
+import csv
+import json
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+@dataclass
+class LeadPage:
+    """One page of company URLs"""
+    urls: List[str]
+    next_offset: int  # Source rows consumed after this page; resume point
+
+def parse_lead_url(value: Any) -> Optional[str]:
+    """The company URL in a cell, or None for blanks, headers and non-URLs"""
+    if value is None:
+        return None
+    url = str(value).strip()
+    # Skip if it looks like a header
+    if not url or url.lower().startswith('company') or not url.startswith('http'):
+        return None
+    return url
+
+# ============================================================================
+# SOURCES
+# ============================================================================
+
+class LeadSource:
+    """Base class: ``pages`` yields LeadPages of at most ``page_size`` source rows"""
+
+    def pages(self, page_size: int, start_offset: int = 0) -> Iterator[LeadPage]:
+        raise NotImplementedError
+
+    def _paginate(self, values: Iterator[Any], page_size: int, start_offset: int) -> Iterator[LeadPage]:
+        """Group raw cell values into pages, skipping the first ``start_offset`` rows"""
+        offset = 0
+        urls: List[str] = []
+        rows_in_page = 0
+        for value in values:
+            offset += 1
+            if offset <= start_offset:
+                continue
+            url = parse_lead_url(value)
+            if url:
+                urls.append(url)
+            rows_in_page += 1
+            if rows_in_page == page_size:
+                yield LeadPage(urls, offset)
+                urls, rows_in_page = [], 0
+        if rows_in_page:
+            yield LeadPage(urls, offset)
+
+class GoogleSheetsLeadSource(LeadSource):
+    """Reads one column of a sheet in row ranges of ``page_size``.
+
+    ``read_range`` takes an A1 range and returns the ``values`` rows.
+    ``row_count`` returns the number of rows of a sheet, blank ones included;
+    ranges are read up to it, so blank rows between leads don't end the
+    list. Without it (or when it returns None) reading stops at the first
+    range that comes back empty.
+    """
+
+    def __init__(self, read_range: Callable[[str], List[List[Any]]], sheet: str = "Sheet1", column: str = "A",
+                 row_count: Optional[Callable[[str], Optional[int]]] = None):
+        self.read_range = read_range
+        self.sheet = sheet
+        self.column = column
+        self.row_count = row_count
+
+    def pages(self, page_size: int, start_offset: int = 0) -> Iterator[LeadPage]:
+        total = self.row_count(self.sheet) if self.row_count else None
+        offset = start_offset
+        while total is None or offset < total:
+            range_name = f"{self.sheet}!{self.column}{offset + 1}:{self.column}{offset + page_size}"
+            rows = self.read_range(range_name)
+            offset += page_size
+            if not rows:
+                if total is None:
+                    return
+                continue  # Blank rows; there are more rows below
+            urls = [url for url in (parse_lead_url(row[0]) for row in rows if row) if url]
+            yield LeadPage(urls, offset)
+
+class CSVLeadSource(LeadSource):
+    """Streams one column of a CSV file, chosen by header name or 0-based index"""
+
+    def __init__(self, path: str, column: Union[str, int] = 0):
+        self.path = path
+        self.column = column
+
+    def _values(self) -> Iterator[Any]:
+        with open(self.path, newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            index = self.column
+            if isinstance(self.column, str):
+                header = next(reader, [])
+                index = header.index(self.column)
+            for row in reader:
+                yield row[index] if index < len(row) else None
+
+    def pages(self, page_size: int, start_offset: int = 0) -> Iterator[LeadPage]:
+        return self._paginate(self._values(), page_size, start_offset)
+
+class JSONLLeadSource(LeadSource):
+    """Streams the ``field`` of every JSON object in a JSON Lines file"""
+
+    def __init__(self, path: str, field: str = "url"):
+        self.path = path
+        self.field = field
+
+    def _values(self) -> Iterator[Any]:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    yield None
+                    continue
+                try:
+                    yield json.loads(line).get(self.field)
+                except (ValueError, AttributeError):
+                    logger.warning(f"Skipping malformed JSONL line in {self.path}")
+                    yield None
+
+    def pages(self, page_size: int, start_offset: int = 0) -> Iterator[LeadPage]:
+        return self._paginate(self._values(), page_size, start_offset)
+
+class ParquetLeadSource(LeadSource):
+    """Streams one column of a Parquet file in record batches (needs pyarrow)"""
+
+    def __init__(self, path: str, column: str = "url"):
+        self.path = path
+        self.column = column
+
+    def _values(self, batch_size: int) -> Iterator[Any]:
+        try:
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError("Reading Parquet leads requires pyarrow") from e
+        for batch in pq.ParquetFile(self.path).iter_batches(batch_size=batch_size, columns=[self.column]):
+            yield from batch.column(0).to_pylist()
+
+    def pages(self, page_size: int, start_offset: int = 0) -> Iterator[LeadPage]:
+        return self._paginate(self._values(page_size), page_size, start_offset)
+
+def open_file_lead_source(path: str) -> LeadSource:
+    """Pick a file lead source by extension (.csv, .jsonl/.ndjson, .parquet)"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".csv":
+        return CSVLeadSource(path)
+    if extension in (".jsonl", ".ndjson"):
+        return JSONLLeadSource(path)
+    if extension == ".parquet":
+        return ParquetLeadSource(path)
+    raise ValueError(f"Unsupported lead file type: {path}")
+
+# ============================================================================
+# PREFETCHING READER
+# ============================================================================
+
+_END = object()
+
+class PrefetchingLeadReader:
+    """Reads pages from a LeadSource on a background thread, ``prefetch`` pages ahead"""
+
+    def __init__(self, source: LeadSource, page_size: int, start_offset: int = 0, prefetch: int = 2):
+        self._pages: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, prefetch))
+        self._thread = threading.Thread(
+            target=self._run, args=(source, page_size, start_offset), name="lead-prefetch", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, source: LeadSource, page_size: int, start_offset: int) -> None:
+        try:
+            for page in source.pages(page_size, start_offset):
+                self._pages.put(page)
+        except Exception as e:
+            self._pages.put(e)
+        self._pages.put(_END)
+
+    def next_page(self) -> Optional[LeadPage]:
+        """The next page, or None once the source is exhausted; re-raises source errors"""
+        item = self._pages.get()
+        if item is _END:
+            self._pages.put(_END)  # Keep answering None on later calls
+            return None
+        if isinstance(item, Exception):
+            raise item
+        return item
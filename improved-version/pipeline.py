@@ -0,0 +1,209 @@
+"""
+Staged pipeline execution
+
+A StagedPipeline runs items through a fixed sequence of stages (for a
+company: fetch, summarize, contact lookup, email generation, drafting and
+logging), each with its own worker threads and a bounded input queue. While
+one company is being summarized the next one is already being fetched, so
+the network, OpenAI and the APIs are all kept busy, and in steady state
+throughput approaches that of the slowest stage.
+
+A worker blocks while the queue of the stage it hands an item to is full, so
+a slow stage holds back the stages before it (backpressure) instead of
+letting work pile up in memory. Items only ever move forward, which is what
+keeps full queues from deadlocking.
+"""
+
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Returned by a stage function when the item needs no further stages
+DONE = "__done__"
+
+_STOP = object()
+
+def parse_stage_workers(spec: str) -> Dict[str, int]:
+    """Parse worker counts given as ``"fetch=8,summarize=4"``"""
+    workers = {}
+    for part in spec.split(","):
+        if not part.strip():
+            continue
+        name, _, count = part.partition("=")
+        try:
+            workers[name.strip()] = int(count)
+        except ValueError:
+            raise ValueError(f"Invalid stage worker count: {part.strip()!r}") from None
+    return workers
+
+@dataclass
+class Stage:
+    """One step of a pipeline.
+
+    ``fn`` handles an item and returns the name of a later stage to send it
+    to, None for the next stage, or DONE. ``queue_size`` bounds the items
+    waiting for the stage (0: twice its workers).
+    """
+    name: str
+    fn: Callable[[Any], Optional[str]]
+    workers: int = 1
+    queue_size: int = 0
+
+class StagedPipeline:
+    """Thread-per-worker pipeline of stages connected by bounded queues.
+
+    Exceptions raised by a stage function are passed to ``on_error`` (item,
+    stage name, exception) and end that item's run. Anything else a stage
+    raises (e.g. KeyboardInterrupt) stops the current run: no more items are
+    fed, and once those in flight are done ``run`` re-raises it.
+    """
+
+    def __init__(self, stages: List[Stage], on_error: Optional[Callable[[Any, str, Exception], None]] = None):
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.on_error = on_error
+        self._index: Dict[str, int] = {}
+        self._queues: Dict[str, "queue.Queue[Any]"] = {}
+        self._stats: Dict[str, Dict[str, float]] = {}
+        for index, stage in enumerate(stages):
+            if stage.name in self._index:
+                raise ValueError(f"Duplicate pipeline stage: {stage.name}")
+            if stage.workers < 1:
+                raise ValueError(f"Pipeline stage {stage.name} needs at least one worker")
+            self._index[stage.name] = index
+            self._queues[stage.name] = queue.Queue(maxsize=stage.queue_size or 2 * stage.workers)
+            self._stats[stage.name] = {"processed": 0, "busy_seconds": 0.0, "blocked_seconds": 0.0, "max_queued": 0}
+        self._threads: List[threading.Thread] = []
+        self._condition = threading.Condition()
+        self._pending = 0
+        self._finished: List[Any] = []
+        self._fatal: Optional[BaseException] = None
+        self._started_at: Optional[float] = None
+        self._closed = False
+
+    def _start(self) -> None:
+        if self._threads:
+            return
+        self._started_at = time.monotonic()
+        for stage in self.stages:
+            for number in range(stage.workers):
+                thread = threading.Thread(target=self._work, args=(stage,), name=f"stage-{stage.name}-{number}",
+                                          daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _put(self, name: str, item: Any) -> float:
+        """Queue ``item`` for stage ``name``, blocking while it is full; returns seconds blocked"""
+        stage_queue = self._queues[name]
+        started = time.monotonic()
+        stage_queue.put(item)
+        with self._condition:
+            stats = self._stats[name]
+            stats["max_queued"] = max(stats["max_queued"], stage_queue.qsize())
+        return time.monotonic() - started
+
+    def _finish(self, item: Any) -> None:
+        with self._condition:
+            self._finished.append(item)
+            self._pending -= 1
+            self._condition.notify_all()
+
+    def _work(self, stage: Stage) -> None:
+        stage_queue = self._queues[stage.name]
+        index = self._index[stage.name]
+        while True:
+            item = stage_queue.get()
+            if item is _STOP:
+                return
+            started = time.monotonic()
+            try:
+                target = stage.fn(item)
+                if target is None:
+                    target = self.stages[index + 1].name if index + 1 < len(self.stages) else DONE
+                elif target != DONE and self._index.get(target, -1) <= index:
+                    raise ValueError(f"Stage {stage.name} can't hand an item to {target}")
+            except Exception as e:
+                logger.error(f"Pipeline stage {stage.name} failed: {e}")
+                if self.on_error:
+                    self.on_error(item, stage.name, e)
+                target = DONE
+            except BaseException as e:
+                with self._condition:
+                    self._fatal = self._fatal or e
+                target = DONE
+            busy = time.monotonic() - started
+            blocked = 0.0
+            if target == DONE:
+                self._finish(item)
+            else:
+                blocked = self._put(target, item)
+            with self._condition:
+                stats = self._stats[stage.name]
+                stats["processed"] += 1
+                stats["busy_seconds"] += busy
+                stats["blocked_seconds"] += blocked
+
+    def run(self, items: Iterable[Any]) -> List[Any]:
+        """Feed ``items`` into the first stage and wait until every one is done.
+
+        Returns the items in the order they finished. Feeding blocks while
+        the first stage's queue is full.
+        """
+        if self._closed:
+            raise RuntimeError("Pipeline is closed")
+        self._start()
+        with self._condition:
+            self._finished = []
+        for item in items:
+            with self._condition:
+                if self._fatal is not None:
+                    break
+                self._pending += 1
+            self._put(self.stages[0].name, item)
+        with self._condition:
+            while self._pending:
+                self._condition.wait()
+            finished, self._finished = self._finished, []
+            fatal, self._fatal = self._fatal, None
+        if fatal is not None:
+            raise fatal
+        return finished
+
+    def close(self) -> None:
+        """Stop the workers once the items already queued are done"""
+        if self._closed:
+            return
+        self._closed = True
+        for stage in self.stages:
+            for _ in range(stage.workers if self._threads else 0):
+                self._queues[stage.name].put(_STOP)
+        for thread in self._threads:
+            thread.join()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Per stage: workers, items processed, items queued, busy and blocked time.
+
+        ``utilization`` is the share of the stage's worker time spent working;
+        the stage closest to 1 is the bottleneck.
+        """
+        elapsed = time.monotonic() - self._started_at if self._started_at else 0.0
+        with self._condition:
+            return {
+                stage.name: {
+                    "workers": stage.workers,
+                    "processed": self._stats[stage.name]["processed"],
+                    "queued": self._queues[stage.name].qsize(),
+                    "max_queued": self._stats[stage.name]["max_queued"],
+                    "busy_seconds": round(self._stats[stage.name]["busy_seconds"], 3),
+                    "blocked_seconds": round(self._stats[stage.name]["blocked_seconds"], 3),
+                    "utilization": round(self._stats[stage.name]["busy_seconds"] / (stage.workers * elapsed), 3)
+                    if elapsed else 0.0,
+                }
+                for stage in self.stages
+            }
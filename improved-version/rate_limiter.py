@@ -0,0 +1,204 @@
+"""
+Shared token-bucket rate limiting for external APIs
+
+Every backend (Hunter, OpenAI requests and tokens, Sheets, Gmail) gets one
+bucket that all worker threads draw from, so the workflow can run right at
+each provider's quota instead of sleeping a fixed, pessimistic delay. A 429
+with Retry-After pauses the whole bucket, not just the caller that saw it.
+"""
+
+import logging
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from concurrency import AdaptiveLimiter, is_timeout
+from instrumentation import RETRIES, record
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay, check_deadline, deadline_passed, is_transient, sleep_within_deadline
+
+logger = logging.getLogger(__name__)
+
+# ============================================================================
+# TOKEN BUCKET
+# ============================================================================
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at ``rate`` tokens per second"""
+
+    def __init__(self, name: str, rate: float, capacity: float):
+        if rate <= 0 or capacity <= 0:
+            raise ValueError(f"Rate limiter {name} needs a positive rate and capacity")
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until ``tokens`` are available and take them; returns seconds waited.
+
+        Requests larger than the bucket are clamped to its capacity so they
+        can still go through once the bucket is full.
+        """
+        tokens = min(tokens, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                else:
+                    wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+    def refund(self, tokens: float) -> None:
+        """Return tokens that were reserved but not used (e.g. an over-estimate)"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def pause(self, seconds: float) -> None:
+        """Stop handing out tokens for ``seconds`` and drain the bucket (429 backoff)"""
+        with self._lock:
+            now = time.monotonic()
+            self._paused_until = max(self._paused_until, now + seconds)
+            self._tokens = 0.0
+            self._updated = now
+        logger.warning(f"Rate limit hit for {self.name}, pausing for {seconds:.1f}s")
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current budget: available tokens, capacity, refill rate and pause left"""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            return {
+                "available": round(self._tokens, 2),
+                "capacity": self.capacity,
+                "rate_per_second": self.rate,
+                "paused_for": round(max(0.0, self._paused_until - now), 2),
+            }
+
+# ============================================================================
+# REGISTRY
+# ============================================================================
+
+class RateLimiterRegistry:
+    """Named buckets shared by the whole process"""
+
+    def __init__(self):
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, name: str, per_minute: float, burst: Optional[float] = None) -> TokenBucket:
+        """Create (or replace) the bucket for ``name`` from a per-minute quota"""
+        bucket = TokenBucket(name, per_minute / 60.0, burst or max(1.0, per_minute / 60.0))
+        with self._lock:
+            self._buckets[name] = bucket
+        return bucket
+
+    def get(self, name: str) -> TokenBucket:
+        with self._lock:
+            return self._buckets[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Budget of every configured bucket, keyed by backend name"""
+        with self._lock:
+            buckets = list(self._buckets.values())
+        return {bucket.name: bucket.snapshot() for bucket in buckets}
+
+RATE_LIMITERS = RateLimiterRegistry()
+
+# ============================================================================
+# HELPERS
+# ============================================================================
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header given either as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+def call_rate_limited(
+    fn: Callable[[], Any],
+    buckets: Sequence[Tuple[TokenBucket, float]],
+    retry_after_of: Callable[[Exception], Optional[float]],
+    max_attempts: int = 3,
+    default_backoff: float = 5.0,
+    limiter: Optional[AdaptiveLimiter] = None,
+    breaker: Optional[CircuitBreaker] = None,
+    idempotent: bool = False,
+) -> Any:
+    """Call ``fn`` after taking tokens from every bucket, retrying on rate-limit errors.
+
+    ``retry_after_of`` maps an exception raised by ``fn`` to the provider's
+    Retry-After in seconds (0 when the header is missing), or None when the
+    exception is not a rate-limit error. Other errors propagate unchanged,
+    except transient ones (5xx, timeouts, dropped connections) of
+    ``idempotent`` calls, which are retried after a jittered backoff.
+
+    With a ``limiter`` each attempt also runs within the backend's adaptive
+    concurrency limit, which rate-limit errors and timeouts cut. With a
+    ``breaker`` calls fail fast with CircuitOpenError while the backend is
+    down. Waits never run past the current company's deadline.
+    """
+    def is_overload(error: Exception) -> bool:
+        # A timeout shortened by the company deadline says nothing about the backend
+        return retry_after_of(error) is not None or (is_timeout(error) and not deadline_passed())
+
+    for attempt in range(1, max_attempts + 1):
+        check_deadline()
+        for bucket, tokens in buckets:
+            bucket.acquire(tokens)
+        # Last, so that nothing can fail between taking a half-open breaker's
+        # trial slot and the call that reports back on it
+        if breaker:
+            try:
+                breaker.before_call()
+            except CircuitOpenError:
+                for bucket, tokens in buckets:
+                    bucket.refund(tokens)
+                raise
+        try:
+            result = limiter.call(fn, is_overload) if limiter else fn()
+        except Exception as e:
+            retry_after = retry_after_of(e)
+            transient = retry_after is None and is_transient(e) and not deadline_passed()
+            if breaker and transient:
+                breaker.record_failure()
+            elif breaker:
+                breaker.record_neutral()
+            if (retry_after is None and not (transient and idempotent)) or attempt == max_attempts:
+                raise
+            record(RETRIES)
+            if retry_after is None:
+                sleep_within_deadline(backoff_delay(attempt))
+                continue
+            for bucket, _ in buckets:
+                bucket.pause(retry_after or default_backoff)
+        except BaseException:
+            if breaker:
+                breaker.record_neutral()
+            raise
+        else:
+            if breaker:
+                breaker.record_success()
+            return result
@@ -0,0 +1,244 @@
+"""
+Retries, circuit breakers and per-company deadlines
+
+Transient failures (5xx responses, timeouts, dropped connections) of
+idempotent calls are retried with jittered exponential backoff. Each API
+backend has a CircuitBreaker that opens after a run of consecutive transient
+failures, so while a provider is down calls fail at once instead of each
+waiting out its own timeouts; after ``reset_timeout`` one trial call is let
+through and closes the breaker again if it succeeds. A trial that never
+reports back (its caller died or hung) gives up its slot after another
+``reset_timeout``, so the breaker can't stay half open forever.
+
+A company's deadline is carried in the workflow state. While a node runs,
+deadline_scope makes it available to the calls the node makes: time_left
+caps their timeouts and retry sleeps never run past it.
+"""
+
+import contextlib
+import contextvars
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from instrumentation import RETRIES, record
+
+logger = logging.getLogger(__name__)
+
+# Breaker states and their gauge values
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class DeadlineExceeded(Exception):
+    """The current company ran out of time"""
+
+class CircuitOpenError(Exception):
+    """A backend's circuit breaker is open; the call was not made"""
+
+# ============================================================================
+# DEADLINES
+# ============================================================================
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+@contextlib.contextmanager
+def deadline_scope(deadline: Optional[float]):
+    """Make ``deadline`` (a time.time() timestamp, or None) the deadline of calls made in this block"""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+def current_deadline() -> Optional[float]:
+    """Deadline of calls made in this context, for handing to another thread"""
+    return _deadline.get()
+
+def deadline_passed() -> bool:
+    deadline = _deadline.get()
+    return deadline is not None and time.time() >= deadline
+
+def check_deadline() -> None:
+    """Raise DeadlineExceeded once the deadline has passed"""
+    if deadline_passed():
+        raise DeadlineExceeded("Company deadline exceeded")
+
+def time_left(default: float) -> float:
+    """``default`` capped at the time left before the deadline; raises DeadlineExceeded when none is left"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise DeadlineExceeded("Company deadline exceeded")
+    return min(default, remaining)
+
+def sleep_within_deadline(seconds: float) -> None:
+    """Sleep ``seconds``, or raise DeadlineExceeded if that would pass the deadline"""
+    deadline = _deadline.get()
+    if deadline is not None and time.time() + seconds >= deadline:
+        raise DeadlineExceeded(f"Company deadline exceeded before a {seconds:.1f}s retry wait")
+    time.sleep(seconds)
+
+# ============================================================================
+# RETRIES
+# ============================================================================
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Full-jitter exponential backoff: uniform in [0, min(cap, base * 2 ** (attempt - 1))]"""
+    return random.uniform(0, min(cap, base * 2 ** (attempt - 1)))
+
+def status_code_of(error: BaseException) -> Optional[int]:
+    """HTTP status of an error raised by requests, httpx, openai or googleapiclient, if any"""
+    status = getattr(error, "status_code", None)
+    if status is None:
+        # Not ``or``: a requests Response with an error status is falsy
+        response = getattr(error, "response", None)
+        if response is None:
+            response = getattr(error, "resp", None)
+        status = getattr(response, "status_code", None)
+        if status is None:
+            status = getattr(response, "status", None)
+    try:
+        return int(status) if status is not None else None
+    except (TypeError, ValueError):
+        return None
+
+def is_transient(error: BaseException) -> bool:
+    """True for errors worth retrying: 5xx responses, timeouts and dropped connections"""
+    if isinstance(error, (DeadlineExceeded, CircuitOpenError)):
+        return False
+    status = status_code_of(error)
+    if status is not None:
+        return status >= 500
+    return isinstance(error, (TimeoutError, ConnectionError)) or any(
+        "Timeout" in cls.__name__ or "Connection" in cls.__name__ for cls in type(error).__mro__
+    )
+
+def retry_call(
+    fn: Callable[[], Any],
+    is_retryable: Callable[[Exception], bool] = is_transient,
+    max_attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 8.0,
+) -> Any:
+    """Call ``fn``, retrying errors ``is_retryable`` accepts after a jittered backoff.
+
+    Only for idempotent calls. Waits never run past the current deadline.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            return fn()
+        except Exception as e:
+            if isinstance(e, TimeoutError) and deadline_passed():
+                raise DeadlineExceeded("Company deadline exceeded") from e
+            if attempt == max_attempts or not is_retryable(e) or deadline_passed():
+                raise
+            record(RETRIES)
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.info(f"Retrying after {type(e).__name__} in {delay:.2f}s (attempt {attempt + 1}/{max_attempts})")
+            sleep_within_deadline(delay)
+
+# ============================================================================
+# CIRCUIT BREAKERS
+# ============================================================================
+
+class CircuitBreaker:
+    """Thread-safe breaker that opens after ``failure_threshold`` consecutive failures"""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call may be made now"""
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            now = time.monotonic()
+            if self._state == OPEN and now - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == HALF_OPEN and (not self._trial_in_flight or
+                                             now - self._trial_started_at >= self.reset_timeout):
+                # Let exactly one trial call through (or replace one that never reported back)
+                self._trial_in_flight = True
+                self._trial_started_at = now
+                return
+            raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._state != CLOSED:
+                logger.info(f"{self.name} circuit breaker closed")
+            self._state = CLOSED
+            self._failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._trial_in_flight = False
+                logger.warning(f"{self.name} circuit breaker opened after {self._failures} failures; "
+                               f"failing fast for {self.reset_timeout:.0f}s")
+
+    def record_neutral(self) -> None:
+        """A call that says nothing about the backend's health (e.g. a 4xx) finished"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._failures}
+
+class CircuitBreakerRegistry:
+    """Named breakers shared by the whole process"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def configure(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0) -> CircuitBreaker:
+        """Create (or replace) the breaker for ``name``"""
+        breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        with self._lock:
+            self._breakers[name] = breaker
+        return breaker
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            return self._breakers[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """State of every configured breaker, keyed by backend name"""
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
+
+    def prometheus_text(self, prefix: str = "outbound") -> str:
+        """Breaker states (0 closed, 1 half open, 2 open) in the Prometheus text exposition format"""
+        lines = [
+            f"# HELP {prefix}_circuit_breaker_state Circuit breaker state per backend (0 closed, 1 half open, 2 open)",
+            f"# TYPE {prefix}_circuit_breaker_state gauge",
+        ]
+        lines += [
+            f'{prefix}_circuit_breaker_state{{backend="{name}"}} {STATE_VALUES[values["state"]]}'
+            for name, values in sorted(self.snapshot().items())
+        ]
+        return "\n".join(lines) + "\n"
+
+CIRCUIT_BREAKERS = CircuitBreakerRegistry()
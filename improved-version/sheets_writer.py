@@ -0,0 +1,239 @@
+"""
+Write-behind buffer for the Google Sheets success and failure logs
+
+Rows are appended to a local journal before they are acknowledged, collected
+in memory, and written to Sheets in one batch every ``flush_rows`` rows or
+``flush_interval`` seconds, and once more on shutdown. Rows still in the
+journal at startup (a crash before their batch was written) are replayed, so
+delivery is at-least-once: a crash between a successful write and the journal
+compaction can append that batch a second time.
+
+Several processes (e.g. queue workers on one host) can be given the same
+journal path: each locks a journal slot of its own (``path``, ``path.1``,
+...) and takes over the journals of slots whose process has died.
+"""
+
+import glob
+import itertools
+import json
+import logging
+import os
+import threading
+from typing import IO, Any, Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: one process per journal
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RowsByRange = Dict[str, List[List[Any]]]
+
+# ============================================================================
+# SHEETS HELPERS
+# ============================================================================
+
+def append_cells_request(sheet_id: int, rows: List[List[Any]]) -> Dict[str, Any]:
+    """Build a batchUpdate appendCells request that writes ``rows`` as raw strings"""
+    return {
+        "appendCells": {
+            "sheetId": sheet_id,
+            "rows": [
+                {"values": [{"userEnteredValue": {"stringValue": str(value)}} for value in row]}
+                for row in rows
+            ],
+            "fields": "userEnteredValue",
+        }
+    }
+
+def sheet_title(range_name: str) -> str:
+    """Tab name of an A1 range such as 'Failures!A:A'"""
+    return range_name.split("!", 1)[0].strip("'")
+
+# ============================================================================
+# JOURNAL SLOTS
+# ============================================================================
+
+def _lock_slot(path: str) -> Optional[IO]:
+    """Lock the journal at ``path`` for this process; None if another process holds it"""
+    lock_file = open(path + ".lock", "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return None
+    return lock_file
+
+def claim_journal(path: str) -> Tuple[str, Optional[IO]]:
+    """First journal slot of ``path`` no other process holds, and its open lock file"""
+    if fcntl is None:
+        return path, None
+    for slot in itertools.count():
+        slot_path = path if slot == 0 else f"{path}.{slot}"
+        lock_file = _lock_slot(slot_path)
+        if lock_file is not None:
+            return slot_path, lock_file
+
+def journal_slots(path: str) -> List[str]:
+    """Existing journal files of ``path``'s slots"""
+    slots = [path] if os.path.exists(path) else []
+    slots += sorted(
+        (name for name in glob.glob(glob.escape(path) + ".*") if name[len(path) + 1:].isdigit()),
+        key=lambda name: int(name[len(path) + 1:]),
+    )
+    return slots
+
+def read_journal(path: str) -> List[Tuple[str, List[Any]]]:
+    """Rows in the journal at ``path``, skipping a line torn by a crash"""
+    if not os.path.exists(path):
+        return []
+    rows = []
+    with open(path, "r", encoding="utf-8") as journal:
+        for line in journal:
+            try:
+                entry = json.loads(line)
+                rows.append((entry["range"], entry["row"]))
+            except (ValueError, KeyError):
+                continue  # Torn last line from a crash mid-write
+    return rows
+
+# ============================================================================
+# BUFFER
+# ============================================================================
+
+class SheetsLogBuffer:
+    """Durable, batched append buffer in front of the Sheets API.
+
+    ``write_rows`` receives every pending row grouped by A1 range and must
+    write them all in one call or raise; on failure the rows stay pending and
+    are retried with the next flush.
+    """
+
+    def __init__(
+        self,
+        write_rows: Callable[[RowsByRange], None],
+        journal_path: str,
+        flush_rows: int = 50,
+        flush_interval: float = 10.0,
+    ):
+        self._write_rows = write_rows
+        self._journal_path, self._journal_lock = claim_journal(journal_path)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._pending: List[Tuple[str, List[Any]]] = read_journal(self._journal_path)
+        self._closed = False
+
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+        adopted = self._adopt_journals(journal_path)
+        if self._pending:
+            logger.info(f"Replaying {len(self._pending)} unflushed Sheets log rows from {self._journal_path}"
+                        + (f" and {len(adopted)} journals of stopped processes" if adopted else ""))
+        for path, lock_file in adopted:
+            # Their rows are safely in our own journal by now
+            os.remove(path)
+            lock_file.close()
+        self._thread = threading.Thread(target=self._run, name="sheets-log-writer", daemon=True)
+        self._thread.start()
+
+    def _adopt_journals(self, path: str) -> List[Tuple[str, IO]]:
+        """Move the rows of other slots' unlocked journals into ours; returns those journals, still locked"""
+        if self._journal_lock is None:
+            return []
+        adopted = []
+        for slot_path in journal_slots(path):
+            if slot_path == self._journal_path:
+                continue
+            lock_file = _lock_slot(slot_path)
+            if lock_file is None:
+                continue  # Its process is still running
+            self._pending += read_journal(slot_path)
+            adopted.append((slot_path, lock_file))
+        if adopted:
+            self._rewrite_journal()
+        return adopted
+
+    def add(self, range_name: str, row: List[Any]) -> None:
+        """Queue one row for ``range_name``; returns once the row is journaled to disk"""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Sheets log buffer is closed")
+            self._journal.write(json.dumps({"range": range_name, "row": row}) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            self._pending.append((range_name, row))
+            if len(self._pending) >= self.flush_rows:
+                self._wakeup.notify()
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def flush(self) -> bool:
+        """Write every pending row now; returns False if the write failed"""
+        with self._flush_lock:
+            with self._lock:
+                batch = list(self._pending)
+            if not batch:
+                return True
+
+            rows_by_range: RowsByRange = {}
+            for range_name, row in batch:
+                rows_by_range.setdefault(range_name, []).append(row)
+
+            try:
+                self._write_rows(rows_by_range)
+            except Exception as e:
+                logger.error(f"Failed to flush {len(batch)} Sheets log rows, will retry: {e}")
+                return False
+
+            with self._lock:
+                # Rows added while the batch was in flight stay pending and
+                # are the only ones left in the compacted journal
+                del self._pending[:len(batch)]
+                self._rewrite_journal()
+            logger.info(f"Flushed {len(batch)} rows to Google Sheets")
+            return True
+
+    def _rewrite_journal(self) -> None:
+        """Replace the journal with the rows still pending (caller holds the lock)"""
+        self._journal.close()
+        tmp_path = self._journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as journal:
+            for range_name, row in self._pending:
+                journal.write(json.dumps({"range": range_name, "row": row}) + "\n")
+            journal.flush()
+            os.fsync(journal.fileno())
+        os.replace(tmp_path, self._journal_path)
+        self._journal = open(self._journal_path, "a", encoding="utf-8")
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._closed and len(self._pending) < self.flush_rows:
+                    self._wakeup.wait(self.flush_interval)
+                if self._closed:
+                    return
+            if not self.flush():
+                # Back off for one interval instead of retrying a failing write in a tight loop
+                with self._lock:
+                    if not self._closed:
+                        self._wakeup.wait(self.flush_interval)
+
+    def close(self) -> None:
+        """Stop the background writer and flush whatever is still pending"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._wakeup.notify()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        with self._lock:
+            self._journal.close()
+            if self._journal_lock is not None:
+                self._journal_lock.close()
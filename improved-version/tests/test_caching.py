@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+from caching import HTTPCache, HunterCache, LLMCache, llm_cache_key, normalize_url
+
+@pytest.mark.parametrize("url, normalized", [
+    ("HTTPS://Acme.COM:443/About/#team", "https://acme.com/About"),
+    ("http://acme.com:8080/?b=2&a=1", "http://acme.com:8080?a=1&b=2"),
+])
+def test_normalize_url(url, normalized):
+    assert normalize_url(url) == normalized
+
+def test_http_cache_round_trip_and_text_version(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    cache = HTTPCache(path, text_version=1)
+    assert cache.lookup("https://acme.com") is None
+    cache.store("https://acme.com/", "<html>", '"v1"', None)
+    cache.store_text("https://ACME.com", "text")
+    page = cache.lookup("https://acme.com")
+    assert (page.body, page.text) == ("<html>", "text")
+    assert page.conditional_headers() == {"If-None-Match": '"v1"'}
+    assert page.is_fresh(60) and not page.is_fresh(0)
+    assert HTTPCache(path, text_version=2).lookup("https://acme.com").text is None
+
+def test_http_cache_store_drops_stale_text(tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache.sqlite3"))
+    cache.store("https://acme.com", "<html>old", None, "Mon, 01 Jan 2024 00:00:00 GMT")
+    cache.store_text("https://acme.com", "old text")
+    cache.store("https://acme.com", "<html>new", None, None)
+    assert cache.lookup("https://acme.com").text is None
+
+def test_http_cache_touch_revalidates(tmp_path):
+    cache = HTTPCache(str(tmp_path / "cache.sqlite3"))
+    cache.store("https://acme.com", "<html>", None, None)
+    cache.execute("UPDATE http_cache SET validated_at = 0")
+    assert not cache.lookup("https://acme.com").is_fresh(60)
+    cache.touch("https://acme.com")
+    assert cache.lookup("https://acme.com").is_fresh(60)
+
+def test_hunter_cache_expires_empty_results_sooner(tmp_path):
+    cache = HunterCache(str(tmp_path / "cache.sqlite3"), ttl=60, negative_ttl=0.05)
+    cache.put("Acme.com", {"emails": [{"value": "a@acme.com"}]})
+    cache.put("empty.com", {"emails": []})
+    assert cache.get("acme.com")["emails"][0]["value"] == "a@acme.com"
+    assert cache.get("empty.com") == {"emails": []}
+    time.sleep(0.06)
+    assert cache.get("empty.com") is None
+    assert cache.get("acme.com") is not None
+
+def test_llm_cache_key_depends_on_every_input():
+    messages = [{"role": "user", "content": "hi"}]
+    key = llm_cache_key("model", "v1", messages, {"temperature": 0.7})
+    assert key == llm_cache_key("model", "v1", [dict(messages[0])], {"temperature": 0.7})
+    assert key != llm_cache_key("model", "v2", messages, {"temperature": 0.7})
+    assert key != llm_cache_key("other", "v1", messages, {"temperature": 0.7})
+    assert key != llm_cache_key("model", "v1", messages, {"temperature": 0.2})
+
+def test_llm_cache_evicts_least_recently_used(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_entries=2)
+    for key in ("a", "b", "c"):
+        cache.put(key, key.upper())
+        time.sleep(0.01)
+    assert cache.get("a") == "A"  # Now the most recently used
+    cache.evict()
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("A", "C")
+
+def test_llm_cache_delete(tmp_path):
+    cache = LLMCache(str(tmp_path / "cache.sqlite3"), max_entries=10)
+    cache.put("a", "{truncated")
+    cache.delete("a")
+    assert cache.get("a") is None
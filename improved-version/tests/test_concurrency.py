@@ -0,0 +1,130 @@
+import threading
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from concurrency import AdaptiveLimiter, ConcurrencyLimiterRegistry, is_timeout
+
+class RateLimited(Exception):
+    status_code = 429
+
+def is_overload(error):
+    return isinstance(error, RateLimited) or is_timeout(error)
+
+def limiter(initial=1, **kwargs):
+    kwargs.setdefault("spike_ratio", None)
+    return AdaptiveLimiter("test", initial, **kwargs)
+
+def fail_with(error):
+    def fn():
+        raise error
+    return fn
+
+def test_saturated_successes_raise_the_limit_additively():
+    test_limiter = limiter(initial=1, max_limit=10)
+    test_limiter.call(lambda: None)  # 1 in flight of 1: saturated
+    assert test_limiter.limit == 2
+    test_limiter.call(lambda: None)  # 1 of 2: spare capacity, no increase
+    assert test_limiter.limit == 2
+    assert test_limiter.snapshot()["increases"] == 1
+
+def test_increase_is_about_one_per_limit_of_calls():
+    test_limiter = limiter(initial=4, max_limit=10)
+    for _ in range(4):
+        test_limiter.acquire()
+    for _ in range(4):
+        test_limiter.release(time.monotonic(), 0.01, saturated=True)
+    assert test_limiter.limit == 4  # 4 + 4 * (about 1/4), just under 5
+    test_limiter.acquire()
+    test_limiter.release(time.monotonic(), 0.01, saturated=True)
+    assert test_limiter.limit == 5
+
+@pytest.mark.parametrize("error", [RateLimited(), TimeoutError()])
+def test_overload_cuts_the_limit_multiplicatively(error):
+    test_limiter = limiter(initial=8)
+    with pytest.raises(type(error)):
+        test_limiter.call(fail_with(error), is_overload)
+    assert test_limiter.limit == 4
+    assert test_limiter.snapshot()["decreases"] == 1
+
+def test_other_failures_leave_the_limit_alone():
+    test_limiter = limiter(initial=8)
+    with pytest.raises(KeyError):
+        test_limiter.call(fail_with(KeyError("bad")), is_overload)
+    assert test_limiter.limit == 8
+
+def test_one_cut_per_round_of_calls():
+    test_limiter = limiter(initial=8)
+    started = time.monotonic()
+    for _ in range(3):
+        test_limiter.acquire()
+    for _ in range(3):
+        test_limiter.release(started, 0.01, overloaded=True)  # All started before the first cut
+    assert test_limiter.limit == 4
+
+def test_limit_stays_within_bounds():
+    test_limiter = limiter(initial=3, min_limit=2, max_limit=3)
+    for _ in range(5):
+        with pytest.raises(RateLimited):
+            test_limiter.call(fail_with(RateLimited()), is_overload)
+        time.sleep(0.001)
+    assert test_limiter.limit == 2
+    for _ in range(20):
+        test_limiter.acquire()
+        test_limiter.release(time.monotonic(), 0.01, saturated=True)
+    assert test_limiter.limit == 3
+    assert AdaptiveLimiter("test", initial=100, max_limit=4).limit == 4
+
+def test_invalid_bounds_are_rejected():
+    with pytest.raises(ValueError):
+        AdaptiveLimiter("test", initial=1, min_limit=5, max_limit=2)
+
+def test_latency_spike_counts_as_overload():
+    test_limiter = AdaptiveLimiter("test", initial=8, spike_ratio=2.5)
+    for _ in range(11):
+        test_limiter.acquire()
+        test_limiter.release(time.monotonic(), 0.01, saturated=False)
+    test_limiter.acquire()
+    test_limiter.release(time.monotonic(), 1.0)
+    assert test_limiter.limit == 4
+
+def test_waiters_are_released_when_the_limit_grows():
+    test_limiter = limiter(initial=1, max_limit=4)
+    assert test_limiter.acquire()  # Fills the limit of 1
+    started = threading.Barrier(3)
+    acquired = []
+
+    def wait_for_slot():
+        started.wait()
+        test_limiter.acquire()
+        acquired.append(1)
+
+    waiters = [threading.Thread(target=wait_for_slot) for _ in range(2)]
+    for waiter in waiters:
+        waiter.start()
+    started.wait()
+    time.sleep(0.05)
+    assert acquired == []
+
+    test_limiter.release(time.monotonic(), 0.01, saturated=True)  # Limit grows to 2
+    for waiter in waiters:
+        waiter.join(2)
+    assert acquired == [1, 1]  # Both fit under the new limit
+    assert test_limiter.snapshot()["in_flight"] == 2
+
+def test_try_acquire_and_release_when_done():
+    test_limiter = limiter(initial=1)
+    assert test_limiter.try_acquire()
+    assert not test_limiter.try_acquire()
+    future = Future()
+    test_limiter.release_when_done(future, is_overload)
+    future.set_exception(RateLimited())
+    assert test_limiter.snapshot()["in_flight"] == 0
+    assert test_limiter.try_acquire()
+
+def test_registry_exports_limits():
+    registry = ConcurrencyLimiterRegistry()
+    registry.configure("hunter", initial=3, max_limit=8)
+    assert registry.get("hunter").limit == 3
+    assert 'outbound_concurrency_limit{backend="hunter"} 3' in registry.prometheus_text()
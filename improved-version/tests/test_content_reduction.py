@@ -0,0 +1,30 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import content_reduction
+from content_reduction import count_tokens, get_encoding
+
+def test_encoding_is_loaded_once_under_concurrency(monkeypatch):
+    loads = []
+
+    def unavailable(model):
+        loads.append(model)
+        time.sleep(0.05)  # Slow download, so the threads overlap
+        raise OSError("no network")
+
+    monkeypatch.setattr(content_reduction, "tiktoken", SimpleNamespace(encoding_for_model=unavailable))
+    monkeypatch.setattr(content_reduction, "_encodings", {})
+    threads = [threading.Thread(target=get_encoding, args=("test-model",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert loads == ["test-model"]
+    assert get_encoding("test-model") is None
+    assert loads == ["test-model"]  # The failure is cached too
+
+def test_count_tokens_estimates_without_an_encoding(monkeypatch):
+    monkeypatch.setattr(content_reduction, "tiktoken", None)
+    monkeypatch.setattr(content_reduction, "_encodings", {})
+    assert count_tokens("x" * 9, "test-model") == 3
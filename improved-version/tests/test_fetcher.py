@@ -0,0 +1,37 @@
+import time
+
+import pytest
+
+import fetcher
+from fetcher import AsyncFetcher
+
+@pytest.fixture
+def make_fetcher():
+    fetchers = []
+
+    def make(**kwargs):
+        instance = AsyncFetcher(**kwargs)
+        fetchers.append(instance)
+        return instance
+
+    yield make
+    for instance in fetchers:
+        instance.close()
+
+def test_requests_to_one_host_are_spaced_out(make_fetcher):
+    website_fetcher = make_fetcher(host_delay=0.05)
+    started = time.monotonic()
+    for _ in range(3):
+        website_fetcher._submit(website_fetcher._wait_for_host("acme.com"))
+    assert time.monotonic() - started >= 0.1
+    started = time.monotonic()
+    website_fetcher._submit(website_fetcher._wait_for_host("other.com"))
+    assert time.monotonic() - started < 0.05
+
+def test_hosts_no_longer_waited_on_are_forgotten(make_fetcher, monkeypatch):
+    monkeypatch.setattr(fetcher, "HOST_SLOTS_PRUNE_SIZE", 8)
+    website_fetcher = make_fetcher(host_delay=0.001)
+    for number in range(100):
+        website_fetcher._submit(website_fetcher._wait_for_host(f"host-{number}.com"))
+        time.sleep(0.002)
+    assert len(website_fetcher._host_next_slot) < 16
@@ -0,0 +1,120 @@
+import base64
+import time
+
+import pytest
+
+from gmail_drafts import GmailDraftBatcher, create_message_raw, draft_message_id
+from rate_limiter import TokenBucket
+from resilience import CLOSED, OPEN, CircuitBreaker, CircuitOpenError, DeadlineExceeded, deadline_scope
+
+class ServerError(Exception):
+    status_code = 503
+
+class RateLimited(Exception):
+    status_code = 429
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id):
+        self.requests.append(request_id)
+
+    def execute(self):
+        self.service.batches += 1
+        for request_id in self.requests:
+            error = self.service.errors.pop(0) if self.service.errors else None
+            if error is None:
+                self.service.created += 1
+                self.callback(request_id, {"id": f"draft-{self.service.created}"}, None)
+            else:
+                self.callback(request_id, None, error)
+
+class FakeGmail:
+    """Just enough of the Gmail API client for batched draft creation"""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)  # One per draft sent, None for success
+        self.batches = 0
+        self.created = 0
+
+    def new_batch_http_request(self, callback):
+        return FakeBatch(self, callback)
+
+    def users(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def create(self, userId, body):
+        return body
+
+def make_batcher(service, breaker=None, max_attempts=3):
+    return GmailDraftBatcher(
+        lambda: service,
+        TokenBucket("gmail", rate=1000, capacity=100),
+        lambda e: 0.01 if isinstance(e, RateLimited) else None,
+        max_wait=0.01,
+        max_attempts=max_attempts,
+        breaker=breaker,
+    )
+
+def test_drafts_are_created_in_one_batch():
+    service = FakeGmail()
+    batcher = make_batcher(service)
+    futures = [batcher.submit(f"{name}@acme.com", "Hi", "Body") for name in ("a", "b", "c")]
+    assert sorted(future.result(5) for future in futures) == ["draft-1", "draft-2", "draft-3"]
+    batcher.close()
+    assert service.batches == 1
+
+def test_rate_limited_drafts_are_retried_up_to_max_attempts():
+    service = FakeGmail(errors=[RateLimited(), RateLimited(), RateLimited()])
+    batcher = make_batcher(service, max_attempts=2)
+    with pytest.raises(RateLimited):
+        batcher.create("a@acme.com", "Hi", "Body", timeout=5)
+    assert batcher.create("b@acme.com", "Hi", "Body", timeout=5) == "draft-1"
+    batcher.close()
+
+def test_server_errors_open_the_breaker_and_later_drafts_fail_fast():
+    service = FakeGmail(errors=[ServerError(), ServerError()])
+    breaker = CircuitBreaker("gmail", failure_threshold=2, reset_timeout=60)
+    batcher = make_batcher(service, breaker)
+    for _ in range(2):
+        with pytest.raises(ServerError):
+            batcher.create("a@acme.com", "Hi", "Body", timeout=5)
+    assert breaker.snapshot()["state"] == OPEN
+    with pytest.raises(CircuitOpenError):
+        batcher.create("b@acme.com", "Hi", "Body", timeout=5)
+    batcher.close()
+    assert service.batches == 2
+
+def test_successful_batch_closes_a_half_open_breaker():
+    service = FakeGmail(errors=[ServerError()])
+    breaker = CircuitBreaker("gmail", failure_threshold=1, reset_timeout=0.05)
+    batcher = make_batcher(service, breaker)
+    with pytest.raises(ServerError):
+        batcher.create("a@acme.com", "Hi", "Body", timeout=5)
+    time.sleep(0.06)
+    assert batcher.create("a@acme.com", "Hi", "Body", timeout=5) == "draft-1"
+    assert breaker.snapshot()["state"] == CLOSED
+    batcher.close()
+
+def test_drafts_past_their_deadline_are_not_sent():
+    service = FakeGmail()
+    batcher = make_batcher(service)
+    with deadline_scope(time.time() - 1):
+        future = batcher.submit("a@acme.com", "Hi", "Body")
+    with pytest.raises(DeadlineExceeded):
+        future.result(5)
+    batcher.close()
+    assert service.batches == 0
+
+def test_message_id_is_deterministic_and_in_the_message():
+    message_id = draft_message_id("run-1", "https://acme.com")
+    assert message_id == draft_message_id("run-1", "https://acme.com")
+    assert message_id != draft_message_id("run-2", "https://acme.com")
+    raw = base64.urlsafe_b64decode(create_message_raw("a@acme.com", "Hi", "Body", message_id)).decode()
+    assert f"Message-ID: {message_id}" in raw
@@ -0,0 +1,287 @@
+"""Whole-graph runs of graph_main with every node that calls an outside service stubbed"""
+import base64
+import email
+import sqlite3
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from types import SimpleNamespace
+
+import pytest
+from langgraph.checkpoint.memory import MemorySaver
+
+import graph_main
+from fetcher import FetchResult
+from graph_main import Contact
+
+REAL_FETCH_WEBSITE = graph_main.fetch_website
+
+
+def company_urls(count):
+    return [f"https://company{i}.com" for i in range(count)]
+
+
+def has_contacts(url):
+    return int(url.split("company")[1].split(".")[0]) % 2 == 0
+
+
+@pytest.fixture
+def campaign(tmp_path, monkeypatch):
+    """Stubs the external calls; returns a function that runs a campaign over a lead file"""
+    calls = []
+    logged = []
+
+    def node(name, update):
+        def stub(state):
+            calls.append((name, state["current_company_url"]))
+            return update(state) if callable(update) else dict(update)
+        return stub
+
+    def contacts(state):
+        if not has_contacts(state["current_company_url"]):
+            return {"emails_found": False}
+        return {"contact_emails": [Contact("ceo@example.com", "Ada", "Lovelace")], "emails_found": True}
+
+    monkeypatch.setattr(graph_main, "fetch_website", node("fetch", {"html_content": "<p>Hello</p>"}))
+    monkeypatch.setattr(graph_main, "extract_text_content", node("extract", {"text_content": "Hello", "html_content": None}))
+    monkeypatch.setattr(graph_main, "reduce_text_content", node("reduce", {}))
+    monkeypatch.setattr(graph_main, "summarize_company",
+                        node("summarize", lambda state: {"company_summary": "Makes things", "text_content": None}))
+    monkeypatch.setattr(graph_main, "find_contacts", node("contacts", contacts))
+    monkeypatch.setattr(graph_main, "generate_email", node("email", {"email_subject": "Hi", "email_body": "Hello"}))
+    monkeypatch.setattr(graph_main, "create_gmail_draft", node("draft", {"draft_id": "draft"}))
+    monkeypatch.setattr(graph_main, "log_lead_rows",
+                        lambda state, log_range, row: logged.append((log_range, state["current_company_url"])))
+    monkeypatch.setattr(graph_main, "EMAIL_GENERATION_MODE", "combined")
+    monkeypatch.setattr(graph_main, "SPECULATIVE_FETCH", False)
+    monkeypatch.setattr(graph_main, "CHECKPOINT_DB_PATH", str(tmp_path / "checkpoints.sqlite3"))
+    monkeypatch.setattr(graph_main, "_completion_ledger", None)
+
+    def write_leads(urls):
+        leads = tmp_path / "leads.csv"
+        leads.write_text("".join(f"{url}\n" for url in urls))
+        return leads
+
+    def run(urls, mode="sequential", order="fetch_first", page_size=10, run_id=None):
+        monkeypatch.setattr(graph_main, "LEAD_PAGE_SIZE", page_size)
+        leads = write_leads(urls)
+        app = graph_main.create_workflow_graph(mode, checkpointer=MemorySaver(), order=order)
+        config = {
+            "recursion_limit": graph_main.run_recursion_limit(app),
+            "max_concurrency": 4,
+            "configurable": {"thread_id": run_id or "test"},
+        }
+        state = {
+            "run_id": run_id,
+            "lead_source": str(leads),
+            "leads_offset": 0,
+            "company_urls": [],
+            "lead_rows": {},
+            "current_index": 0,
+            "processing_complete": False,
+            "companies_processed": 0,
+            "errors": [],
+        }
+        return graph_main.run_workflow(app, state, config)
+
+    run.calls = calls
+    run.logged = logged
+    run.write_leads = write_leads
+    return run
+
+
+def test_sequential_run_is_not_bounded_by_a_single_recursion_limit(campaign):
+    # 1200 companies take about 11400 supersteps, past the old fixed limit of 10000
+    urls = company_urls(1200)
+    result = campaign(urls, page_size=500)
+
+    assert result["processing_complete"]
+    assert result["companies_processed"] == len(urls)
+    assert sorted(url for _, url in campaign.logged) == sorted(urls)
+
+
+def test_fan_out_finishes_every_company_exactly_once_within_the_concurrency_bound(campaign, monkeypatch):
+    lock = threading.Lock()
+    active = []
+    peak = []
+
+    def fetch(state):
+        with lock:
+            active.append(state["current_company_url"])
+            peak.append(len(active))
+        time.sleep(0.01)
+        with lock:
+            active.remove(state["current_company_url"])
+        return {"html_content": "<p>Hello</p>"}
+
+    monkeypatch.setattr(graph_main, "fetch_website", fetch)
+    urls = company_urls(25)
+    result = campaign(urls, mode="fan_out", page_size=10)
+
+    assert result["companies_processed"] == len(urls)
+    assert Counter(url for _, url in campaign.logged) == Counter(urls)
+    drafted = [url for name, url in campaign.calls if name == "draft"]
+    assert Counter(drafted) == Counter(url for url in urls if has_contacts(url))
+    assert 1 < max(peak) <= 4
+
+
+@pytest.mark.parametrize("mode", ["sequential", "fan_out"])
+def test_state_keeps_only_the_most_recent_errors(campaign, monkeypatch, mode):
+    monkeypatch.setattr(graph_main, "MAX_STATE_ERRORS", 5)
+    monkeypatch.setattr(graph_main, "fetch_website",
+                        lambda state: {"errors": [f"fetch failed for {state['current_company_url']}"]})
+    urls = company_urls(20)
+    result = campaign(urls, mode=mode)
+
+    assert len(result["errors"]) == 5
+    assert set(result["errors"]) <= {f"fetch failed for {url}" for url in urls}
+    if mode == "sequential":
+        assert result["errors"] == [f"fetch failed for {url}" for url in urls[-5:]]
+
+
+@pytest.mark.parametrize("mode", ["sequential", "fan_out"])
+def test_contacts_first_skips_fetch_and_summary_without_contacts(campaign, mode):
+    urls = company_urls(10)
+    campaign(urls, mode=mode, order="contacts_first")
+
+    with_contacts = Counter(url for url in urls if has_contacts(url))
+    for name in ("fetch", "extract", "summarize", "email", "draft"):
+        assert Counter(url for node, url in campaign.calls if node == name) == with_contacts
+    assert Counter(url for node, url in campaign.calls if node == "contacts") == Counter(urls)
+    assert sorted(campaign.logged) == sorted(
+        (graph_main.SUCCESS_LOG_RANGE if has_contacts(url) else graph_main.FAILURE_LOG_RANGE, url) for url in urls
+    )
+
+
+class SpeculativeFetcher:
+    """Website fetcher whose speculative fetches finish only for companies with contacts"""
+
+    def __init__(self):
+        self.submitted = {}
+        self.fetched = []
+
+    def submit(self, url, headers=None, timeout=None):
+        future = Future()
+        if has_contacts(url):
+            future.set_result(FetchResult(url=url, status_code=200, text="<p>Hello</p>", content=b"<p>Hello</p>"))
+        self.submitted[url] = future
+        return future
+
+    def fetch(self, url, headers=None, timeout=None):
+        self.fetched.append(url)
+        return FetchResult(url=url, status_code=200, text="<p>Hello</p>", content=b"<p>Hello</p>")
+
+
+@pytest.mark.parametrize("mode", ["sequential", "fan_out"])
+def test_speculative_fetch_is_used_with_contacts_and_cancelled_without(campaign, monkeypatch, mode):
+    fetcher = SpeculativeFetcher()
+    monkeypatch.setattr(graph_main, "fetch_website", REAL_FETCH_WEBSITE)
+    monkeypatch.setattr(graph_main, "get_website_fetcher", lambda: fetcher)
+    monkeypatch.setattr(graph_main, "SPECULATIVE_FETCH", True)
+    monkeypatch.setattr(graph_main, "HTTP_CACHE_ENABLED", False)
+    monkeypatch.setattr(graph_main, "ADAPTIVE_CONCURRENCY", False)
+    urls = company_urls(10)
+    campaign(urls, mode=mode, order="contacts_first")
+
+    assert sorted(fetcher.submitted) == sorted(urls)
+    assert fetcher.fetched == []  # Every company with contacts used its speculative fetch
+    for url, future in fetcher.submitted.items():
+        assert future.cancelled() == (not has_contacts(url))
+    assert not graph_main._speculative_fetches
+
+
+def test_pruned_run_keeps_only_the_latest_checkpoint(campaign, tmp_path, monkeypatch):
+    monkeypatch.setattr(graph_main, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(graph_main, "HUNTER_API_KEY", "test")
+    monkeypatch.setattr(graph_main, "EXECUTION_MODE", "sequential")
+    urls = company_urls(30)
+    graph_main.main(["--run-id", "pruned", "--leads", str(campaign.write_leads(urls))])
+
+    conn = sqlite3.connect(graph_main.CHECKPOINT_DB_PATH)
+    assert conn.execute("SELECT COUNT(*) FROM checkpoints WHERE thread_id = 'pruned'").fetchone()[0] == 1
+    conn.close()
+    assert Counter(url for _, url in campaign.logged) == Counter(urls)
+
+
+def test_resumed_company_gets_a_new_deadline(campaign, monkeypatch):
+    urls = company_urls(6)
+    crashed = []
+
+    def fetch(state):
+        if state["current_company_url"] == urls[2] and not crashed:
+            crashed.append(True)
+            raise RuntimeError("simulated crash")
+        return {"html_content": "<p>Hello</p>"}
+
+    monkeypatch.setattr(graph_main, "fetch_website", fetch)
+    monkeypatch.setattr(graph_main, "OPENAI_API_KEY", "test")
+    monkeypatch.setattr(graph_main, "HUNTER_API_KEY", "test")
+    monkeypatch.setattr(graph_main, "EXECUTION_MODE", "sequential")
+    monkeypatch.setattr(graph_main, "COMPANY_DEADLINE_SECONDS", 0.5)
+    leads = str(campaign.write_leads(urls))
+
+    with pytest.raises(RuntimeError):
+        graph_main.main(["--run-id", "crash", "--leads", leads])
+    time.sleep(0.6)  # Down for longer than the company deadline
+    graph_main.main(["--resume", "crash", "--leads", leads])
+
+    assert Counter(url for _, url in campaign.logged) == Counter(urls)
+    assert (graph_main.SUCCESS_LOG_RANGE, urls[2]) in campaign.logged
+
+
+class FakeGmail:
+    """users().drafts() of the Gmail API, finding drafts by their Message-ID"""
+
+    def __init__(self):
+        self.drafts_by_message_id = {}
+        self.searches = 0
+        self.lose_response = False
+
+    def users(self):
+        return self
+
+    def drafts(self):
+        return self
+
+    def create(self, userId, body):
+        def execute():
+            message = email.message_from_bytes(base64.urlsafe_b64decode(body["message"]["raw"]))
+            draft_id = f"draft{len(self.drafts_by_message_id) + 1}"
+            self.drafts_by_message_id[message["Message-ID"]] = draft_id
+            if self.lose_response:
+                raise ConnectionResetError("connection lost after the draft was created")
+            return {"id": draft_id}
+        return SimpleNamespace(execute=execute)
+
+    def list(self, userId, q, maxResults):
+        def execute():
+            self.searches += 1
+            message_id = "<" + q.split(":", 1)[1] + ">"
+            draft_id = self.drafts_by_message_id.get(message_id)
+            return {"drafts": [{"id": draft_id}]} if draft_id else {}
+        return SimpleNamespace(execute=execute)
+
+
+def test_draft_created_before_a_failure_is_found_instead_of_created_again(tmp_path, monkeypatch):
+    gmail = FakeGmail()
+    monkeypatch.setattr(graph_main, "get_google_service", lambda api, version: gmail)
+    monkeypatch.setattr(graph_main, "GMAIL_DRAFT_MODE", "single")
+    monkeypatch.setattr(graph_main, "CHECKPOINT_DB_PATH", str(tmp_path / "checkpoints.sqlite3"))
+    monkeypatch.setattr(graph_main, "_completion_ledger", None)
+    state = {
+        "run_id": "drafts",
+        "current_company_url": "https://company0.com",
+        "target_email": "ceo@company0.com",
+        "email_subject": "Hi",
+        "email_body": "Hello",
+    }
+
+    gmail.lose_response = True
+    assert graph_main.create_gmail_draft(state)["errors"]
+    assert gmail.searches == 0  # Nothing to look for on the first attempt
+
+    gmail.lose_response = False
+    assert graph_main.create_gmail_draft(state) == {"draft_id": "draft1"}
+    assert len(gmail.drafts_by_message_id) == 1
+    assert graph_main.get_completion_ledger().draft_id("drafts", "https://company0.com") == "draft1"
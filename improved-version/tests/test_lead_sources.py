@@ -0,0 +1,28 @@
+from lead_sources import GoogleSheetsLeadSource
+
+def sheet(values):
+    """read_range over a one-column sheet given as a list of cell values (None for a blank row)"""
+    def read_range(range_name):
+        first, last = (int(cell.lstrip("A")) for cell in range_name.split("!")[1].split(":"))
+        rows = [[value] if value else [] for value in values[first - 1:last]]
+        while rows and not rows[-1]:
+            rows.pop()  # Like the API, trailing blank rows are left out
+        return rows
+    return read_range
+
+def test_blank_rows_do_not_end_the_lead_list():
+    values = ["https://a.com", None, None, None, None, "https://b.com", None, None]
+    source = GoogleSheetsLeadSource(sheet(values), row_count=lambda name: len(values))
+    pages = list(source.pages(2))
+    assert [url for page in pages for url in page.urls] == ["https://a.com", "https://b.com"]
+    assert pages[-1].next_offset == 6
+
+def test_without_row_count_reading_stops_at_the_first_empty_range():
+    values = ["https://a.com", None, None, None, "https://b.com"]
+    pages = list(GoogleSheetsLeadSource(sheet(values)).pages(2))
+    assert [url for page in pages for url in page.urls] == ["https://a.com"]
+
+def test_pages_resume_from_an_offset():
+    values = ["https://a.com", "https://b.com", "https://c.com"]
+    source = GoogleSheetsLeadSource(sheet(values), row_count=lambda name: len(values))
+    assert [page.urls for page in source.pages(2, start_offset=2)] == [["https://c.com"]]
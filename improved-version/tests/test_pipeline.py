@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import DONE, Stage, StagedPipeline, parse_stage_workers
+
+def test_parse_stage_workers():
+    assert parse_stage_workers("fetch=8, summarize=4,") == {"fetch": 8, "summarize": 4}
+    with pytest.raises(ValueError):
+        parse_stage_workers("fetch=many")
+
+def test_invalid_pipelines_are_rejected():
+    with pytest.raises(ValueError):
+        StagedPipeline([])
+    with pytest.raises(ValueError):
+        StagedPipeline([Stage("a", lambda item: None), Stage("a", lambda item: None)])
+    with pytest.raises(ValueError):
+        StagedPipeline([Stage("a", lambda item: None, workers=0)])
+
+def test_items_pass_through_every_stage():
+    pipeline = StagedPipeline([
+        Stage("double", lambda item: item.append(item[0] * 2), workers=2),
+        Stage("negate", lambda item: item.append(-item[1]), workers=3),
+    ])
+    finished = pipeline.run([[number] for number in range(50)])
+    pipeline.close()
+    assert sorted(finished) == [[number, number * 2, -number * 2] for number in range(50)]
+    stats = pipeline.snapshot()
+    assert stats["double"]["processed"] == 50 and stats["negate"]["processed"] == 50
+
+def test_stages_can_skip_ahead_or_finish_early():
+    visited = []
+    lock = threading.Lock()
+
+    def visit(name, target=None):
+        def fn(item):
+            with lock:
+                visited.append((item, name))
+            return target(item) if target else None
+        return fn
+
+    pipeline = StagedPipeline([
+        Stage("a", visit("a", lambda item: DONE if item == 0 else ("c" if item == 1 else None))),
+        Stage("b", visit("b")),
+        Stage("c", visit("c")),
+    ])
+    pipeline.run([0, 1, 2])
+    pipeline.close()
+    assert sorted(visited) == [(0, "a"), (1, "a"), (1, "c"), (2, "a"), (2, "b"), (2, "c")]
+
+def test_stage_errors_end_only_that_item():
+    errors = []
+
+    def fail_on_odd(item):
+        if item % 2:
+            raise RuntimeError(f"odd {item}")
+
+    pipeline = StagedPipeline(
+        [Stage("check", fail_on_odd), Stage("after", lambda item: None)],
+        on_error=lambda item, stage, error: errors.append((item, stage)),
+    )
+    assert sorted(pipeline.run(range(6))) == list(range(6))
+    pipeline.close()
+    assert sorted(errors) == [(1, "check"), (3, "check"), (5, "check")]
+    assert pipeline.snapshot()["after"]["processed"] == 3
+
+def test_handing_an_item_backwards_is_an_error():
+    errors = []
+    pipeline = StagedPipeline(
+        [Stage("a", lambda item: None), Stage("b", lambda item: "a")],
+        on_error=lambda item, stage, error: errors.append(stage),
+    )
+    assert pipeline.run([1]) == [1]
+    pipeline.close()
+    assert errors == ["b"]
+
+def test_full_queues_hold_back_earlier_stages():
+    release = threading.Event()
+    pipeline = StagedPipeline([
+        Stage("fast", lambda item: None),
+        Stage("slow", lambda item: release.wait(5), queue_size=1),
+    ])
+    runner = threading.Thread(target=pipeline.run, args=(range(10),))
+    runner.start()
+    time.sleep(0.2)
+    stats = pipeline.snapshot()
+    assert stats["slow"]["max_queued"] <= 1
+    assert stats["fast"]["processed"] < 10  # Blocked handing items to "slow"
+    release.set()
+    runner.join(5)
+    pipeline.close()
+    assert pipeline.snapshot()["slow"]["processed"] == 10
+
+def test_interrupt_in_a_stage_is_raised_by_run_after_draining():
+    def interrupt(item):
+        if item == 3:
+            raise KeyboardInterrupt
+
+    pipeline = StagedPipeline([Stage("a", interrupt, workers=2)])
+    with pytest.raises(KeyboardInterrupt):
+        pipeline.run(range(100))
+    assert pipeline.run([1]) == [1]  # Usable again
+    pipeline.close()
+    with pytest.raises(RuntimeError):
+        pipeline.run([1])
@@ -0,0 +1,101 @@
+import time
+from email.utils import formatdate
+
+import pytest
+
+from rate_limiter import RateLimiterRegistry, TokenBucket, call_rate_limited, parse_retry_after
+from resilience import CircuitBreaker, CircuitOpenError
+
+class RateLimited(Exception):
+    def __init__(self, retry_after):
+        self.retry_after = retry_after
+
+def retry_after_of(error):
+    return error.retry_after if isinstance(error, RateLimited) else None
+
+def test_bucket_hands_out_its_burst_then_refills():
+    bucket = TokenBucket("test", rate=20, capacity=2)
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == 0
+    waited = bucket.acquire()
+    assert 0.03 <= waited <= 0.2
+
+def test_oversized_requests_are_clamped_to_capacity():
+    bucket = TokenBucket("test", rate=100, capacity=5)
+    assert bucket.acquire(50) == 0
+    assert bucket.snapshot()["available"] < 1
+
+def test_refund_is_capped_at_capacity():
+    bucket = TokenBucket("test", rate=0.001, capacity=5)
+    bucket.acquire(3)
+    bucket.refund(10)
+    assert bucket.snapshot()["available"] == 5
+
+def test_pause_drains_and_blocks_the_bucket():
+    bucket = TokenBucket("test", rate=1000, capacity=10)
+    bucket.pause(0.1)
+    assert bucket.snapshot()["paused_for"] > 0
+    started = time.monotonic()
+    bucket.acquire()
+    assert time.monotonic() - started >= 0.09
+
+def test_invalid_bucket_is_rejected():
+    with pytest.raises(ValueError):
+        TokenBucket("test", rate=0, capacity=1)
+
+def test_registry_converts_per_minute_quotas():
+    registry = RateLimiterRegistry()
+    registry.configure("hunter", per_minute=120)
+    assert registry.get("hunter").rate == 2
+    assert registry.snapshot()["hunter"]["capacity"] == 2
+
+@pytest.mark.parametrize("value, expected", [(None, None), ("", None), ("12", 12.0), ("-3", 0.0), ("soon", None)])
+def test_parse_retry_after(value, expected):
+    assert parse_retry_after(value) == expected
+
+def test_parse_retry_after_http_date():
+    assert 50 <= parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+
+def test_rate_limited_calls_pause_the_bucket_and_retry():
+    bucket = TokenBucket("test", rate=1000, capacity=10)
+    calls = []
+
+    def limited_once():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            raise RateLimited(0.1)
+        return "ok"
+
+    assert call_rate_limited(limited_once, [(bucket, 1)], retry_after_of) == "ok"
+    assert calls[1] - calls[0] >= 0.09
+
+def test_rate_limit_errors_give_up_after_max_attempts():
+    bucket = TokenBucket("test", rate=1000, capacity=10)
+    calls = []
+
+    def always_limited():
+        calls.append(1)
+        raise RateLimited(0.01)
+
+    with pytest.raises(RateLimited):
+        call_rate_limited(always_limited, [(bucket, 1)], retry_after_of, max_attempts=2)
+    assert len(calls) == 2
+
+def test_other_errors_propagate_without_retry():
+    calls = []
+
+    def broken():
+        calls.append(1)
+        raise KeyError("bad")
+
+    with pytest.raises(KeyError):
+        call_rate_limited(broken, [(TokenBucket("test", rate=1000, capacity=10), 1)], retry_after_of)
+    assert len(calls) == 1
+
+def test_tokens_are_refunded_when_the_breaker_rejects_the_call():
+    bucket = TokenBucket("test", rate=0.001, capacity=5)
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=60)
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        call_rate_limited(lambda: "ok", [(bucket, 3)], retry_after_of, breaker=breaker)
+    assert bucket.snapshot()["available"] == 5
@@ -0,0 +1,140 @@
+import time
+
+import pytest
+
+from rate_limiter import TokenBucket, call_rate_limited
+from resilience import (
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    deadline_scope,
+    is_transient,
+    retry_call,
+    time_left,
+)
+
+class ServerError(Exception):
+    status_code = 503
+
+class ClientError(Exception):
+    status_code = 404
+
+def trip(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_breaker_opens_after_threshold_and_fails_fast():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=60)
+    trip(breaker)
+    assert breaker.snapshot()["state"] == OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_half_open_allows_one_trial_and_closes_on_success():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.snapshot()["state"] == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.snapshot() == {"state": CLOSED, "consecutive_failures": 0}
+
+def test_failed_trial_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.snapshot()["state"] == OPEN
+
+def test_stuck_trial_expires():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    breaker.before_call()  # Trial that never reports back
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    time.sleep(0.06)
+    breaker.before_call()
+    assert breaker.snapshot()["state"] == HALF_OPEN
+
+def test_deadline_before_call_keeps_trial_slot_free():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    bucket = TokenBucket("test", rate=100, capacity=10)
+    with deadline_scope(time.time() - 1):
+        with pytest.raises(DeadlineExceeded):
+            call_rate_limited(lambda: "ok", [(bucket, 1)], lambda e: None, breaker=breaker)
+    assert call_rate_limited(lambda: "ok", [(bucket, 1)], lambda e: None, breaker=breaker) == "ok"
+    assert breaker.snapshot()["state"] == CLOSED
+
+def test_interrupted_trial_releases_slot():
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout=0.05)
+    trip(breaker)
+    time.sleep(0.06)
+    bucket = TokenBucket("test", rate=100, capacity=10)
+
+    def interrupted():
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        call_rate_limited(interrupted, [(bucket, 1)], lambda e: None, breaker=breaker)
+    assert call_rate_limited(lambda: "ok", [(bucket, 1)], lambda e: None, breaker=breaker) == "ok"
+
+def test_transient_errors_of_idempotent_calls_are_retried():
+    bucket = TokenBucket("test", rate=1000, capacity=10)
+    breaker = CircuitBreaker("test", failure_threshold=5)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ServerError()
+        return "ok"
+
+    assert call_rate_limited(flaky, [(bucket, 1)], lambda e: None, breaker=breaker, idempotent=True) == "ok"
+    assert len(calls) == 3
+    assert breaker.snapshot()["state"] == CLOSED
+
+def test_client_errors_are_not_retried_or_counted():
+    bucket = TokenBucket("test", rate=1000, capacity=10)
+    breaker = CircuitBreaker("test", failure_threshold=1)
+
+    def missing():
+        raise ClientError()
+
+    with pytest.raises(ClientError):
+        call_rate_limited(missing, [(bucket, 1)], lambda e: None, breaker=breaker, idempotent=True)
+    assert breaker.snapshot() == {"state": CLOSED, "consecutive_failures": 0}
+
+def test_is_transient():
+    assert is_transient(ServerError())
+    assert is_transient(TimeoutError())
+    assert not is_transient(ClientError())
+    assert not is_transient(DeadlineExceeded())
+
+def test_retry_call_gives_up_after_max_attempts():
+    calls = []
+
+    def failing():
+        calls.append(1)
+        raise ConnectionError()
+
+    with pytest.raises(ConnectionError):
+        retry_call(failing, max_attempts=2, base_delay=0.001)
+    assert len(calls) == 2
+
+def test_time_left_is_capped_by_deadline():
+    assert time_left(5.0) == 5.0
+    with deadline_scope(time.time() + 1):
+        assert time_left(5.0) <= 1
+    with deadline_scope(time.time() - 1):
+        with pytest.raises(DeadlineExceeded):
+            time_left(5.0)
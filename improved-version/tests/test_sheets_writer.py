@@ -0,0 +1,158 @@
+import json
+import os
+import threading
+
+import pytest
+
+from sheets_writer import SheetsLogBuffer, append_cells_request, sheet_title
+
+class Sheet:
+    """Records every batch written; fails while ``failing`` is set"""
+
+    def __init__(self):
+        self.batches = []
+        self.failing = False
+        self.lock = threading.Lock()
+
+    def write(self, rows_by_range):
+        if self.failing:
+            raise RuntimeError("Sheets is down")
+        with self.lock:
+            self.batches.append(rows_by_range)
+
+    def rows(self):
+        return [(range_name, row) for batch in self.batches for range_name, rows in batch.items() for row in rows]
+
+def journal_rows(path):
+    with open(path, encoding="utf-8") as journal:
+        return [json.loads(line) for line in journal]
+
+@pytest.fixture
+def journal(tmp_path):
+    return str(tmp_path / "journal.jsonl")
+
+def test_rows_are_journaled_and_flushed_in_one_batch(journal):
+    sheet = Sheet()
+    buffer = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    buffer.add("Sheet1!A:C", ["a.com", "x@a.com", "drafted"])
+    buffer.add("Failures!A:A", ["b.com"])
+    assert len(journal_rows(journal)) == 2
+    assert buffer.flush()
+    assert sheet.batches == [{"Sheet1!A:C": [["a.com", "x@a.com", "drafted"]], "Failures!A:A": [["b.com"]]}]
+    assert journal_rows(journal) == []
+    buffer.close()
+
+def test_failed_flush_keeps_rows_pending(journal):
+    sheet = Sheet()
+    buffer = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    buffer.add("Failures!A:A", ["b.com"])
+    sheet.failing = True
+    assert not buffer.flush()
+    assert buffer.pending_count() == 1
+    sheet.failing = False
+    buffer.close()
+    assert sheet.rows() == [("Failures!A:A", ["b.com"])]
+
+def test_unflushed_rows_are_replayed_after_a_crash(journal):
+    sheet = Sheet()
+    sheet.failing = True
+    crashed = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    crashed.add("Failures!A:A", ["a.com"])
+    crashed.add("Failures!A:A", ["b.com"])
+    with open(journal, "a", encoding="utf-8") as torn:
+        torn.write('{"range": "Failures!A:A", "ro')  # Crash mid-write
+    sheet.failing = False
+    # Simulate the process dying: nothing flushed, its journal lock released
+    crashed._closed = True
+    crashed._journal_lock.close()
+
+    restarted = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    assert restarted.pending_count() == 2
+    restarted.close()
+    assert sheet.rows() == [("Failures!A:A", ["a.com"]), ("Failures!A:A", ["b.com"])]
+    assert journal_rows(journal) == []
+
+def test_rows_added_during_a_flush_stay_in_the_compacted_journal(journal):
+    written = threading.Event()
+    release = threading.Event()
+    batches = []
+
+    def slow_write(rows_by_range):
+        batches.append(rows_by_range)
+        written.set()
+        release.wait(5)
+
+    buffer = SheetsLogBuffer(slow_write, journal, flush_rows=100, flush_interval=60)
+    buffer.add("Failures!A:A", ["a.com"])
+    flusher = threading.Thread(target=buffer.flush)
+    flusher.start()
+    assert written.wait(5)
+    buffer.add("Failures!A:A", ["b.com"])
+    release.set()
+    flusher.join()
+    assert journal_rows(journal) == [{"range": "Failures!A:A", "row": ["b.com"]}]
+    assert buffer.pending_count() == 1
+    buffer.close()
+    assert batches[-1] == {"Failures!A:A": [["b.com"]]}
+
+def test_background_writer_flushes_full_batches(journal):
+    sheet = Sheet()
+    buffer = SheetsLogBuffer(sheet.write, journal, flush_rows=2, flush_interval=60)
+    buffer.add("Failures!A:A", ["a.com"])
+    buffer.add("Failures!A:A", ["b.com"])
+    for _ in range(100):
+        if sheet.batches:
+            break
+        threading.Event().wait(0.05)
+    assert sheet.rows() == [("Failures!A:A", ["a.com"]), ("Failures!A:A", ["b.com"])]
+    buffer.close()
+
+def test_add_after_close_fails(journal):
+    buffer = SheetsLogBuffer(Sheet().write, journal, flush_rows=100, flush_interval=60)
+    buffer.close()
+    with pytest.raises(RuntimeError):
+        buffer.add("Failures!A:A", ["a.com"])
+
+def test_helpers():
+    assert sheet_title("'Failures'!A:A") == "Failures"
+    request = append_cells_request(7, [["a", 1]])
+    assert request["appendCells"]["sheetId"] == 7
+    assert request["appendCells"]["rows"][0]["values"][1] == {"userEnteredValue": {"stringValue": "1"}}
+
+def test_processes_sharing_a_journal_path_get_their_own_slots(journal):
+    sheet = Sheet()
+    first = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    second = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    first.add("Failures!A:A", ["a.com"])
+    second.add("Failures!A:A", ["b.com"])
+    assert journal_rows(journal) == [{"range": "Failures!A:A", "row": ["a.com"]}]
+    assert journal_rows(journal + ".1") == [{"range": "Failures!A:A", "row": ["b.com"]}]
+
+    # A restarted first process must not replay the rows of the one still running
+    first._closed = True
+    first._journal_lock.close()
+    restarted = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    assert restarted.pending_count() == 1
+    restarted.close()
+    second.close()
+    assert sorted(sheet.rows()) == [("Failures!A:A", ["a.com"]), ("Failures!A:A", ["b.com"])]
+
+def test_journals_of_stopped_processes_are_taken_over(journal):
+    sheet = Sheet()
+    sheet.failing = True
+    running = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    for domain in ("b.com", "c.com"):
+        stopped = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+        stopped.add("Failures!A:A", [domain])
+        stopped._closed = True
+        stopped._journal_lock.close()
+    sheet.failing = False
+
+    # Takes the first free slot and the rows of the other one
+    restarted = SheetsLogBuffer(sheet.write, journal, flush_rows=100, flush_interval=60)
+    assert restarted.pending_count() == 2
+    assert not os.path.exists(journal + ".2")
+    restarted.close()
+    running.close()
+    assert sheet.rows() == [("Failures!A:A", ["b.com"]), ("Failures!A:A", ["c.com"])]
+    assert journal_rows(journal + ".1") == []
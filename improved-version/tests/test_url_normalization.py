@@ -0,0 +1,60 @@
+from types import SimpleNamespace
+
+import pytest
+
+import url_normalization
+from url_normalization import group_by_domain, registrable_domain
+
+@pytest.fixture
+def without_tldextract(monkeypatch):
+    monkeypatch.setattr(url_normalization, "tldextract", None)
+    monkeypatch.setattr(url_normalization, "_extractor", None)
+
+@pytest.mark.parametrize("url, domain", [
+    ("https://acme.com/about", "acme.com"),
+    ("http://www.acme.com/", "acme.com"),
+    ("WWW.Acme.COM", "acme.com"),
+    ("https://www.acme.co.uk", "acme.co.uk"),
+    ("http://10.0.0.1:8080/", "10.0.0.1"),
+    ("", ""),
+])
+def test_registrable_domain(url, domain):
+    assert registrable_domain(url) == domain
+
+@pytest.mark.parametrize("url", [
+    "https://alpha.github.io",
+    "https://store.myshopify.com",
+    "http://news.blogspot.com",
+    "https://x.com.de",
+])
+def test_private_suffix_hosts_are_not_merged_with_their_parent(without_tldextract, url):
+    assert registrable_domain(url) == url.split("//")[1]
+
+def test_fallback_keeps_subdomains_apart(without_tldextract):
+    groups = group_by_domain(["https://alpha.github.io", "https://beta.github.io/", "https://shop.acme.com"])
+    assert [group.domain for group in groups] == ["alpha.github.io", "beta.github.io", "shop.acme.com"]
+
+def test_fallback_merges_www(without_tldextract):
+    groups = group_by_domain(["http://www.acme.co.uk/", "https://acme.co.uk/about"])
+    assert [(group.domain, group.url) for group in groups] == [("acme.co.uk", "http://www.acme.co.uk")]
+
+def test_group_prefers_homepage_then_https():
+    groups = group_by_domain(["http://acme.com/about/team", "http://acme.com/", "https://acme.com"])
+    assert len(groups) == 1
+    assert groups[0].url == "https://acme.com"
+    assert groups[0].rows == ["http://acme.com/about/team", "http://acme.com/", "https://acme.com"]
+
+def test_group_prefers_the_domain_over_a_subdomain(monkeypatch):
+    # Stand-in for tldextract, which merges subdomains
+    def extract(host):
+        labels = host.split(".")
+        return SimpleNamespace(domain=labels[-2], suffix=labels[-1])
+
+    monkeypatch.setattr(url_normalization, "_get_extractor", lambda: extract)
+    groups = group_by_domain(["https://shop.acme.com", "http://acme.com/about"])
+    assert [(group.domain, group.url) for group in groups] == [("acme.com", "http://acme.com/about")]
+
+def test_groups_keep_order_of_first_appearance():
+    groups = group_by_domain(["https://b.com", "https://a.com", "https://www.b.com/x"])
+    assert [group.domain for group in groups] == ["b.com", "a.com"]
+    assert groups[0].rows == ["https://b.com", "https://www.b.com/x"]
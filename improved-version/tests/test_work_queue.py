@@ -0,0 +1,128 @@
+import threading
+import time
+
+import pytest
+
+from work_queue import LeaseLost, SQLiteWorkQueue, run_worker
+
+@pytest.fixture
+def work_queue(tmp_path):
+    return SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"), "campaign", max_attempts=2)
+
+def test_enqueue_skips_known_keys_and_keeps_order(work_queue):
+    assert work_queue.enqueue([("a", {"index": 0}), ("b", {"index": 1})]) == 2
+    assert work_queue.enqueue([("b", {"index": 9}), ("c", {"index": 2})]) == 1
+    leased = [work_queue.lease("w", 60) for _ in range(3)]
+    assert [(lease.key, lease.payload["index"]) for lease in leased] == [("a", 0), ("b", 1), ("c", 2)]
+    assert work_queue.lease("w", 60) is None
+
+def test_campaigns_are_separate(tmp_path, work_queue):
+    other = SQLiteWorkQueue(str(tmp_path / "queue.sqlite3"), "other")
+    work_queue.enqueue([("a", {})])
+    assert other.lease("w", 60) is None
+
+def test_ack_completes_the_item(work_queue):
+    work_queue.enqueue([("a", {})])
+    work_queue.seal()
+    lease = work_queue.lease("w", 60)
+    assert not work_queue.drained()
+    assert work_queue.ack(lease, {"status": "succeeded"})
+    assert work_queue.results() == {"a": {"status": "succeeded"}}
+    assert work_queue.counts() == {"queued": 0, "done": 1, "dead": 0, "sealed": 1}
+    assert work_queue.drained()
+
+def test_unsealed_campaign_is_not_drained(work_queue):
+    assert not work_queue.drained()
+
+def test_expired_lease_is_redelivered_and_fenced(work_queue):
+    work_queue.enqueue([("a", {})])
+    stale = work_queue.lease("w1", 0.05)
+    time.sleep(0.06)
+    current = work_queue.lease("w2", 60)
+    assert current.key == "a" and current.attempt == 2 and current.token != stale.token
+    assert not work_queue.extend(stale, 60)
+    assert not work_queue.ack(stale, {"status": "stale"})
+    work_queue.release(stale)  # No effect on the current holder
+    assert work_queue.lease("w3", 60) is None
+    assert work_queue.ack(current, {"status": "current"})
+    assert work_queue.results() == {"a": {"status": "current"}}
+
+def test_extend_keeps_the_item_leased(work_queue):
+    work_queue.enqueue([("a", {})])
+    lease = work_queue.lease("w", 0.05)
+    assert work_queue.extend(lease, 60)
+    time.sleep(0.06)
+    assert work_queue.lease("w", 60) is None
+
+def test_release_makes_the_item_visible_after_the_delay(work_queue):
+    work_queue.enqueue([("a", {})])
+    lease = work_queue.lease("w", 60)
+    work_queue.release(lease, delay=0.05)
+    assert work_queue.lease("w", 60) is None
+    time.sleep(0.06)
+    assert work_queue.lease("w", 60).key == "a"
+
+def test_items_are_dead_lettered_after_max_attempts(work_queue):
+    work_queue.enqueue([("a", {})])
+    work_queue.seal()
+    for _ in range(2):
+        work_queue.release(work_queue.lease("w", 60))
+    assert work_queue.lease("w", 60) is None
+    assert work_queue.counts()["dead"] == 1
+    assert work_queue.drained()
+
+def test_draft_claims_are_fenced_by_the_lease(work_queue):
+    work_queue.enqueue([("a", {})])
+    first = work_queue.lease("w1", 0.05)
+    claim = work_queue.claim_draft("a", first.token)
+    assert claim.draft_id is None and not claim.previously_claimed
+    assert not work_queue.claim_draft("a", first.token).previously_claimed  # Same lease claiming again
+
+    time.sleep(0.06)
+    with pytest.raises(LeaseLost):
+        work_queue.claim_draft("a", first.token)
+    second = work_queue.lease("w2", 60)
+    claim = work_queue.claim_draft("a", second.token)
+    assert claim.previously_claimed  # The first worker may have created the draft
+
+    work_queue.record_draft("a", "draft-1")
+    assert work_queue.claim_draft("a", second.token).draft_id == "draft-1"
+
+def test_run_worker_processes_every_item(work_queue):
+    work_queue.enqueue((f"item-{index}", {"index": index}) for index in range(20))
+    work_queue.seal()
+    seen = []
+    lock = threading.Lock()
+
+    def handle(lease):
+        with lock:
+            seen.append(lease.key)
+        return {"index": lease.payload["index"]}
+
+    totals = run_worker(work_queue, handle, threads=4, visibility_timeout=60, poll_interval=0.01)
+    assert totals == {"acked": 20, "failed": 0, "lost": 0}
+    assert sorted(seen) == sorted(f"item-{index}" for index in range(20))
+    assert len(work_queue.results()) == 20
+
+def test_run_worker_retries_failed_items_then_dead_letters_them(work_queue):
+    work_queue.enqueue([("good", {}), ("bad", {})])
+    work_queue.seal()
+
+    def handle(lease):
+        if lease.key == "bad":
+            raise RuntimeError("boom")
+        return {"status": "succeeded"}
+
+    totals = run_worker(work_queue, handle, threads=2, visibility_timeout=60, poll_interval=0.01, retry_delay=0)
+    assert totals == {"acked": 1, "failed": 2, "lost": 0}
+    assert work_queue.counts() == {"queued": 0, "done": 1, "dead": 1, "sealed": 1}
+
+def test_run_worker_releases_items_on_interrupt(work_queue):
+    work_queue.enqueue([("a", {})])
+
+    def handle(lease):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        run_worker(work_queue, handle, visibility_timeout=60, poll_interval=0.01)
+    assert work_queue.lease("w", 60).key == "a"
@@ -0,0 +1,201 @@
+"""
+Fast HTML-to-text extraction with a character budget
+
+With lxml installed the page is fed to a SAX-style parser in chunks and text
+is collected from <body> in document order, one line per block element;
+parsing stops as soon as the character budget is reached, so the tail of a
+multi-megabyte page is never parsed. Navigation, footers, asides and cookie
+banners are skipped like scripts, so the budget goes to the main content.
+Without lxml it falls back to BeautifulSoup's html.parser.
+
+ExtractionPool runs extract_text in worker processes so parsing scales
+across cores instead of competing for the GIL with the threads doing network
+I/O; only the page bytes and the budget are sent to a worker.
+"""
+
+import logging
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional, Union
+
+try:
+    from lxml import etree
+    LXML_AVAILABLE = True
+except ImportError:  # Optional dependency; BeautifulSoup fallback below
+    etree = None
+    LXML_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Elements whose content is never visible text
+SKIP_TAGS = {"script", "style", "noscript", "template", "svg", "head"}
+
+# Page chrome rather than content: skipped by tag, ARIA role or id/class
+BOILERPLATE_TAGS = {"nav", "footer", "aside"}
+BOILERPLATE_ROLES = {"navigation", "contentinfo", "complementary"}
+BOILERPLATE_ID_CLASS = re.compile(r"cookie|consent|gdpr", re.IGNORECASE)
+
+# Elements that start a new line of text
+BLOCK_TAGS = {
+    "address", "article", "blockquote", "br", "dd", "div", "dl", "dt", "figcaption", "h1", "h2", "h3",
+    "h4", "h5", "h6", "header", "hr", "li", "main", "ol", "p", "pre", "section", "table", "td", "th",
+    "tr", "ul",
+}
+
+def is_skipped(tag: str, attrib) -> bool:
+    """True for elements whose text is never part of the main content"""
+    if tag in SKIP_TAGS or tag in BOILERPLATE_TAGS:
+        return True
+    if (attrib.get("role") or "").lower() in BOILERPLATE_ROLES:
+        return True
+    return bool(BOILERPLATE_ID_CLASS.search(f"{attrib.get('id') or ''} {attrib.get('class') or ''}"))
+
+# Feed size for the incremental parser
+CHUNK_SIZE = 16 * 1024
+
+# ============================================================================
+# LXML STREAMING EXTRACTOR
+# ============================================================================
+
+class _TextCollector:
+    """lxml parser target that keeps visible body text until the budget is spent"""
+
+    def __init__(self, max_chars: int):
+        self.max_chars = max_chars
+        self.lines: List[str] = []
+        self.parts: List[str] = []  # Text of the line being collected
+        self.length = 0
+        self.skipped: List[bool] = []  # Per open element: does it start a skipped subtree
+        self.skip_depth = 0
+        self.done = False
+
+    def _end_line(self):
+        if self.parts:
+            self.lines.append(" ".join(self.parts))
+            self.parts = []
+
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        skipped = is_skipped(tag, attrib)
+        self.skipped.append(skipped)
+        self.skip_depth += skipped
+        if tag in BLOCK_TAGS:
+            self._end_line()
+
+    def end(self, tag):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        if self.skipped and self.skipped.pop():
+            self.skip_depth -= 1
+        if tag in BLOCK_TAGS:
+            self._end_line()
+
+    def data(self, data):
+        if self.done or self.skip_depth:
+            return
+        text = " ".join(data.split())
+        if not text:
+            return
+        self.parts.append(text)
+        self.length += len(text) + 1
+        if self.length >= self.max_chars:
+            self.done = True
+
+    def comment(self, text):
+        pass
+
+    def close(self) -> str:
+        self._end_line()
+        return "\n".join(self.lines)
+
+def _extract_with_lxml(html: Union[str, bytes], max_chars: int, encoding: Optional[str]) -> str:
+    collector = _TextCollector(max_chars)
+    parser = etree.HTMLParser(
+        target=collector,
+        remove_comments=True,
+        encoding=encoding if isinstance(html, bytes) else None
+    )
+    for start in range(0, len(html), CHUNK_SIZE):
+        parser.feed(html[start:start + CHUNK_SIZE])
+        if collector.done:
+            break
+    try:
+        parser.close()
+    except etree.XMLSyntaxError:
+        pass  # Parsing stopped early or the markup was truncated
+    return collector.close()[:max_chars]
+
+# ============================================================================
+# FALLBACK
+# ============================================================================
+
+def _extract_with_beautifulsoup(html: Union[str, bytes], max_chars: int, encoding: Optional[str]) -> str:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser', from_encoding=encoding if isinstance(html, bytes) else None)
+
+    # Remove script and style elements, and the page chrome
+    for element in soup.find_all(lambda el: el.name != "head" and is_skipped(el.name, el.attrs)):
+        if not element.decomposed:
+            element.decompose()
+
+    # Mark block boundaries; newlines inside text nodes are just whitespace
+    for element in soup.find_all(sorted(BLOCK_TAGS)):
+        element.insert_before("\x00")
+        element.insert_after("\x00")
+
+    body = soup.find('body') or soup
+    lines = (" ".join(line.split()) for line in body.get_text().split("\x00"))
+    return "\n".join(line for line in lines if line)[:max_chars]
+
+# ============================================================================
+# PUBLIC API
+# ============================================================================
+
+def extract_text(html: Union[str, bytes], max_chars: int = 5000, encoding: Optional[str] = None) -> str:
+    """Visible main text of ``html``, at most ``max_chars`` long.
+
+    One line per block element, with whitespace collapsed within lines.
+
+    ``encoding`` is only used when ``html`` is raw bytes.
+    """
+    if not html:
+        return ""
+    if LXML_AVAILABLE:
+        return _extract_with_lxml(html, max_chars, encoding)
+    return _extract_with_beautifulsoup(html, max_chars, encoding)
+
+# ============================================================================
+# PROCESS POOL
+# ============================================================================
+
+class ExtractionPool:
+    """extract_text in a pool of ``workers`` processes.
+
+    Workers are started with forkserver (spawn where unavailable), never by
+    forking the multi-threaded parent. If the pool breaks, pages are
+    extracted in the calling thread instead.
+    """
+
+    def __init__(self, workers: int):
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+        self._broken = False
+
+    def extract(self, html: bytes, max_chars: int, encoding: Optional[str] = None) -> str:
+        """Visible text of ``html``, as extract_text, computed in a worker process"""
+        if not html:
+            return ""
+        if not self._broken:
+            try:
+                return self._executor.submit(extract_text, html, max_chars, encoding).result()
+            except BrokenProcessPool:
+                self._broken = True
+                logger.warning("Text extraction pool broke; extracting in-process from now on")
+        return extract_text(html, max_chars, encoding)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
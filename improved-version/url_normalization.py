@@ -0,0 +1,113 @@
+"""
+Lead URL normalization and grouping by registrable domain
+
+Lead lists often hold the same company several times (``https://acme.com``,
+``http://www.acme.com/``, ``https://acme.com/about``). group_by_domain folds
+the rows of a page into one LeadGroup per registrable domain, so each company
+is fetched, summarized and looked up once and its outcome is logged for every
+row of the group.
+
+The registrable domain (public suffix plus one label) comes from tldextract
+when it is installed, using its bundled copy of the Public Suffix List,
+private suffixes included. Without it only hosts that are certain to share a
+domain are merged: a leading ``www.`` is dropped, but any other subdomain is
+kept, since ``alpha.github.io`` and ``beta.github.io`` are different
+companies while ``shop.acme.com`` and ``acme.com`` are not, and only the full
+list tells them apart.
+"""
+
+from dataclasses import dataclass, field
+from typing import Dict, List
+from urllib.parse import urlsplit
+
+from caching import normalize_url
+
+try:
+    import tldextract
+except ImportError:
+    tldextract = None
+
+# Public suffixes with more than one label, for use without tldextract:
+# ``acme.co.uk`` is registrable, not ``co.uk``
+COMMON_MULTI_LABEL_SUFFIXES = {
+    "co.uk", "org.uk", "ac.uk", "gov.uk", "me.uk", "ltd.uk", "plc.uk",
+    "com.au", "net.au", "org.au", "edu.au", "gov.au",
+    "co.nz", "org.nz", "net.nz",
+    "co.jp", "ne.jp", "or.jp", "ac.jp",
+    "co.kr", "or.kr",
+    "co.in", "net.in", "org.in", "firm.in",
+    "co.za", "org.za",
+    "com.br", "net.br", "org.br",
+    "com.mx", "com.ar", "com.co", "com.sg", "com.hk", "com.tw", "com.cn", "com.tr", "com.my", "com.ph",
+    "co.il", "co.id", "co.th",
+}
+
+_extractor = None
+
+def _get_extractor():
+    """tldextract extractor that never downloads the suffix list (None without tldextract)"""
+    global _extractor
+    if _extractor is None and tldextract is not None:
+        _extractor = tldextract.TLDExtract(suffix_list_urls=(), include_psl_private_domains=True)
+    return _extractor
+
+def registrable_domain(url_or_host: str) -> str:
+    """Registrable domain of a URL or host name, e.g. ``shop.acme.co.uk`` -> ``acme.co.uk``.
+
+    Without tldextract, hosts below a domain (other than ``www.``) are
+    returned whole instead of guessing where the public suffix ends.
+    """
+    value = url_or_host.strip()
+    host = (urlsplit(value if "//" in value else f"//{value}").hostname or "").rstrip(".")
+    if not host:
+        return ""
+    if host.replace(".", "").isdigit():  # IPv4 address
+        return host
+
+    extractor = _get_extractor()
+    if extractor is not None:
+        parts = extractor(host)
+        if parts.domain and parts.suffix:
+            return f"{parts.domain}.{parts.suffix}"
+        return host
+
+    labels = host.split(".")
+    suffix_labels = 2 if ".".join(labels[-2:]) in COMMON_MULTI_LABEL_SUFFIXES else 1
+    if len(labels) > suffix_labels + 1 and labels[0] == "www":
+        labels = labels[1:]
+    return ".".join(labels)
+
+@dataclass
+class LeadGroup:
+    """All lead rows of one registrable domain"""
+    domain: str
+    url: str  # Canonical URL processed for the whole group
+    rows: List[str] = field(default_factory=list)  # Lead URLs as read, in source order
+
+def _preference(domain: str):
+    """Sort key of a group's rows: the domain's own site first, then shallowest path, then HTTPS"""
+    def key(url: str):
+        parts = urlsplit(url if "//" in url else f"//{url}")
+        host = (parts.hostname or "").rstrip(".")
+        return (
+            host not in (domain, f"www.{domain}"),
+            len([segment for segment in parts.path.split("/") if segment]),
+            parts.scheme.lower() != "https",
+        )
+    return key
+
+def group_by_domain(urls: List[str]) -> List[LeadGroup]:
+    """One LeadGroup per registrable domain, in order of first appearance.
+
+    The group's URL is the canonical form of its shallowest row on the
+    domain itself (or ``www.``), i.e. the homepage when the list has it,
+    preferring HTTPS and then the first row; a subdomain such as
+    ``shop.acme.com`` is only used when no row is on ``acme.com``.
+    """
+    rows: Dict[str, List[str]] = {}
+    for url in urls:
+        rows.setdefault(registrable_domain(url) or normalize_url(url), []).append(url)
+    return [
+        LeadGroup(domain, normalize_url(min(domain_urls, key=_preference(domain))), domain_urls)
+        for domain, domain_urls in rows.items()
+    ]
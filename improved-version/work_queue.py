@@ -0,0 +1,563 @@
+"""
+Shared work queue for running one campaign on several worker hosts
+
+A coordinator enqueues one item per company (keyed by its canonical URL) and
+seals the campaign; any number of worker processes, on any number of hosts,
+lease items, process them and acknowledge them with their result. A lease is
+an item made invisible to other workers for a visibility timeout. Workers
+extend the leases they hold while they work; an item whose lease runs out
+(its worker crashed or hung) is delivered again, up to ``max_attempts``
+times, after which it is dead-lettered.
+
+Every lease carries a fresh token. Acks, extensions and draft claims are
+only accepted from the current lease holder, so a worker that lost its
+lease can't overwrite the result of the worker that took the item over.
+
+Delivery is at least once, so the one side effect that must not repeat, the
+Gmail draft, is fenced separately: a worker claims the draft with its lease
+token before creating it and records the draft id afterwards. A claim that
+finds an earlier claim without a draft id means a worker may have crashed
+between creating the draft and recording it; the caller then looks the
+draft up (by its deterministic Message-ID) before creating one.
+
+SQLiteWorkQueue keeps the queue in a SQLite file, for local testing and for
+several processes on one host. RedisWorkQueue works with any server that
+speaks the Redis protocol and runs Lua scripts (Redis, Valkey, KeyDB); it
+needs the redis package. Lease expiry uses the workers' clocks, which are
+assumed to be synchronized (NTP) to well within the visibility timeout.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from caching import SQLiteStore
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class LeaseLost(Exception):
+    """The lease ran out and the item may now be held by another worker"""
+
+@dataclass
+class Lease:
+    """An item held by one worker until ``expires_at`` (time.time())"""
+    key: str
+    payload: Dict[str, Any]
+    token: str
+    attempt: int
+    expires_at: float
+
+@dataclass
+class DraftClaim:
+    """Outcome of claiming an item's draft.
+
+    ``draft_id`` is set when a draft was already recorded for the item.
+    ``previously_claimed`` means an earlier lease claimed the draft without
+    recording one, so it may have been created anyway.
+    """
+    draft_id: Optional[str] = None
+    previously_claimed: bool = False
+
+def worker_name() -> str:
+    """Host name and process id, shown as the lease holder"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+# ============================================================================
+# QUEUES
+# ============================================================================
+
+class WorkQueue:
+    """Base class: the work items of one campaign"""
+
+    def __init__(self, campaign: str, max_attempts: int = 3):
+        self.campaign = campaign
+        self.max_attempts = max_attempts
+
+    def enqueue(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        """Add (key, payload) items; keys already in the campaign are left alone. Returns the number added"""
+        raise NotImplementedError
+
+    def seal(self) -> None:
+        """Mark the campaign as fully enqueued, so idle workers stop once it is drained"""
+        raise NotImplementedError
+
+    def lease(self, worker: str, visibility_timeout: float) -> Optional[Lease]:
+        """Lease the next visible item, or None if there is none right now"""
+        raise NotImplementedError
+
+    def extend(self, lease: Lease, visibility_timeout: float) -> bool:
+        """Push the lease's expiry out; False if the lease was lost"""
+        raise NotImplementedError
+
+    def ack(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        """Complete the item with ``result``; False (and no change) if the lease was lost"""
+        raise NotImplementedError
+
+    def release(self, lease: Lease, delay: float = 0.0) -> None:
+        """Give the item back, visible again after ``delay`` seconds"""
+        raise NotImplementedError
+
+    def claim_draft(self, key: str, token: str) -> DraftClaim:
+        """Claim the right to create the draft of ``key`` for lease ``token``; raises LeaseLost if it is no longer held"""
+        raise NotImplementedError
+
+    def record_draft(self, key: str, draft_id: str) -> None:
+        """Remember the draft created for ``key``"""
+        raise NotImplementedError
+
+    def counts(self) -> Dict[str, int]:
+        """Number of items that are queued (waiting or leased), done and dead, and whether the campaign is sealed"""
+        raise NotImplementedError
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """Acknowledged results, keyed by item"""
+        raise NotImplementedError
+
+    def drained(self) -> bool:
+        """True once the campaign is sealed and no item is left to process"""
+        counts = self.counts()
+        return bool(counts["sealed"]) and counts["queued"] == 0
+
+class SQLiteWorkQueue(SQLiteStore, WorkQueue):
+    """Work queue in a SQLite file shared by the worker processes of one host.
+
+    Every operation is a single statement, which SQLite runs atomically
+    across processes.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS work_items (
+            campaign TEXT NOT NULL,
+            key TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            state TEXT NOT NULL,
+            visible_at REAL NOT NULL,
+            lease_token TEXT,
+            worker TEXT,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            result TEXT,
+            draft_claim TEXT,
+            draft_id TEXT,
+            seq INTEGER NOT NULL,
+            PRIMARY KEY (campaign, key)
+        );
+        CREATE INDEX IF NOT EXISTS work_items_visible ON work_items (campaign, state, visible_at);
+        CREATE TABLE IF NOT EXISTS work_campaigns (
+            campaign TEXT PRIMARY KEY,
+            sealed INTEGER NOT NULL DEFAULT 0
+        );
+    """
+
+    def __init__(self, path: str, campaign: str, max_attempts: int = 3):
+        SQLiteStore.__init__(self, path, self.SCHEMA)
+        WorkQueue.__init__(self, campaign, max_attempts)
+        self.execute("INSERT OR IGNORE INTO work_campaigns (campaign) VALUES (?)", (campaign,))
+
+    def enqueue(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        added = 0
+        now = time.time()
+        for key, payload in items:
+            rows = self.execute(
+                "INSERT INTO work_items (campaign, key, payload, state, visible_at, seq) "
+                "SELECT ?, ?, ?, 'queued', ?, COALESCE(MAX(seq), 0) + 1 FROM work_items WHERE campaign = ? "
+                "ON CONFLICT (campaign, key) DO NOTHING RETURNING key",
+                (self.campaign, key, json.dumps(payload), now, self.campaign),
+            )
+            added += len(rows)
+        return added
+
+    def seal(self) -> None:
+        self.execute("UPDATE work_campaigns SET sealed = 1 WHERE campaign = ?", (self.campaign,))
+
+    def lease(self, worker: str, visibility_timeout: float) -> Optional[Lease]:
+        now = time.time()
+        dead = self.execute(
+            "UPDATE work_items SET state = 'dead', lease_token = NULL "
+            "WHERE campaign = ? AND state = 'queued' AND visible_at <= ? AND attempts >= ? RETURNING key",
+            (self.campaign, now, self.max_attempts),
+        )
+        for (key,) in dead:
+            logger.warning(f"Work item {key} dead-lettered after {self.max_attempts} attempts")
+
+        token = uuid.uuid4().hex
+        expires_at = now + visibility_timeout
+        rows = self.execute(
+            "UPDATE work_items SET lease_token = ?, worker = ?, visible_at = ?, attempts = attempts + 1 "
+            "WHERE campaign = ? AND key = ("
+            "    SELECT key FROM work_items WHERE campaign = ? AND state = 'queued' AND visible_at <= ? "
+            "    ORDER BY visible_at, seq LIMIT 1"
+            ") AND state = 'queued' RETURNING key, payload, attempts",
+            (token, worker, expires_at, self.campaign, self.campaign, now),
+        )
+        if not rows:
+            return None
+        key, payload, attempts = rows[0]
+        return Lease(key, json.loads(payload), token, attempts, expires_at)
+
+    def extend(self, lease: Lease, visibility_timeout: float) -> bool:
+        expires_at = time.time() + visibility_timeout
+        rows = self.execute(
+            "UPDATE work_items SET visible_at = ? "
+            "WHERE campaign = ? AND key = ? AND lease_token = ? AND state = 'queued' RETURNING key",
+            (expires_at, self.campaign, lease.key, lease.token),
+        )
+        if rows:
+            lease.expires_at = expires_at
+        return bool(rows)
+
+    def ack(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        rows = self.execute(
+            "UPDATE work_items SET state = 'done', result = ?, lease_token = NULL "
+            "WHERE campaign = ? AND key = ? AND lease_token = ? AND state = 'queued' RETURNING key",
+            (json.dumps(result), self.campaign, lease.key, lease.token),
+        )
+        return bool(rows)
+
+    def release(self, lease: Lease, delay: float = 0.0) -> None:
+        self.execute(
+            "UPDATE work_items SET visible_at = ?, lease_token = NULL "
+            "WHERE campaign = ? AND key = ? AND lease_token = ? AND state = 'queued'",
+            (time.time() + delay, self.campaign, lease.key, lease.token),
+        )
+
+    def claim_draft(self, key: str, token: str) -> DraftClaim:
+        rows = self.execute(
+            "SELECT draft_id, draft_claim FROM work_items WHERE campaign = ? AND key = ?", (self.campaign, key)
+        )
+        if rows and rows[0][0]:
+            return DraftClaim(draft_id=rows[0][0])
+        previous = rows[0][1] if rows else None
+        # Compare-and-set on the earlier claim, so two claimants can't both see none
+        claimed = self.execute(
+            "UPDATE work_items SET draft_claim = ? "
+            "WHERE campaign = ? AND key = ? AND lease_token = ? AND state = 'queued' AND visible_at > ? "
+            "AND draft_id IS NULL AND draft_claim IS ? RETURNING key",
+            (token, self.campaign, key, token, time.time(), previous),
+        )
+        if not claimed:
+            raise LeaseLost(f"Lease on {key} was lost before its draft was claimed")
+        return DraftClaim(previously_claimed=previous not in (None, token))
+
+    def record_draft(self, key: str, draft_id: str) -> None:
+        self.execute(
+            "UPDATE work_items SET draft_id = ? WHERE campaign = ? AND key = ?", (draft_id, self.campaign, key)
+        )
+
+    def counts(self) -> Dict[str, int]:
+        rows = self.execute(
+            "SELECT state, COUNT(*) FROM work_items WHERE campaign = ? GROUP BY state", (self.campaign,)
+        )
+        counts = {"queued": 0, "done": 0, "dead": 0}
+        counts.update({state: count for state, count in rows})
+        sealed = self.execute("SELECT sealed FROM work_campaigns WHERE campaign = ?", (self.campaign,))
+        counts["sealed"] = int(bool(sealed and sealed[0][0]))
+        return counts
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        rows = self.execute(
+            "SELECT key, result FROM work_items WHERE campaign = ? AND state = 'done' ORDER BY seq", (self.campaign,)
+        )
+        return {key: json.loads(result) for key, result in rows}
+
+# Lua scripts of RedisWorkQueue; each runs atomically on the server.
+# KEYS: items, visible (sorted set: key -> visible_at), leases, attempts, done, dead, drafts, draft_claims
+_LEASE_SCRIPT = """
+while true do
+    local next = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1], 'LIMIT', 0, 1)[1]
+    if not next then
+        return nil
+    end
+    local attempts = tonumber(redis.call('HGET', KEYS[4], next) or '0')
+    if attempts >= tonumber(ARGV[4]) then
+        redis.call('ZREM', KEYS[2], next)
+        redis.call('HDEL', KEYS[3], next)
+        redis.call('HSET', KEYS[6], next, attempts)
+    else
+        redis.call('HINCRBY', KEYS[4], next, 1)
+        redis.call('ZADD', KEYS[2], ARGV[2], next)
+        redis.call('HSET', KEYS[3], next, ARGV[3])
+        return {next, redis.call('HGET', KEYS[1], next), attempts + 1}
+    end
+end
+"""
+
+_EXTEND_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[2] then
+    return 0
+end
+redis.call('ZADD', KEYS[2], 'XX', ARGV[3], ARGV[1])
+return 1
+"""
+
+_ACK_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[2] or not redis.call('ZSCORE', KEYS[2], ARGV[1]) then
+    return 0
+end
+redis.call('ZREM', KEYS[2], ARGV[1])
+redis.call('HDEL', KEYS[3], ARGV[1])
+redis.call('HSET', KEYS[5], ARGV[1], ARGV[3])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+if redis.call('HGET', KEYS[3], ARGV[1]) == ARGV[2] then
+    redis.call('HDEL', KEYS[3], ARGV[1])
+    redis.call('ZADD', KEYS[2], 'XX', ARGV[3], ARGV[1])
+end
+return 0
+"""
+
+_CLAIM_DRAFT_SCRIPT = """
+local draft_id = redis.call('HGET', KEYS[7], ARGV[1])
+if draft_id then
+    return {'drafted', draft_id}
+end
+local visible_at = redis.call('ZSCORE', KEYS[2], ARGV[1])
+if redis.call('HGET', KEYS[3], ARGV[1]) ~= ARGV[2] or not visible_at or tonumber(visible_at) <= tonumber(ARGV[3]) then
+    return {'lost', ''}
+end
+local previous = redis.call('HGET', KEYS[8], ARGV[1])
+redis.call('HSET', KEYS[8], ARGV[1], ARGV[2])
+return {'claimed', previous or ''}
+"""
+
+_ENQUEUE_SCRIPT = """
+local added = 0
+for i = 1, #ARGV - 1, 2 do
+    if redis.call('HSETNX', KEYS[1], ARGV[i], ARGV[i + 1]) == 1 then
+        redis.call('ZADD', KEYS[2], redis.call('HINCRBY', KEYS[9], 'seq', 1) * 1e-9, ARGV[i])
+        added = added + 1
+    end
+end
+return added
+"""
+
+class RedisWorkQueue(WorkQueue):
+    """Work queue on a Redis-compatible server, shared by workers on any number of hosts.
+
+    All keys of a campaign share the ``{prefix}:{campaign}`` hash tag, so the
+    scripts also work on a cluster.
+    """
+
+    ENQUEUE_BATCH = 500
+
+    def __init__(self, client, campaign: str, max_attempts: int = 3, prefix: str = "outbound"):
+        super().__init__(campaign, max_attempts)
+        self._client = client
+        base = f"{{{prefix}:{campaign}}}"
+        self._keys = [f"{base}:{name}" for name in (
+            "items", "visible", "leases", "attempts", "done", "dead", "drafts", "draft_claims", "meta"
+        )]
+        self._lease = client.register_script(_LEASE_SCRIPT)
+        self._extend = client.register_script(_EXTEND_SCRIPT)
+        self._ack = client.register_script(_ACK_SCRIPT)
+        self._release = client.register_script(_RELEASE_SCRIPT)
+        self._claim_draft = client.register_script(_CLAIM_DRAFT_SCRIPT)
+        self._enqueue = client.register_script(_ENQUEUE_SCRIPT)
+
+    @classmethod
+    def from_url(cls, url: str, campaign: str, max_attempts: int = 3) -> "RedisWorkQueue":
+        if redis is None:
+            raise RuntimeError("The redis package is required for a redis:// work queue (pip install redis)")
+        return cls(redis.Redis.from_url(url), campaign, max_attempts)
+
+    def enqueue(self, items: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+        added = 0
+        batch: List[str] = []
+        for key, payload in items:
+            batch += [key, json.dumps(payload)]
+            if len(batch) >= 2 * self.ENQUEUE_BATCH:
+                added += int(self._enqueue(keys=self._keys, args=batch))
+                batch = []
+        if batch:
+            added += int(self._enqueue(keys=self._keys, args=batch))
+        return added
+
+    def seal(self) -> None:
+        self._client.hset(self._keys[8], "sealed", 1)
+
+    def lease(self, worker: str, visibility_timeout: float) -> Optional[Lease]:
+        now = time.time()
+        token = f"{uuid.uuid4().hex}:{worker}"
+        expires_at = now + visibility_timeout
+        leased = self._lease(keys=self._keys, args=[now, expires_at, token, self.max_attempts])
+        if not leased:
+            return None
+        key, payload, attempt = leased
+        key = key.decode() if isinstance(key, bytes) else key
+        return Lease(key, json.loads(payload), token, int(attempt), expires_at)
+
+    def extend(self, lease: Lease, visibility_timeout: float) -> bool:
+        expires_at = time.time() + visibility_timeout
+        if self._extend(keys=self._keys, args=[lease.key, lease.token, expires_at]):
+            lease.expires_at = expires_at
+            return True
+        return False
+
+    def ack(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        return bool(self._ack(keys=self._keys, args=[lease.key, lease.token, json.dumps(result)]))
+
+    def release(self, lease: Lease, delay: float = 0.0) -> None:
+        self._release(keys=self._keys, args=[lease.key, lease.token, time.time() + delay])
+
+    def claim_draft(self, key: str, token: str) -> DraftClaim:
+        status, value = self._claim_draft(keys=self._keys, args=[key, token, time.time()])
+        status = status.decode() if isinstance(status, bytes) else status
+        value = value.decode() if isinstance(value, bytes) else value
+        if status == "drafted":
+            return DraftClaim(draft_id=value)
+        if status == "lost":
+            raise LeaseLost(f"Lease on {key} was lost before its draft was claimed")
+        return DraftClaim(previously_claimed=value not in ("", token))
+
+    def record_draft(self, key: str, draft_id: str) -> None:
+        self._client.hset(self._keys[6], key, draft_id)
+
+    def counts(self) -> Dict[str, int]:
+        pipe = self._client.pipeline()
+        pipe.zcard(self._keys[1])
+        pipe.hlen(self._keys[4])
+        pipe.hlen(self._keys[5])
+        pipe.hget(self._keys[8], "sealed")
+        queued, done, dead, sealed = pipe.execute()
+        return {"queued": queued, "done": done, "dead": dead, "sealed": int(bool(sealed))}
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            (key.decode() if isinstance(key, bytes) else key): json.loads(result)
+            for key, result in self._client.hgetall(self._keys[4]).items()
+        }
+
+def open_work_queue(spec: str, campaign: str, max_attempts: int = 3) -> WorkQueue:
+    """RedisWorkQueue for a redis:// (or rediss://, unix://) URL, else a SQLiteWorkQueue on the path ``spec``"""
+    if spec.startswith(("redis://", "rediss://", "unix://")):
+        return RedisWorkQueue.from_url(spec, campaign, max_attempts)
+    return SQLiteWorkQueue(spec, campaign, max_attempts)
+
+# ============================================================================
+# WORKERS
+# ============================================================================
+
+class LeaseKeeper:
+    """Extends the leases a worker holds every third of the visibility timeout"""
+
+    def __init__(self, work_queue: WorkQueue, visibility_timeout: float):
+        self._queue = work_queue
+        self.visibility_timeout = visibility_timeout
+        self._leases: Dict[str, Lease] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-keeper", daemon=True)
+        self._thread.start()
+
+    def hold(self, lease: Lease) -> None:
+        with self._lock:
+            self._leases[lease.token] = lease
+
+    def drop(self, lease: Lease) -> None:
+        with self._lock:
+            self._leases.pop(lease.token, None)
+
+    def held(self) -> List[Lease]:
+        with self._lock:
+            return list(self._leases.values())
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.visibility_timeout / 3):
+            for lease in self.held():
+                try:
+                    if not self._queue.extend(lease, self.visibility_timeout):
+                        logger.warning(f"Lease on {lease.key} was lost; another worker may process it")
+                        self.drop(lease)
+                except Exception as e:
+                    logger.warning(f"Could not extend lease on {lease.key}: {e}")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+def run_worker(
+    work_queue: WorkQueue,
+    handle: Callable[[Lease], Dict[str, Any]],
+    threads: int = 1,
+    visibility_timeout: float = 300.0,
+    poll_interval: float = 2.0,
+    retry_delay: float = 30.0,
+) -> Dict[str, int]:
+    """Process items with ``handle`` on ``threads`` threads until the campaign is drained.
+
+    ``handle`` returns the result to acknowledge. An item whose handler
+    raises is released to be retried ``retry_delay`` seconds later (by any
+    worker); on KeyboardInterrupt the held items are released at once.
+    Returns how many items were acknowledged, failed and lost.
+    """
+    worker = worker_name()
+    keeper = LeaseKeeper(work_queue, visibility_timeout)
+    totals = {"acked": 0, "failed": 0, "lost": 0}
+    totals_lock = threading.Lock()
+    interrupted = threading.Event()
+    fatal: List[BaseException] = []
+
+    def count(outcome: str) -> None:
+        with totals_lock:
+            totals[outcome] += 1
+
+    def work() -> None:
+        while not interrupted.is_set():
+            lease = work_queue.lease(worker, visibility_timeout)
+            if lease is None:
+                if work_queue.drained():
+                    return
+                time.sleep(poll_interval)
+                continue
+
+            keeper.hold(lease)
+            try:
+                result = handle(lease)
+            except Exception as e:
+                logger.error(f"Work item {lease.key} failed (attempt {lease.attempt}): {e}")
+                work_queue.release(lease, retry_delay)
+                count("failed")
+                continue
+            except BaseException as e:
+                interrupted.set()
+                work_queue.release(lease)
+                fatal.append(e)
+                return
+            finally:
+                keeper.drop(lease)
+            if work_queue.ack(lease, result):
+                count("acked")
+            else:
+                logger.warning(f"Lease on {lease.key} was lost before its ack; result discarded")
+                count("lost")
+
+    logger.info(f"Worker {worker} starting {threads} threads on campaign {work_queue.campaign}")
+    pool = [threading.Thread(target=work, name=f"queue-worker-{number}", daemon=True) for number in range(threads)]
+    try:
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            while thread.is_alive():
+                thread.join(1.0)
+    except BaseException:
+        interrupted.set()
+        for lease in keeper.held():
+            work_queue.release(lease)  # Let other workers take them up right away
+        raise
+    finally:
+        keeper.close()
+    if fatal:
+        raise fatal[0]
+    return totals